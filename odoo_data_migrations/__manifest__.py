@@ -8,10 +8,15 @@
     'data': [
         # secirity
         'security/ir.model.access.csv',
-
         # views
         'views/account_connection_views.xml',
         'views/account_model_analysis_views.xml',
+        'views/migration_lookup_views.xml',
+        'views/migration_run_views.xml',
+        'views/migration_benchmark_views.xml',
+        'views/migration_quarantine_views.xml',
+        # data
+        'data/migration_lookup_data.xml',
     ],
     'installable': True,
     'application': True,
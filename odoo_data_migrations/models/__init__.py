@@ -1,3 +1,8 @@
 from . import account_connect_db
 from . import model_mapping
-from . import model_analysis
\ No newline at end of file
+from . import model_analysis
+from . import migration_lookup
+from . import migration_run
+from . import migration_benchmark
+from . import migration_quarantine
+from . import migration_schema_catalog
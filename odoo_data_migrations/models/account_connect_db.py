@@ -1,16 +1,60 @@
 import logging
+import threading
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
 
 import psycopg2
-from odoo import _, fields, models
+from odoo import _, api, fields, models
 from odoo.exceptions import ValidationError
+from odoo.tools import split_every
+
+from ..tools import (
+    LogSampler,
+    MigrationConnectionPool,
+    TableMetrics,
+    column_getter,
+    run_dependency_graph,
+    write_bisecting,
+)
+from .model_mapping import DEFAULT_BATCH_SIZE, migration_dependencies
 
 _logger = logging.getLogger(__name__)
+_sampled_logger = LogSampler(_logger)
+
+# Connection pools shared by every helper and worker, keyed by (database, record id).
+_CONNECTION_POOLS = {}
+_CONNECTION_POOLS_LOCK = threading.Lock()
+
+# Background migration threads of this server process, keyed by (database, run id).
+_MIGRATION_JOBS = {}
+_MIGRATION_JOBS_LOCK = threading.Lock()
+
+# First key of the session advisory locks held by migration jobs, the second one is
+# the run id.
+MIGRATION_RUN_LOCK = 0x6D696772
+
+# Tables that can be split into id ranges -> models whose mappings the ranges share.
+PARTITIONED_TABLES = {
+    'account_move_line': ['account.move', 'account.account'],
+}
+
+# Tables migrated by "Migrate All", the same ones the individual buttons load.
+DEFAULT_MIGRATION_TABLES = [
+    'res_partner',
+    'account_account',
+    'account_journal',
+    'account_move',
+    'account_move_line',
+    'product_template',
+]
 
 
 def _connect_to_db(host, port, user, password, dbname):
     try:
-        conn = psycopg2.connect(host=host, port=port, user=user, password=password, dbname=dbname)
+        conn = psycopg2.connect(
+            host=host, port=port, user=user, password=password, dbname=dbname
+        )
         return conn
     except psycopg2.Error:
         return None
@@ -30,384 +74,833 @@ class AccountConnectDB(models.Model):
     db_target_port = fields.Char(string='DB Target Port', required=True)
     db_target_user = fields.Char(string='DB Target User', required=True)
     db_target_password = fields.Char(string='DB Target Password', required=True)
+    fetch_itersize = fields.Integer(
+        string='Fetch Size',
+        default=2000,
+        help="Number of rows fetched per round trip from the server-side source "
+        "cursor.",
+    )
+    batch_size = fields.Integer(
+        string='Batch Size',
+        default=1000,
+        help="Number of records written and committed together in the target database.",
+    )
+    mapping_store_dir = fields.Char(
+        string='ID Map Directory',
+        help="Directory where compact source to target id maps are saved after each "
+        "run. Later runs memory-map them instead of reloading the mapping table.",
+    )
+    write_mode = fields.Selection(
+        [('batch', 'Batched'), ('set', 'Set-based SQL'), ('row', 'Row by Row')],
+        string='Write Mode',
+        default='batch',
+        required=True,
+        help="Batched mode uses multi-row INSERT and COPY with one commit per batch. "
+        "Set-based mode copies supported tables into a staging table and translates "
+        "their foreign keys with one INSERT ... SELECT in the target database. "
+        "Row by row mode keeps the original one INSERT and commit per record.",
+    )
+    parallel_workers = fields.Integer(
+        string='Parallel Workers',
+        default=4,
+        help="Number of tables migrated at the same time, each with its own cursor "
+        "and connections.",
+    )
+    table_partitions = fields.Integer(
+        string='Table Partitions',
+        default=1,
+        help="Number of id ranges a huge table (account_move_line) is split into. "
+        "Each range is migrated concurrently by its own worker and connection pair.",
+    )
+    pipeline_queue_size = fields.Integer(
+        string='Pipeline Queue Size',
+        default=2,
+        help="Batches buffered between the read, transform and write stages running "
+        "concurrently. Bounds the memory held in flight; the stage timings are logged "
+        "after each table.",
+    )
+    sync_mode = fields.Selection(
+        [('full', 'Full Migration'), ('delta', 'Delta Sync')],
+        string='Sync Mode',
+        default='full',
+        required=True,
+        help="Delta sync only reads the source rows created or written since the last "
+        "finished migration of each table, inserts the new ones and updates the "
+        "records already migrated.",
+    )
+    run_ids = fields.One2many('migration.run', 'connection_id', string='Migration Runs')
 
     def check_connection(self):
         # connect to source db
-        source_db = _connect_to_db(self.db_source_host, self.db_source_port, self.db_source_user,
-                                   self.db_source_password, self.db_source_name)
-
-        target_db = _connect_to_db(self.db_target_host, self.db_target_port, self.db_target_user,
-                                   self.db_target_password, self.db_target_name)
-        print(source_db,target_db)
+        source_db = _connect_to_db(
+            self.db_source_host,
+            self.db_source_port,
+            self.db_source_user,
+            self.db_source_password,
+            self.db_source_name,
+        )
+
+        target_db = _connect_to_db(
+            self.db_target_host,
+            self.db_target_port,
+            self.db_target_user,
+            self.db_target_password,
+            self.db_target_name,
+        )
         return source_db, target_db
 
+    def _connection_params(self):
+        """Return the psycopg2 connection parameters of the source and target."""
+        source_params = {
+            'host': self.db_source_host,
+            'port': self.db_source_port,
+            'user': self.db_source_user,
+            'password': self.db_source_password,
+            'dbname': self.db_source_name,
+        }
+        target_params = {
+            'host': self.db_target_host,
+            'port': self.db_target_port,
+            'user': self.db_target_user,
+            'password': self.db_target_password,
+            'dbname': self.db_target_name,
+        }
+        return source_params, target_params
+
+    @contextmanager
+    def _connection_session(self):
+        """Keep the connection pool of this configuration open for a block.
+
+        Sessions nest: the pool is closed, and its setup versus transfer time
+        logged, when the outermost session ends.
+        """
+        self.ensure_one()
+        key = (self.env.cr.dbname, self.id)
+        params = self._connection_params()
+        # Every worker may hold two pairs at once (a table run and a lookup helper).
+        maxconn = 2 * max(self.parallel_workers, 1) * max(self.table_partitions, 1) + 2
+        with _CONNECTION_POOLS_LOCK:
+            pool = _CONNECTION_POOLS.get(key)
+            if pool is None or pool.params != params:
+                pool = _CONNECTION_POOLS[key] = MigrationConnectionPool(
+                    *params, maxconn
+                )
+            pool.acquire()
+        try:
+            yield pool
+        finally:
+            with _CONNECTION_POOLS_LOCK:
+                last_user = pool.release()
+                if last_user and _CONNECTION_POOLS.get(key) is pool:
+                    del _CONNECTION_POOLS[key]
+            if last_user:
+                _logger.info("Closing migration connections: %s", pool.stats())
+                pool.close()
+
+    @contextmanager
+    def _borrow_connections(self):
+        """Yield a pooled (source_db, target_db) pair and give it back afterwards."""
+        with self._connection_session() as pool:
+            try:
+                source_db, target_db = pool.getconns()
+            except psycopg2.Error as e:
+                raise ValidationError(_("Error connecting to databases: %s") % str(e))
+            try:
+                yield source_db, target_db
+            finally:
+                pool.putconns(source_db, target_db)
+
     def create_record(self, source_model, vals):
         new_account = self.env[source_model].sudo().create(vals)
         return new_account
 
-    def model_mapping_id(self, model_id):
-        model_mapping = self.env['model.mapping'].search([('model_id', '=', model_id)])
-        existing_mapping = {rec['source_db_id']: rec['target_db_id'] for rec in
-                            model_mapping.read(['source_db_id', 'target_db_id'])}
-        return existing_mapping
-
     def move_data_from_source_table(self, source_table):
-
-        source_model = source_table.replace('_', '.')
-
-        try:
-            # Connect to source and target databases
-            source_db, target_db = self.check_connection()
-            existing_mapping = self.model_mapping_id(source_model)
-
-            # Drop Constrains
-            if source_table == 'account_journal':
-                # # Delete all records from model_mapping
-                # self.env['model.mapping'].with_context(force_delete=True).search([
-                #     ('model_id', '=', source_model)
-                # ]).unlink()
-                #
-                # # Delete all records from account.journal
-                # journals = self.env['account.journal'].with_context(force_delete=True).search([])
-                # if journals:
-                #     journals.unlink()
-
-                # Drop foreign key constraint on 'alias_id'
-                try:
-                    target_db_cur = target_db.cursor()
-                    target_db_cur.execute(
-                        """ALTER TABLE account_journal DROP CONSTRAINT IF EXISTS account_journal_alias_id_fkey;""")
-                    target_db_cur.execute(
-                        """ALTER TABLE account_journal DROP CONSTRAINT IF EXISTS account_journal_code_company_uniq;""")
-                    target_db.commit()
-                    _logger.info(
-                        "Dropped foreign key constraint 'account_journal_alias_id_fkey' and unique constraint 'account_journal_code_company_uniq' from 'account_journal'.")
-                except Exception as e:
-                    _logger.error(
-                        f"Failed to drop constraints 'account_journal_alias_id_fkey' and 'account_journal_code_company_uniq': {e}")
-                    target_db.rollback()
-
-            # Prepare to fetch data from source database
-            source_db_cur = source_db.cursor()
-            source_db_cur.execute(f"SELECT * FROM {source_table} LIMIT 0")
-            source_columns = [desc[0] for desc in source_db_cur.description or []]
-            shared_fields = [
-                field for field in self.env[source_model]._fields
-                if field in source_columns and field != 'id'
-            ]
-            source_db_cur.execute(f"SELECT * FROM {source_table}")
-            source_records = source_db_cur.fetchall()
-            for record in source_records:
-                source_id = record[source_columns.index('id')]
-
-                # Skip if the record already exists in the mapping
-                if str(source_id) in existing_mapping:
-                    print(f"Record {source_id} already exists.")
-                    continue
-
-                # Prepare values for creating a new record
-                record_values = {f: record[source_columns.index(f)] for f in shared_fields}
-                if source_table == 'account_journal':
-                    account_mapping = self.model_mapping_id('account.account')
-                    record_values['alias_id'] = None
-                    if record_values['profit_account_id']:
-                        print(record_values['profit_account_id'])
-                        record_values['profit_account_id'] = int(
-                            account_mapping[str(record_values['profit_account_id'])])
-                    if record_values['loss_account_id']:
-                        record_values['loss_account_id'] = int(account_mapping[str(record_values['loss_account_id'])])
-                    if record[source_columns.index('default_debit_account_id')]:
-                        record_values['default_account_id'] = int(
-                            account_mapping[str(record[source_columns.index('default_debit_account_id')])])
-
-                if source_table == 'account_account':
-                    # set the correct type
-                    # 1- find the name of type in user_type_id
-                    user_type_id = record[source_columns.index('user_type_id')]
-                    source_db_cur.execute(f"SELECT name FROM account_account_type where id={user_type_id}")
-                    user_type_name = source_db_cur.fetchall()[0][0]
-
-                    # 2- mapping the account record from source to target
-                    account_type_selection = dict((v, k) for k, v in
-                                                  self.env['account.account'].fields_get(allfields=['account_type'])[
-                                                      'account_type']['selection'])
-                    record_values['account_type'] = account_type_selection[user_type_name]
-
-                # Create the record in the target database
-                try:
-                    print("first try")
-                    # Start of the transaction
-                    target_db_cur = target_db.cursor()
-                    try:
-                        print('second try')
-                        # print(f"insert into {source_table} ({', '.join(record_values.keys())}) VALUES ({', '.join(['%s'] * len(record_values))})",
-                        #     list(record_values.values()))
-                        target_db_cur.execute(f"""
-                            INSERT INTO account_journal (
-                                message_main_attachment_id, name, code, active, type, restrict_mode_hash_table, sequence,
-                                invoice_reference_type, invoice_reference_model, currency_id, company_id, refund_sequence,
-                                profit_account_id, loss_account_id, bank_account_id, bank_statements_source, alias_id,
-                                secure_sequence_id, create_uid, create_date, write_uid, write_date, show_on_dashboard,
-                                color, default_account_id
-                            ) VALUES (
-                                NULL, 'Customer Invoices', 'INV', TRUE, 'sale', NULL, 5,
-                                'invoice', 'odoo', NULL, 1, TRUE,
-                                NULL, NULL, NULL, 'undefined', NULL,
-                                NULL, 1, '2024-12-15 09:49:02.824694', 1, '2024-12-15 09:49:02.824694', TRUE,
-                                11, 439
-                            ) RETURNING id;
-                        """)
-                        new_account_id = target_db_cur.fetchone()[0]
-                        target_db.commit()
-                        print("done",new_account_id)
-                    except Exception:
-                        print("error")
-                        target_db.rollback()
-                        raise Exception
-                    try:
-                        print('third try')
-                        # Safely create the mapping
-                        self.env['model.mapping'].create({
-                            'model_id': source_model,
-                            'source_db_id': source_id,
-                            'target_db_id': new_account_id
-                        })
-                        print("hello")
-                    except Exception as map_error:
-                        _logger.error(f"Mapping failed for record {source_id}: {str(map_error)}")
-                        continue
-
-                    # Success: both the record and mapping were created
-                    print("Record and mapping created successfully")
-
-                except Exception as create_error:
-                    _logger.error(f"Error creating record {source_id}: {str(create_error)}")
-
-        except Exception as e:
-            raise ValidationError(_("Error during account account migration: %s") % str(e))
+        """Migrate a plain source table with the spec driven engine of model.mapping."""
+        return self.env['model.mapping'].move_data_from_source_table(source_table)
 
     def action_check_connection(self):
         # connect to source db
         source_db, target_db = self.check_connection()
         if source_db:
-            print("Connected to source db")
+            _logger.info("Connected to source db")
         else:
-            print("Error connecting to source db")
+            _logger.warning("Error connecting to source db")
 
         # connect to target db
         if target_db:
-            print("Connected to target db")
+            _logger.info("Connected to target db")
         else:
-            print("Error connecting to target db")
+            _logger.warning("Error connecting to target db")
+
+        for conn in (source_db, target_db):
+            if conn:
+                conn.close()
+
+    def action_analyze_database(self):
+        """Analyze the source tables against the target, ranked by migration cost."""
+        self.ensure_one()
+        self.env['account.model.analysis']._analyze_database(self)
+        return {
+            'type': 'ir.actions.act_window',
+            'name': _('Model Analysis'),
+            'res_model': 'account.model.analysis',
+            'view_mode': 'tree,form',
+            'domain': [('connection_id', '=', self.id)],
+            'target': 'current',
+        }
 
     def action_migrate_account_move_data(self):
-        try:
-            # Connect to source and target databases
-            source_db, target_db = self.check_connection()
-        except Exception as e:
-            raise ValidationError(_("Error connecting to databases: %s") % str(e))
-
-        source_db_cur = source_db.cursor()
-
-        # Get model mapping
-        model_mapping = self.env['model.mapping'].search([('model_id', '=', 'account.move')])
-        existing_mapping = {rec['source_db_id']: rec['target_db_id'] for rec in
-                            model_mapping.read(['source_db_id', 'target_db_id'])}
-
-        try:
-            # Fetch account_move structure and shared fields
-            source_db_cur.execute("SELECT * FROM account_move LIMIT 0")
-            source_columns = [desc[0] for desc in source_db_cur.description or []]
-            shared_fields = [
-                field for field in self.env['account.move']._fields
-                if field in source_columns and field != 'id'
-            ]
+        return self._start_migration_job(
+            'account_move', '_run_migration', ['account_move']
+        )
 
-            # Fetch all account_move records
-            source_db_cur.execute("SELECT * FROM account_move")
-            account_moves = source_db_cur.fetchall()
-
-            new_ids = defaultdict()
+    def action_migrate_account_move_line_data(self):
+        return self._start_migration_job(
+            'account_move_line', '_run_migration', ['account_move_line']
+        )
 
-            for record in account_moves:
-                source_id = record[source_columns.index('id')]
+    def action_migrate_account_customer_data(self):
+        return self._start_migration_job(
+            'res_partner', '_run_migration', ['res_partner']
+        )
+
+    def _migrate_orm_table(
+        self,
+        source_table,
+        id_range=None,
+        cache=None,
+        checkpoint=None,
+        since=None,
+        source_ids=None,
+    ):
+        """Migrate a source table through the ORM following its ``MIGRATION_SPECS``.
+
+        Every table whose spec ``write`` is 'orm' goes through this engine.
+
+        Rows are read, transformed and created in overlapping pipeline stages
+        (see ``model.mapping._run_batches``), optionally only the source ids
+        within ``id_range`` or in ``source_ids``. A record that fails to be
+        created is quarantined and skipped. Every batch is committed together
+        with its mappings, its quarantined rows and the moved ``checkpoint``,
+        whose last source id the rows are read after. With ``since`` only the
+        rows created or written after that watermark are read and already
+        migrated ones are written on their target record. Returns the row
+        counters.
+        """
+        mapping = self.env['model.mapping']
+        source_model = mapping._normalize_model_key(source_table)
+        # Translation cache shared by every row of this run
+        cache = cache or mapping._new_mapping_cache()
+        stats = {'migrated': 0, 'skipped': 0, 'failed': 0, 'updated': 0}
+
+        with self._borrow_connections() as (source_db, _target_db):
+            try:
+                lookups = mapping._load_lookups(source_db)
+                source_records, source_columns, transform_batch = (
+                    mapping._open_source_table(
+                        source_db,
+                        source_table,
+                        cache,
+                        lookups,
+                        itersize=self.fetch_itersize,
+                        id_range=id_range,
+                        after_id=checkpoint._resume_after() if checkpoint else None,
+                        since=since,
+                        source_ids=source_ids,
+                    )
+                )
+                get_source_id = column_getter(source_columns, 'id')
+                mapping._preload_table_mappings(cache, source_table)
+                metrics = TableMetrics(source_table)
+
+                def prepare_batch(batch):
+                    # Skip the records that already exist in the mapping, a delta
+                    # sync updates them
+                    pending = [
+                        record
+                        for record in batch
+                        if since
+                        or not cache.contains(source_model, get_source_id(record))
+                    ]
+                    source_ids = [get_source_id(record) for record in pending]
+                    batch_values, rejected = (
+                        transform_batch(pending) if pending else ([], {})
+                    )
+                    mapping._log_rejected_rows(source_table, rejected, source_ids)
+                    metrics.count('transformed', len(pending) - len(rejected))
+                    return {
+                        'last_source_id': max(
+                            get_source_id(record) for record in batch
+                        ),
+                        'skipped': len(batch) - len(pending),
+                        'rejected': [
+                            (
+                                source_ids[index],
+                                dict(zip(source_columns, pending[index])),
+                                reason,
+                            )
+                            for index, reason in rejected.items()
+                        ],
+                        'rows': [
+                            (
+                                source_id,
+                                cache.get(source_model, source_id) if since else None,
+                                record_values,
+                            )
+                            for source_id, record_values in zip(
+                                source_ids, batch_values
+                            )
+                            if record_values is not None
+                        ],
+                    }
+
+                def write_batch(prepared):
+                    batch_stats = {
+                        'migrated': 0,
+                        'skipped': prepared['skipped'],
+                        'failed': 0,
+                        'updated': 0,
+                    }
+                    quarantined = list(prepared['rejected'])
+
+                    def quarantine(row, error):
+                        _sampled_logger.error(
+                            (source_table, 'failed'),
+                            "Error migrating %s ID %s: %s",
+                            source_table,
+                            row[0],
+                            error,
+                        )
+                        quarantined.append((row[0], row[-1], error))
+
+                    # Completes the values of the new records in place (product
+                    # template attribute lines).
+                    new_rows = mapping._prepare_orm_rows(
+                        source_db,
+                        source_model,
+                        [
+                            (source_id, record_values)
+                            for source_id, target_id, record_values in prepared['rows']
+                            if target_id is None
+                        ],
+                        cache,
+                    )
+                    with metrics.timer('write'):
+                        id_pairs = self._create_orm_rows(
+                            source_model, new_rows, quarantine
+                        )
+                        batch_stats['updated'] = self._update_orm_rows(
+                            source_model,
+                            [row for row in prepared['rows'] if row[1] is not None],
+                            quarantine,
+                        )
+                    cache.update(source_model, id_pairs)
+                    batch_stats['migrated'] += len(id_pairs)
+
+                    batch_stats['failed'] = len(quarantined)
+                    # Records, mappings, quarantine and checkpoint share one commit,
+                    # so an interrupted table resumes after its last committed batch.
+                    with metrics.timer('mapping_write'):
+                        mapping.create([
+                            {
+                                'model_id': source_model,
+                                'source_db_id': source_id,
+                                'target_db_id': target_id,
+                            }
+                            for source_id, target_id in id_pairs
+                        ])
+                        mapping._quarantine(
+                            self.env.cr, checkpoint, source_table, quarantined
+                        )
+                        if checkpoint:
+                            checkpoint._advance(
+                                self.env.cr, prepared['last_source_id'], **batch_stats
+                            )
+                    with metrics.timer('commit'):
+                        self.env.cr.commit()
+                    for key, value in batch_stats.items():
+                        stats[key] += value
+                    metrics.count('inserted', batch_stats['migrated'])
+                    for key in ('updated', 'skipped', 'failed'):
+                        metrics.count(key, batch_stats[key])
+
+                mapping._run_batches(
+                    source_table,
+                    split_every(self.batch_size or DEFAULT_BATCH_SIZE, source_records),
+                    prepare_batch,
+                    write_batch,
+                    metrics,
+                )
+                with metrics.timer('write'):
+                    mapping._patch_parents(
+                        source_db,
+                        source_table,
+                        id_range=id_range,
+                        since=since,
+                        source_ids=source_ids,
+                    )
+                with metrics.timer('commit'):
+                    self.env.cr.commit()
+                mapping._finish_table_metrics(metrics, checkpoint)
+                mapping._finish_mapping_cache(cache, source_table)
+            except Exception as e:
+                _logger.error("Error during %s migration: %s", source_table, e)
+                raise ValidationError(
+                    _("Error during %s migration: %s") % (source_table, str(e))
+                )
+        return stats
+
+    def _create_orm_rows(self, source_model, rows, quarantine):
+        """Create the (source id, values) ``rows`` and return their id pairs.
+
+        Records are created in bulk unless the write mode asks for one create
+        per record. A failing record is passed to ``quarantine`` and skipped.
+        """
+        mapping = self.env['model.mapping']
+        if self.write_mode != 'row':
+            return mapping._create_records_orm(source_model, rows, quarantine)
+        id_pairs = []
+        for source_id, record_values in rows:
+            try:
+                with self.env.cr.savepoint():
+                    record = self.env[source_model].create(record_values)
+                id_pairs.append((source_id, record.id))
+            except Exception as e:
+                quarantine((source_id, record_values), e)
+        return id_pairs
+
+    def _update_orm_rows(self, source_model, rows, quarantine):
+        """Write the (source id, target id, values) ``rows`` on their records.
+
+        Rows changing the same fields are written in chunks, a failing chunk is
+        bisected down to its bad rows. Returns the number of rows written.
+        """
+        mapping = self.env['model.mapping']
+        changed_rows = defaultdict(list)
+        for row in rows:
+            changed_rows[frozenset(row[2])].append(row)
+        updated = 0
+        for group in changed_rows.values():
+            updated += write_bisecting(
+                group,
+                lambda chunk: mapping._update_records_orm(
+                    source_model,
+                    [row[1] for row in chunk],
+                    [row[2] for row in chunk],
+                ),
+                self.env.cr.savepoint,
+                quarantine,
+            )
+        return updated
 
-                if source_id in existing_mapping:
-                    print("Skipping account_move ID %s, already migrated.", source_id)
-                    new_ids[source_id] = existing_mapping[source_id]
-                    continue
+    def action_migrate_account_account(self):
+        return self._start_migration_job(
+            'account_account', '_run_migration', ['account_account', 'account_journal']
+        )
 
+    def action_migrate_product_product(self):
+        # 'product_category', 'product_attribute', 'product_attribute_value',
+        # 'product_template_attribute_line',
+        # 'product_attribute_value_product_template_attribute_line_rel',
+        # 'product_attribute_product_template_rel'
+        return self._start_migration_job(
+            'product_product', '_run_migration', ['product_template']
+        )
+
+    def action_migrate_all(self):
+        """Migrate every table, the ones not depending on each other concurrently."""
+        return self._start_migration_job(
+            'all', '_run_migration_graph', DEFAULT_MIGRATION_TABLES
+        )
+
+    def _start_migration_job(self, name, method, tables):
+        """Start ``method`` over ``tables`` in a thread and open the run tracking it.
+
+        The run is committed before the thread starts, so the request returns
+        at once and the web worker is not held for the length of the migration.
+        """
+        self.ensure_one()
+        run = self._prepare_migration_run(name)
+        key = (self.env.registry.db_name, run.id)
+        with _MIGRATION_JOBS_LOCK:
+            job = _MIGRATION_JOBS.get(key)
+            if job and job.is_alive():
+                raise ValidationError(
+                    _("Migration run %s is already in progress") % run.id
+                )
+            job = threading.Thread(
+                target=self._run_migration_job,
+                args=(run.id, method, tables),
+                name=f'migration-{run.id}',
+                daemon=True,
+            )
+            _MIGRATION_JOBS[key] = job
+        job.start()
+        return {
+            'type': 'ir.actions.act_window',
+            'name': _('Migration Run'),
+            'res_model': 'migration.run',
+            'res_id': run.id,
+            'view_mode': 'form',
+            'target': 'current',
+        }
+
+    def _prepare_migration_run(self, name):
+        """Return the unfinished run of an action to resume, or a new committed run."""
+        run = self.env['migration.run'].search(
+            [
+                ('connection_id', '=', self.id),
+                ('name', '=', name),
+                ('state', '!=', 'done'),
+            ],
+            limit=1,
+        )
+        if run:
+            # A job of another server process may be running it: only its lock tells.
+            if not self._lock_migration_run(self.env.cr, run.id):
+                raise ValidationError(
+                    _("Migration run %s is already in progress") % run.id
+                )
+            self._unlock_migration_run(self.env.cr, run.id)
+            _logger.info("Resuming migration run %s of %s", run.id, name)
+            run.write({'state': 'running', 'error': False, 'finished_at': False})
+        else:
+            run = self.env['migration.run'].create({
+                'name': name,
+                'connection_id': self.id,
+            })
+        self.env.cr.commit()
+        return run
+
+    def _run_migration_job(self, run_id, method, tables):
+        """Body of a background migration thread, running on its own cursor."""
+        threading.current_thread().dbname = self.env.registry.db_name
+        try:
+            with self.env.registry.cursor() as cr:
+                # The run stays locked in the database for the whole job, whatever
+                # process launched it.
+                if not self._lock_migration_run(cr, run_id):
+                    _logger.warning(
+                        "Migration run %s is already in progress in another process",
+                        run_id,
+                    )
+                    return
                 try:
-                    # Prepare account.move values
-                    move_values = {f: record[source_columns.index(f)] for f in shared_fields}
-                    move_values['move_type'] = record[source_columns.index('type')]
-                    move_values['auto_post'] = 'yes' if record[source_columns.index('auto_post')] else 'no'
-
-                    # map journal_id
-                    journal_model_mapping = self.model_mapping_id('account.journal')
-                    print(move_values)
-                    print(journal_model_mapping)
-                    if move_values['journal_id']:
-                        print(int(journal_model_mapping[move_values['journal_id']]))
-                        move_values['journal_id'] = journal_model_mapping[move_values['journal_id']]
-                    # Create account.move record
-                    move = self.env['account.move'].create(move_values)
-                    new_ids[source_id] = move.id
-
-                    # Create mapping for the new record
-                    self.env['model.mapping'].create({
-                        'model_id': 'account.move',
-                        'source_db_id': source_id,
-                        'target_db_id': move.id
-                    })
-
-                    _logger.info("Successfully migrated account_move ID %s to %s.", source_id, move.id)
-
-                except Exception as e:
-                    _logger.error("Error migrating account_move ID %s: %s", source_id, str(e))
-                    continue
-
+                    env = api.Environment(cr, self.env.uid, self.env.context)
+                    connection = self.with_env(env).with_context(
+                        migration_connection_id=self.id
+                    )
+                    run = env['migration.run'].browse(run_id)
+                    # One pool session for the whole job: every table borrows from the
+                    # same open connections.
+                    with (
+                        connection._connection_session(),
+                        connection._migration_run(run, tables),
+                    ):
+                        getattr(connection, method)(run, tables)
+                finally:
+                    cr.rollback()
+                    self._unlock_migration_run(cr, run_id)
+        except Exception:
+            _logger.exception("Migration run %s failed", run_id)
         finally:
-            # Ensure cursor and connection cleanup
-            source_db_cur.close()
-            source_db.close()
-            target_db.close()
-
-    def action_migrate_account_move_line_data(self):
-        # Get model mapping
-        model_mapping_account_move_line = self.env['model.mapping'].search([('model_id', '=', 'account.move.line')])
-        model_mapping_account_move = self.env['model.mapping'].search([('model_id', '=', 'account.move')])
-        account_account  = self.env['model.mapping'].search([('model_id', '=', 'account.account')])
-        account_journal  = self.env['model.mapping'].search([('model_id', '=', 'account.journal')])
-        existing_mapping = {rec['source_db_id']: rec['target_db_id'] for rec in
-                            model_mapping_account_move_line.read(['source_db_id', 'target_db_id'])}
-        account_move_mapping = {rec['source_db_id']: rec['target_db_id'] for rec in
-                                model_mapping_account_move.read(['source_db_id', 'target_db_id'])}
-        account_account_mapping = {rec['source_db_id']: rec['target_db_id'] for rec in
-                                account_account.read(['source_db_id', 'target_db_id'])}
-        account_journal_mapping = {rec['source_db_id']: rec['target_db_id'] for rec in
-                                   account_journal.read(['source_db_id', 'target_db_id'])}
-
+            with _MIGRATION_JOBS_LOCK:
+                _MIGRATION_JOBS.pop((self.env.registry.db_name, run_id), None)
+
+    def _lock_migration_run(self, cr, run_id):
+        """Take the session advisory lock of a run on ``cr``, False if already held.
+
+        The lock survives the commits of the job and is released by
+        ``_unlock_migration_run`` or when the connection closes.
+        """
+        cr.execute("SELECT pg_try_advisory_lock(%s, %s)", (MIGRATION_RUN_LOCK, run_id))
+        return cr.fetchone()[0]
+
+    def _unlock_migration_run(self, cr, run_id):
+        """Release the session advisory lock of a run taken on ``cr``."""
+        cr.execute("SELECT pg_advisory_unlock(%s, %s)", (MIGRATION_RUN_LOCK, run_id))
+
+    @contextmanager
+    def _migration_run(self, run, tables):
+        """Estimate the rows of ``run`` and close it after the block, failed on error.
+
+        The run is committed before any table starts, so the checkpoints of its
+        tables can be written by every connection taking part in the migration.
+        """
+        with self._borrow_connections() as (source_db, _target_db):
+            run.rows_total = self.env['model.mapping']._estimate_source_rows(
+                source_db, tables
+            )
+            self._refresh_schema_catalogs(source_db)
+        self.env.cr.commit()
         try:
-            # Connect to source and target databases
-            source_db, target_db = self.check_connection()
+            yield run
         except Exception as e:
-            raise ValidationError(_("Error connecting to databases: %s") % str(e))
-
-        # Prepare to fetch data from source database
-        source_db_cur = source_db.cursor()
-
-        try:
-            source_db_cur.execute("SELECT * FROM account_move_line LIMIT 0")
-            source_columns = [desc[0] for desc in source_db_cur.description or []]
-            shared_fields = [
-                field for field in self.env['account.move.line']._fields
-                if field in source_columns and field != 'id'
+            self.env.cr.rollback()
+            run._finish(e)
+            raise
+        run._finish()
+
+    def _refresh_schema_catalogs(self, source_db):
+        """Check the schema catalogs against both databases, introspecting changes."""
+        catalogs = self.env['migration.schema.catalog']
+        with source_db.cursor() as cursor:
+            catalogs._get_catalog(self, cursor, 'source', refresh=True)
+        source_db.rollback()
+        catalogs._get_catalog(self, self.env.cr, 'target', refresh=True)
+
+    def _run_migration(self, run, tables):
+        """Migrate ``tables`` in order within ``run``, sharing one cache and pool."""
+        cache = self.env['model.mapping']._new_mapping_cache()
+        with self._connection_session():
+            for source_table in tables:
+                self._migrate_table(source_table, run, cache)
+
+    def _run_migration_graph(self, run, tables):
+        """Migrate ``tables`` within ``run``, independent ones concurrently."""
+        graph = self._migration_graph(tables)
+        with self._connection_session():
+            results, errors = run_dependency_graph(
+                graph,
+                lambda table: self._run_table_in_worker(table, run),
+                self.parallel_workers or 1,
+            )
+        if errors:
+            skipped = set(graph) - set(results) - set(errors)
+            message = '\n'.join(f"{table}: {error}" for table, error in errors.items())
+            if skipped:
+                message += '\n' + _("Not started: %s") % ', '.join(sorted(skipped))
+            raise ValidationError(_("Migration failed for some tables:\n%s") % message)
+
+    def _migration_graph(self, tables):
+        """Return the dependency graph of ``tables`` restricted to these tables.
+
+        A table depends on the tables of the models its spec translates
+        through, see ``migration_dependencies``.
+        """
+        table_by_model = {
+            self.env['model.mapping']._normalize_model_key(table): table
+            for table in tables
+        }
+        return {
+            table: [
+                table_by_model[model]
+                for model in migration_dependencies(table)
+                if table_by_model.get(model, table) != table
             ]
-
-            source_db_cur.execute("SELECT * FROM account_move_line")
-            source_records = source_db_cur.fetchall()
-            for record in source_records:
-                source_id = record[source_columns.index('id')]
-                move_id = record[source_columns.index('move_id')]
-                # Skip if the record already exists in the mapping
-                if source_id in existing_mapping:
-                    print(f"Record {source_id} already exists.")
-                    continue
-
-                # Prepare values for creating a new record
+            for table in tables
+        }
+
+    def _run_table_in_worker(self, source_table, run=None):
+        """Migrate one table on a dedicated cursor, committed once the table is done."""
+        with self.env.registry.cursor() as cr:
+            env = api.Environment(cr, self.env.uid, self.env.context)
+            return self.with_env(env)._migrate_table(
+                source_table, run and run.with_env(env)
+            )
+
+    def _migrate_table_partitioned(self, source_table, run=None, since=None):
+        """Split a source table into id ranges and migrate them concurrently.
+
+        The mappings the rows are translated through are loaded once and shared
+        read-only by every worker; the per-range results are merged at the end.
+        Within a run every range has its own checkpoint, and a resumed run
+        reuses the ranges of its previous attempt and skips finished ones.
+        """
+        id_ranges = run._partition_ranges(source_table) if run else []
+        if not id_ranges:
+            with self._borrow_connections() as (source_db, _target_db):
+                id_ranges = self.env['model.mapping']._source_id_ranges(
+                    source_db, source_table, self.table_partitions
+                )
+        checkpoints = {
+            id_range: run._table_checkpoint(source_table, id_range)
+            if run
+            else self.env['migration.run.table']
+            for id_range in id_ranges
+        }
+        id_ranges = [
+            id_range for id_range in id_ranges if checkpoints[id_range].state != 'done'
+        ]
+        cache = self.env['model.mapping']._new_mapping_cache()
+        shared_models = PARTITIONED_TABLES[source_table]
+        cache.preload(shared_models)
+
+        totals = defaultdict(int)
+        errors = []
+        with (
+            self._connection_session(),
+            ThreadPoolExecutor(
+                max_workers=len(id_ranges) or 1, thread_name_prefix='partition'
+            ) as executor,
+        ):
+            futures = {
+                executor.submit(
+                    self._run_partition_in_worker,
+                    source_table,
+                    id_range,
+                    cache,
+                    shared_models,
+                    checkpoints[id_range].id,
+                    since,
+                ): id_range
+                for id_range in id_ranges
+            }
+            for future in as_completed(futures):
+                id_range = futures[future]
                 try:
-                    move_line_values = {f: record[source_columns.index(f)] for f in shared_fields}
-                    move_line_values['move_id'] = int(account_move_mapping[move_id])
-                    move_line_values['currency_id'] = move_line_values['company_currency_id']
-                    move_line_values['account_id'] = account_account_mapping[move_line_values['account_id']]
-                    print(account_account_mapping)
-                    # move_line_values['journal_id'] = account_journal_mapping[move_line_values['journal_id']]
-                    print(move_line_values)
-                    # Create the record in the target database
-                    new_account_move_line = self.env['account.move.line'].create(move_line_values)
-                    self.env['model.mapping'].create({
-                        'model_id': 'account.move.line',
-                        'source_db_id': source_id,
-                        'target_db_id': new_account_move_line.id
-                    })
+                    stats = future.result()
                 except Exception as e:
-                    # Log the error and skip the problematic record
-                    print(f"Error processing record {source_id}: {str(e)}")
+                    _logger.error(
+                        "Partition %s-%s of %s failed: %s", *id_range, source_table, e
+                    )
+                    errors.append(f"{id_range[0]}-{id_range[1]}: {e}")
                     continue
-        except Exception as e:
-            print("aaaaaaaaaaaa")
-
-    def action_migrate_account_customer_data(self):
-        # Get the model mapping
-        model_mapping = self.env['model.mapping'].search([('model_id', '=', 'res.partner')])
-        existing_mapping = {rec['source_db_id']: rec['target_db_id'] for rec in
-                            model_mapping.read(['source_db_id', 'target_db_id'])}
-
+                _logger.info(
+                    "Partition %s-%s of %s done: %s", *id_range, source_table, stats
+                )
+                for key, value in stats.items():
+                    totals[key] += value
+        _logger.info(
+            "Migrated %s in %s partitions: %s",
+            source_table,
+            len(id_ranges),
+            dict(totals),
+        )
+        if errors:
+            raise ValidationError(
+                _("Some partitions of %s failed:\n%s")
+                % (source_table, '\n'.join(errors))
+            )
+        return dict(totals)
+
+    def _run_partition_in_worker(
+        self,
+        source_table,
+        id_range,
+        cache,
+        shared_models,
+        checkpoint_id=False,
+        since=None,
+    ):
+        """Migrate one id range of a table on a dedicated cursor and connection pair.
+
+        The worker only loads the mappings of the table's own rows within
+        ``id_range``, the ones its rows are checked against.
+        """
+        with self.env.registry.cursor() as cr:
+            env = api.Environment(cr, self.env.uid, self.env.context)
+            mapping = env['model.mapping']
+            source_model = mapping._normalize_model_key(source_table)
+            worker_cache = cache.spawn(
+                lambda model_id: mapping._read_mapping_pairs(
+                    model_id, id_range=id_range if model_id == source_model else None
+                ),
+                shared_models,
+            )
+            checkpoint = env['migration.run.table'].browse(checkpoint_id)
+            if source_table not in PARTITIONED_TABLES:
+                raise ValidationError(
+                    _("Table %s cannot be migrated by partitions") % source_table
+                )
+            checkpoint._set_state('running')
+            try:
+                stats = self.with_env(env)._migrate_orm_table(
+                    source_table, id_range, worker_cache, checkpoint, since
+                )
+            except Exception as e:
+                cr.rollback()
+                checkpoint._set_state('failed', e)
+                raise
+            checkpoint._set_state('done')
+            return stats
+
+    def _replay_source_rows(self, source_table, source_ids):
+        """Migrate the given rows of a source table again, with the engine of the table.
+
+        Rows already mapped are skipped, the ones failing again are quarantined again.
+        """
+        return self.env['model.mapping'].move_data_from_source_table(
+            source_table, source_ids=source_ids
+        )
+
+    def _migrate_table(self, source_table, run=None, cache=None):
+        """Run the engine of one source table, resuming from its checkpoint in ``run``.
+
+        In delta sync mode only the rows changed since the watermark of the last
+        finished migration of the table are read; without one the table is
+        migrated in full. The source clock is recorded as the new watermark
+        before any row is read.
+        """
+        checkpoint = (
+            run._table_checkpoint(source_table)
+            if run
+            else self.env['migration.run.table']
+        )
+        if checkpoint.state == 'done':
+            _logger.info(
+                "%s is already migrated in run %s, skipping", source_table, run.id
+            )
+            return None
+        since = None
+        if checkpoint:
+            if self.sync_mode == 'delta':
+                since = checkpoint._previous_watermark()
+                _logger.info(
+                    "Delta sync of %s since %s", source_table, since or "the beginning"
+                )
+            if not checkpoint.sync_started_at:
+                with self._borrow_connections() as (source_db, _target_db):
+                    checkpoint.sync_started_at = self.env[
+                        'model.mapping'
+                    ]._source_clock(source_db)
+        checkpoint._set_state('running')
         try:
-            # Connect to source and target databases
-            source_db, target_db = self.check_connection()
+            result = self._migrate_table_engine(source_table, checkpoint, cache, since)
         except Exception as e:
-            raise ValidationError(_("Error connecting to databases: %s") % str(e))
-
-        # Prepare to fetch data from source database
-        source_db_cur = source_db.cursor()
-
-        try:
-            source_db_cur.execute("SELECT * FROM res_partner LIMIT 0")
-            source_columns = [desc[0] for desc in source_db_cur.description or []]
-            shared_fields = [
-                field for field in self.env['res.partner']._fields
-                if field in source_columns and field != 'id'
-            ]
-
-            source_db_cur.execute("SELECT * FROM res_partner")
-            source_records = source_db_cur.fetchall()
-            print(existing_mapping)
-            for record in source_records:
-                source_id = record[source_columns.index('id')]
-
-                # Skip if the record already exists in the mapping
-                if str(source_id) in existing_mapping:
-                    print(f"Record {source_id} already exists.")
-                    continue
-
-                # Prepare values for creating a new record
-                try:
-                    customer_values = {f: record[source_columns.index(f)] for f in shared_fields}
-                    customer_values['commercial_partner_id'] = None
-
-                    # Create the record in the target database
-                    new_partner = self.env['res.partner'].create(customer_values)
-                    self.env['model.mapping'].create({
-                        'model_id': 'res.partner',
-                        'source_db_id': source_id,
-                        'target_db_id': new_partner.id
-                    })
-                except Exception as e:
-                    # Log the error and skip the problematic record
-                    print(f"Error processing record {source_id}: {str(e)}")
-                    continue
-        finally:
-            # Ensure cursors and connections are closed
-            source_db_cur.close()
-            source_db.close()
-            target_db.close()
-
-    def action_migrate_account_account(self):
-        self.env['model.mapping'].move_data_from_source_table("account_account")
-        self.env['model.mapping'].move_data_from_source_table('account_journal')
-
-
-    def action_migrate_product_product(self):
-        # self.env['model.mapping'].move_data_from_source_table("product_category")
-        # self.env['model.mapping'].move_data_from_source_table("product_attribute")
-        # self.env['model.mapping'].move_data_from_source_table("product_attribute_value")
-        # self.env['model.mapping'].move_data_from_source_table("product_template_attribute_line")
-        self.env['model.mapping'].move_data_from_source_table("product_template")
-
-        # self.env['model.mapping'].move_data_from_source_many_to_many_table('product_attribute_value_product_template_attribute_line_rel')
-        # self.env['model.mapping'].move_data_from_source_table("product_attribute_product_template_rel")
-
-
-
+            if checkpoint:
+                self.env.cr.rollback()
+                checkpoint._set_state('failed', e)
+            raise
+        checkpoint._set_state('done')
+        return result
+
+    def _migrate_table_engine(self, source_table, checkpoint, cache=None, since=None):
+        """Dispatch a source table to the engine migrating it."""
+        if source_table in PARTITIONED_TABLES and (self.table_partitions or 1) > 1:
+            return self._migrate_table_partitioned(
+                source_table, checkpoint.run_id, since
+            )
+        mapping = self.env['model.mapping']
+        engine = self._table_engine(source_table)
+        if engine == 'orm':
+            return self._migrate_orm_table(
+                source_table, cache=cache, checkpoint=checkpoint, since=since
+            )
+        if engine == 'relation':
+            if since:
+                # Relation rows carry no dates to compare with the watermark.
+                _logger.warning(
+                    "Delta sync does not support relation table %s, skipping",
+                    source_table,
+                )
+                return None
+            return mapping.move_data_from_source_many_to_many_table(
+                source_table, cache, checkpoint
+            )
+        return mapping.move_data_from_source_table(
+            source_table, cache, checkpoint, since
+        )
+
+    def _table_engine(self, source_table):
+        """Return the engine of a source table: 'orm', 'relation', 'set' or 'sql'.
+
+        The spec decides between the ORM, relation and SQL engines; a
+        ``set_based`` table only goes through set-based SQL in the 'set' write mode.
+        """
+        spec = self.env['model.mapping']._get_table_spec(source_table)
+        if spec.get('write') in ('orm', 'relation'):
+            return spec['write']
+        if self.write_mode == 'set' and spec.get('set_based'):
+            return 'set'
+        return 'sql'
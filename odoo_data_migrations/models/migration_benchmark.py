@@ -0,0 +1,374 @@
+import json
+import logging
+import threading
+import time
+
+import psycopg2
+from odoo import SUPERUSER_ID, _, api, fields, models, sql_db
+from odoo.exceptions import ValidationError
+from odoo.modules.registry import Registry
+
+from ..tools import (
+    SCALES,
+    PeakRssSampler,
+    create_database,
+    database_commits,
+    populate_synthetic_source,
+)
+
+_logger = logging.getLogger(__name__)
+
+# Migration entry points run by a benchmark, in dependency order: (run name, tables),
+# as the buttons launch them.
+BENCHMARK_ENTRY_POINTS = [
+    ('res_partner', ['res_partner']),
+    ('account_account', ['account_account', 'account_journal']),
+    ('account_move', ['account_move']),
+    ('account_move_line', ['account_move_line']),
+    ('product_product', ['product_template']),
+]
+
+
+class MigrationBenchmark(models.Model):
+    _name = 'migration.benchmark'
+    _description = 'Migration Benchmark'
+    _order = 'id desc'
+
+    name = fields.Char(
+        string='Name', required=True, default=lambda self: _('Benchmark')
+    )
+    connection_id = fields.Many2one(
+        'account.connect.db',
+        string='Connection',
+        required=True,
+        ondelete='cascade',
+        help="Connection whose settings are benchmarked. The synthetic source database "
+        "is created on its source server and migrated into a throwaway database of "
+        "its target server; neither of its own databases is written.",
+    )
+    scale = fields.Selection(
+        [
+            ('10k', '10k Journal Items'),
+            ('1m', '1M Journal Items'),
+            ('10m', '10M Journal Items'),
+        ],
+        string='Scale',
+        required=True,
+        default='10k',
+    )
+    source_db_name = fields.Char(
+        string='Synthetic Database',
+        required=True,
+        default='migration_benchmark_source',
+        help="Database (re)created on the source server and filled with generated old "
+        "schema rows.",
+    )
+    target_db_name = fields.Char(
+        string='Throwaway Target Database',
+        required=True,
+        default='migration_benchmark_target',
+        help="Database (re)created on the target server for every run, as a copy of "
+        "the template database, and migrated into by the benchmark.",
+    )
+    template_db_name = fields.Char(
+        string='Template Database',
+        required=True,
+        default='migration_benchmark_template',
+        help="Odoo database of the target server with this module installed and "
+        "nothing migrated, copied into the throwaway target database.",
+    )
+    state = fields.Selection(
+        [
+            ('draft', 'Draft'),
+            ('running', 'Running'),
+            ('done', 'Done'),
+            ('failed', 'Failed'),
+        ],
+        string='Status',
+        required=True,
+        default='draft',
+    )
+    generation_seconds = fields.Float(
+        string='Generation Time (s)', digits=(16, 2), readonly=True
+    )
+    error = fields.Text(string='Error', readonly=True)
+    line_ids = fields.One2many(
+        'migration.benchmark.line', 'benchmark_id', string='Results'
+    )
+    result = fields.Text(
+        string='Result',
+        compute='_compute_result',
+        help="Machine-readable JSON result of the benchmark.",
+    )
+
+    @api.depends('line_ids', 'state')
+    def _compute_result(self):
+        for benchmark in self:
+            benchmark.result = json.dumps(
+                {
+                    'scale': benchmark.scale,
+                    'move_lines': SCALES[benchmark.scale],
+                    'state': benchmark.state,
+                    'write_mode': benchmark.connection_id.write_mode,
+                    'batch_size': benchmark.connection_id.batch_size,
+                    'generation_seconds': benchmark.generation_seconds,
+                    'entry_points': [line._as_dict() for line in benchmark.line_ids],
+                },
+                indent=2,
+            )
+
+    def action_run(self):
+        """Start the benchmark in a background thread."""
+        self.ensure_one()
+        if self.state == 'running':
+            raise ValidationError(_("Benchmark %s is already running") % self.name)
+        self._check_database_names()
+        self.line_ids.unlink()
+        self.write({'state': 'running', 'error': False, 'generation_seconds': 0.0})
+        self.env.cr.commit()
+        threading.Thread(
+            target=self._run_in_thread, name=f'benchmark-{self.id}', daemon=True
+        ).start()
+
+    def action_refresh(self):
+        """Reload the form to show the entry points finished so far."""
+        return None
+
+    def _run_in_thread(self):
+        """Run the benchmark on a dedicated cursor and record its failure."""
+        threading.current_thread().dbname = self.env.registry.db_name
+        with self.env.registry.cursor() as cr:
+            benchmark = self.with_env(
+                api.Environment(cr, self.env.uid, self.env.context)
+            )
+            try:
+                benchmark._run_benchmark()
+            except Exception as e:
+                _logger.exception("Benchmark %s failed", benchmark.id)
+                cr.rollback()
+                benchmark.write({'state': 'failed', 'error': str(e)})
+
+    def _check_database_names(self):
+        """Refuse database names that would make the benchmark drop a real database.
+
+        The synthetic source and the throwaway target are dropped and recreated
+        by every run, so neither may be a database of the connection, the
+        current database or the template.
+        """
+        self.ensure_one()
+        protected = self._protected_databases()
+        if self.source_db_name in protected:
+            raise ValidationError(
+                _("The synthetic database %s is not a throwaway database")
+                % self.source_db_name
+            )
+        if self.target_db_name in protected | {
+            self.source_db_name,
+            self.template_db_name,
+        }:
+            raise ValidationError(
+                _("The throwaway target database %s is not a throwaway database")
+                % self.target_db_name
+            )
+        if self.template_db_name in protected | {self.source_db_name}:
+            raise ValidationError(
+                _("The template database %s cannot be a database of the connection")
+                % self.template_db_name
+            )
+
+    def _protected_databases(self):
+        """Return the databases the benchmark must never drop."""
+        return {
+            self.connection_id.db_source_name,
+            self.connection_id.db_target_name,
+            self.env.cr.dbname,
+        }
+
+    def _run_benchmark(self):
+        """Generate the synthetic source database, then time every entry point on it.
+
+        The entry points migrate into ``target_db_name``, recreated from
+        ``template_db_name`` and driven through its own registry, so the
+        current database only receives the results.
+        """
+        self.ensure_one()
+        self._check_database_names()
+        protected = self._protected_databases()
+        source_params, target_params = self.connection_id._connection_params()
+        create_database(source_params, self.source_db_name, protected=protected)
+        source_db = psycopg2.connect(**{**source_params, 'dbname': self.source_db_name})
+        try:
+            started_at = time.perf_counter()
+            sizes = populate_synthetic_source(source_db, SCALES[self.scale])
+            self.generation_seconds = time.perf_counter() - started_at
+        finally:
+            source_db.close()
+        _logger.info(
+            "Generated synthetic source %s in %.1fs: %s",
+            self.source_db_name,
+            self.generation_seconds,
+            sizes,
+        )
+
+        self.env.cr.commit()
+
+        self._release_target_database()
+        create_database(
+            target_params,
+            self.target_db_name,
+            template=self.template_db_name,
+            protected=protected,
+        )
+        try:
+            with Registry(self.target_db_name).cursor() as target_cr:
+                target_env = api.Environment(target_cr, SUPERUSER_ID, {})
+                self._check_unmigrated_target(target_env)
+                connection = self._prepare_benchmark_connection(target_env)
+                target_cr.commit()
+                target_db = psycopg2.connect(**{
+                    **target_params,
+                    'dbname': self.target_db_name,
+                })
+                try:
+                    for name, tables in BENCHMARK_ENTRY_POINTS:
+                        self._run_entry_point(connection, target_db, name, tables)
+                finally:
+                    target_db.close()
+        finally:
+            self._release_target_database()
+        self.state = 'done'
+        self.env.cr.commit()
+
+    def _release_target_database(self):
+        """Unload the registry of the throwaway target and close its connections.
+
+        A database with open connections can be neither dropped nor recreated.
+        """
+        Registry.delete(self.target_db_name)
+        sql_db.close_db(self.target_db_name)
+
+    def _check_unmigrated_target(self, target_env):
+        """Refuse a template database where the benchmarked models were migrated.
+
+        Their mappings would make the synthetic rows be skipped as migrated.
+        """
+        mapping = target_env['model.mapping']
+        model_ids = {
+            mapping._normalize_model_key(table)
+            for _name, tables in BENCHMARK_ENTRY_POINTS
+            for table in tables
+        }
+        target_env.cr.execute(
+            "SELECT DISTINCT model_id FROM model_mapping WHERE model_id IN %s",
+            (tuple(model_ids),),
+        )
+        migrated = sorted(model_id for (model_id,) in target_env.cr.fetchall())
+        if migrated:
+            raise ValidationError(
+                _(
+                    "The template database %s already holds migrated %s records, a "
+                    "benchmark needs a database without migrations."
+                )
+                % (self.template_db_name, ', '.join(migrated))
+            )
+
+    def _prepare_benchmark_connection(self, target_env):
+        """Create, in the throwaway target, the connection the benchmark migrates with.
+
+        It is a copy of the benchmarked connection reading the synthetic
+        database and writing into the throwaway target.
+        """
+        values = self.connection_id.copy_data({
+            'db_source_name': self.source_db_name,
+            'db_target_name': self.target_db_name,
+            'sync_mode': 'full',
+            # Persisted id maps would outlive the throwaway target.
+            'mapping_store_dir': False,
+        })[0]
+        connection = target_env['account.connect.db'].create(values)
+        return connection.with_context(migration_connection_id=connection.id)
+
+    def _run_entry_point(self, connection, target_db, name, tables):
+        """Migrate ``tables`` like their button, recording rows/s, RSS and commits.
+
+        The per-row transform cost of every table is measured afterwards, see
+        ``model.mapping._benchmark_row_transform``.
+        """
+        commits_before = database_commits(target_db)
+        # A fresh run every time: resuming an earlier one would skip its finished
+        # tables.
+        run = connection.env['migration.run'].create({
+            'name': name,
+            'connection_id': connection.id,
+        })
+        connection.env.cr.commit()
+        error = False
+        with PeakRssSampler() as rss:
+            started_at = time.perf_counter()
+            try:
+                with connection._migration_run(run, tables):
+                    connection._run_migration(run, tables)
+            except Exception as e:
+                _logger.error("Benchmark entry point %s failed: %s", name, e)
+                error = str(e)
+            seconds = time.perf_counter() - started_at
+        connection.env.invalidate_all()
+        mapping = connection.env['model.mapping']
+        try:
+            transform_costs = {
+                table: mapping._benchmark_row_transform(table) for table in tables
+            }
+        except Exception as e:
+            _logger.error("Row transform benchmark of %s failed: %s", name, e)
+            transform_costs = {}
+        rows = run.rows_processed
+        self.env['migration.benchmark.line'].create({
+            'benchmark_id': self.id,
+            'entry_point': name,
+            'rows': rows,
+            'seconds': seconds,
+            'rows_per_second': rows / seconds if seconds else 0.0,
+            'peak_rss_mb': rss.peak / (1024 * 1024),
+            'target_commits': database_commits(target_db) - commits_before,
+            'transform_costs': json.dumps(transform_costs, sort_keys=True),
+            'error': error,
+        })
+        self.env.cr.commit()
+
+
+class MigrationBenchmarkLine(models.Model):
+    _name = 'migration.benchmark.line'
+    _description = 'Migration Benchmark Result'
+    _order = 'benchmark_id, id'
+
+    benchmark_id = fields.Many2one(
+        'migration.benchmark', string='Benchmark', required=True, ondelete='cascade'
+    )
+    entry_point = fields.Char(string='Entry Point', required=True)
+    rows = fields.Integer(string='Rows')
+    seconds = fields.Float(string='Seconds', digits=(16, 2))
+    rows_per_second = fields.Float(string='Rows / Second', digits=(16, 1))
+    peak_rss_mb = fields.Float(string='Peak RSS (MB)', digits=(16, 1))
+    target_commits = fields.Integer(
+        string='Target Commits',
+        help="Transactions committed in the target database while the entry point ran.",
+    )
+    transform_costs = fields.Text(
+        string='Row Transform Costs',
+        help="JSON of the nanoseconds per row spent transforming each table, by "
+        "transform implementation.",
+    )
+    error = fields.Text(string='Error')
+
+    def _as_dict(self):
+        self.ensure_one()
+        return {
+            'entry_point': self.entry_point,
+            'rows': self.rows,
+            'seconds': round(self.seconds, 3),
+            'rows_per_second': round(self.rows_per_second, 1),
+            'peak_rss_mb': round(self.peak_rss_mb, 1),
+            'target_commits': self.target_commits,
+            'transform_ns_per_row': json.loads(self.transform_costs or '{}'),
+            'error': self.error or None,
+        }
@@ -0,0 +1,57 @@
+import logging
+
+from odoo import _, fields, models
+from odoo.exceptions import ValidationError
+
+_logger = logging.getLogger(__name__)
+
+
+class MigrationLookup(models.Model):
+    _name = 'migration.lookup'
+    _description = 'Migration Lookup Table'
+
+    name = fields.Char(
+        string='Name', required=True, help="Key the row transforms read this lookup by."
+    )
+    active = fields.Boolean(default=True)
+    lookup_type = fields.Selection(
+        [('source_table', 'Source Table'), ('target_selection', 'Target Selection')],
+        string='Type',
+        required=True,
+        default='source_table',
+        help="Source Table maps a key column to a value column of a small source "
+        "table. Target Selection maps the labels of a selection field of the target to "
+        "their values.",
+    )
+    source_table = fields.Char(string='Source Table')
+    key_column = fields.Char(string='Key Column', default='id')
+    value_column = fields.Char(string='Value Column', default='name')
+    model_name = fields.Char(string='Target Model')
+    field_name = fields.Char(string='Target Field')
+
+    _sql_constraints = [
+        ('name_uniq', 'unique(name)', 'A lookup with this name already exists.'),
+    ]
+
+    def _load_all(self, source_db):
+        """Load every lookup of the recordset into a {name: {key: value}} dict."""
+        return {lookup.name: lookup._load(source_db) for lookup in self}
+
+    def _load(self, source_db):
+        """Return the {key: value} dict of this lookup."""
+        self.ensure_one()
+        if self.lookup_type == 'target_selection':
+            selection = self.env[self.model_name].fields_get(
+                allfields=[self.field_name]
+            )[self.field_name]['selection']
+            return {label: value for value, label in selection}
+        if not self.source_table:
+            raise ValidationError(_("Lookup %s has no source table") % self.name)
+        with source_db.cursor() as cursor:
+            cursor.execute(
+                f"SELECT {self.key_column}, {self.value_column} "
+                f"FROM {self.source_table}"
+            )
+            values = dict(cursor.fetchall())
+        _logger.info("Loaded %s rows of lookup %s", len(values), self.name)
+        return values
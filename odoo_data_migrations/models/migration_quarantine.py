@@ -0,0 +1,137 @@
+import json
+import logging
+
+from odoo import _, api, fields, models
+from odoo.exceptions import UserError
+from psycopg2.extras import execute_values
+
+_logger = logging.getLogger(__name__)
+
+
+class MigrationQuarantine(models.Model):
+    _name = 'migration.quarantine'
+    _description = 'Migration Quarantined Row'
+    _order = 'id desc'
+
+    connection_id = fields.Many2one(
+        'account.connect.db', string='Connection', required=True, ondelete='cascade'
+    )
+    run_id = fields.Many2one('migration.run', string='Run', ondelete='set null')
+    source_table = fields.Char(string='Source Table', required=True)
+    source_id = fields.Integer(
+        string='Source ID', help="Empty for rows of relation tables, which have no id."
+    )
+    record_values = fields.Text(
+        string='Values',
+        help="JSON of the transformed values that could not be written.",
+    )
+    error = fields.Text(string='Error')
+    attempts = fields.Integer(string='Attempts', default=1)
+    state = fields.Selection(
+        [('quarantined', 'Quarantined'), ('replayed', 'Replayed')],
+        string='Status',
+        required=True,
+        default='quarantined',
+    )
+
+    _sql_constraints = [
+        (
+            'source_uniq',
+            'unique(connection_id, source_table, source_id)',
+            'A source row is quarantined only once per connection.',
+        ),
+    ]
+
+    @api.model
+    def _quarantine_rows(self, cursor, connection_id, run_id, source_table, rows):
+        """Store failed ``(source id, values, error)`` rows via ``cursor``, uncommitted.
+
+        ``cursor`` belongs to the connection committing the batch, so a row is
+        quarantined in the same transaction its batch is written in. A row
+        quarantined again has its error replaced and its attempts counted.
+        """
+        rows = list(
+            {row[0] if row[0] is not None else id(row): row for row in rows}.values()
+        )
+        if not rows:
+            return
+        execute_values(
+            cursor,
+            """
+            INSERT INTO migration_quarantine (connection_id, run_id, source_table,
+                                              source_id, record_values, error,
+                                              attempts, state, create_uid, create_date,
+                                              write_uid, write_date)
+            VALUES %s
+            ON CONFLICT (connection_id, source_table, source_id) DO UPDATE
+            SET run_id = EXCLUDED.run_id,
+                record_values = EXCLUDED.record_values,
+                error = EXCLUDED.error,
+                attempts = migration_quarantine.attempts + 1,
+                state = 'quarantined',
+                write_date = EXCLUDED.write_date
+        """,
+            [
+                (
+                    connection_id,
+                    run_id or None,
+                    source_table,
+                    source_id,
+                    json.dumps(values, default=str),
+                    str(error),
+                    self.env.uid,
+                    self.env.uid,
+                )
+                for source_id, values, error in rows
+            ],
+            template="(%s, %s, %s, %s, %s, %s, 1, 'quarantined', "
+            "%s, now() at time zone 'UTC', %s, now() at time zone 'UTC')",
+            page_size=len(rows),
+        )
+        _logger.warning("Quarantined %s rows of %s", len(rows), source_table)
+
+    def action_replay(self):
+        """Migrate the quarantined rows again, once the cause of their failure is fixed.
+
+        Rows that are written this time are marked replayed; the ones failing
+        again stay quarantined with their new error.
+        """
+        rows = self.filtered(lambda row: row.state == 'quarantined')
+        if rows.filtered(lambda row: not row.source_id):
+            raise UserError(
+                _("Rows of relation tables have no source id and cannot be replayed.")
+            )
+        groups = {}
+        for row in rows:
+            groups.setdefault((row.connection_id, row.source_table), []).append(
+                row.source_id
+            )
+        for (connection, source_table), source_ids in groups.items():
+            connection.with_context(
+                migration_connection_id=connection.id
+            )._replay_source_rows(source_table, source_ids)
+        # The replay wrote through other connections; start a transaction that sees
+        # their work.
+        self.env.cr.commit()
+        mapping = self.env['model.mapping']
+        for (connection, source_table), source_ids in groups.items():
+            self.env.cr.execute(
+                """
+                UPDATE migration_quarantine quarantine
+                SET state = 'replayed', write_date = now() at time zone 'UTC'
+                FROM model_mapping mapping
+                WHERE quarantine.connection_id = %s
+                  AND quarantine.source_table = %s
+                  AND quarantine.source_id = ANY(%s)
+                  AND quarantine.state = 'quarantined'
+                  AND mapping.model_id = %s
+                  AND mapping.source_db_id = quarantine.source_id
+            """,
+                (
+                    connection.id,
+                    source_table,
+                    source_ids,
+                    mapping._normalize_model_key(source_table),
+                ),
+            )
+        self.invalidate_recordset()
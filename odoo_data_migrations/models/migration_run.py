@@ -0,0 +1,282 @@
+import json
+import logging
+from datetime import timedelta
+
+from odoo import api, fields, models
+
+_logger = logging.getLogger(__name__)
+
+
+class MigrationRun(models.Model):
+    _name = 'migration.run'
+    _description = 'Migration Run'
+    _order = 'id desc'
+
+    name = fields.Char(
+        string='Name', required=True, help="Migration action this run belongs to."
+    )
+    connection_id = fields.Many2one(
+        'account.connect.db', string='Connection', required=True, ondelete='cascade'
+    )
+    state = fields.Selection(
+        [('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')],
+        string='Status',
+        required=True,
+        default='running',
+    )
+    started_at = fields.Datetime(string='Started', default=fields.Datetime.now)
+    finished_at = fields.Datetime(string='Finished')
+    error = fields.Text(string='Error')
+    table_ids = fields.One2many('migration.run.table', 'run_id', string='Tables')
+    rows_total = fields.Integer(
+        string='Estimated Rows',
+        help="Row estimate of the source tables taken from the planner when the run "
+        "starts.",
+    )
+    rows_processed = fields.Integer(
+        string='Processed Rows', compute='_compute_progress'
+    )
+    error_count = fields.Integer(
+        string='Errors',
+        compute='_compute_progress',
+        help="Rows that failed plus tables or partitions that failed.",
+    )
+    progress = fields.Float(string='Progress', compute='_compute_progress')
+    throughput = fields.Float(
+        string='Rows / Second', compute='_compute_progress', digits=(16, 1)
+    )
+    eta = fields.Datetime(string='Estimated End', compute='_compute_progress')
+    summary = fields.Text(
+        string='Summary',
+        compute='_compute_summary',
+        help="Machine-readable JSON summary of the run: totals and the metrics of "
+        "every table.",
+    )
+
+    @api.depends(
+        'table_ids.rows_migrated',
+        'table_ids.rows_skipped',
+        'table_ids.rows_failed',
+        'table_ids.rows_updated',
+        'table_ids.state',
+        'rows_total',
+        'started_at',
+        'finished_at',
+    )
+    def _compute_progress(self):
+        """Derive the progress of a run from the committed checkpoint counters."""
+        now = fields.Datetime.now()
+        for run in self:
+            lines = run.table_ids
+            processed = sum(
+                line.rows_migrated
+                + line.rows_skipped
+                + line.rows_failed
+                + line.rows_updated
+                for line in lines
+            )
+            run.rows_processed = processed
+            run.error_count = sum(lines.mapped('rows_failed')) + len(
+                lines.filtered(lambda line: line.state == 'failed')
+            )
+            run.progress = (
+                min(100.0, 100.0 * processed / run.rows_total)
+                if run.rows_total
+                else 0.0
+            )
+            elapsed = (
+                ((run.finished_at or now) - run.started_at).total_seconds()
+                if run.started_at
+                else 0
+            )
+            run.throughput = processed / elapsed if elapsed > 0 else 0.0
+            remaining = max(run.rows_total - processed, 0)
+            run.eta = (
+                now + timedelta(seconds=remaining / run.throughput)
+                if run.state == 'running' and run.throughput
+                else False
+            )
+
+    def _table_checkpoint(self, source_table, id_range=None):
+        """Return the checkpoint of a table or of one id range of it, created if needed.
+
+        A new checkpoint is committed right away so the connections writing the
+        batches can update it in their own transactions.
+        """
+        self.ensure_one()
+        range_start, range_end = id_range or (0, 0)
+        checkpoint = self.table_ids.filtered(
+            lambda line: (
+                line.source_table == source_table
+                and (line.range_start, line.range_end) == (range_start, range_end)
+            )
+        )
+        if not checkpoint:
+            checkpoint = self.env['migration.run.table'].create({
+                'run_id': self.id,
+                'source_table': source_table,
+                'range_start': range_start,
+                'range_end': range_end,
+            })
+            self.env.cr.commit()
+        return checkpoint[:1]
+
+    def _partition_ranges(self, source_table):
+        """Return the id ranges a previous attempt of this run split a table into."""
+        self.ensure_one()
+        return [
+            (line.range_start, line.range_end)
+            for line in self.table_ids.sorted('range_start')
+            if line.source_table == source_table and line.range_end
+        ]
+
+    @api.depends('state', 'table_ids.metrics', 'table_ids.state')
+    def _compute_summary(self):
+        for run in self:
+            run.summary = json.dumps(
+                run._summary(), indent=2, sort_keys=True, default=str
+            )
+
+    def _summary(self):
+        """Return the counters, phase times and table metrics of the run as a dict."""
+        self.ensure_one()
+        tables = [line._metrics() for line in self.table_ids if line.metrics]
+        rows = {}
+        seconds = {}
+        for table in tables:
+            for counter, value in table.get('rows', {}).items():
+                rows[counter] = rows.get(counter, 0) + value
+            for phase, value in table.get('seconds', {}).items():
+                seconds[phase] = round(seconds.get(phase, 0.0) + value, 3)
+        return {
+            'run': self.id,
+            'name': self.name,
+            'state': self.state,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'rows': rows,
+            'seconds': seconds,
+            'tables': tables,
+        }
+
+    def action_refresh(self):
+        """Reload the form to show the progress committed by the background job."""
+        return None
+
+    def _finish(self, error=None):
+        """Close the run and commit, a failed run is resumed by the next launch."""
+        self.write({
+            'state': 'failed' if error else 'done',
+            'finished_at': fields.Datetime.now(),
+            'error': error and str(error),
+        })
+        self.env.cr.commit()
+
+
+class MigrationRunTable(models.Model):
+    _name = 'migration.run.table'
+    _description = 'Migration Run Table Checkpoint'
+    _order = 'run_id, source_table, range_start'
+
+    run_id = fields.Many2one(
+        'migration.run', string='Run', required=True, ondelete='cascade'
+    )
+    source_table = fields.Char(string='Source Table', required=True)
+    range_start = fields.Integer(
+        string='Range Start',
+        help="First source id of the partition, 0 for a whole table.",
+    )
+    range_end = fields.Integer(
+        string='Range End', help="Last source id of the partition, 0 for a whole table."
+    )
+    last_source_id = fields.Integer(
+        string='Checkpoint',
+        help="Highest source id whose batch is committed; a resumed run starts after "
+        "it.",
+    )
+    rows_migrated = fields.Integer(string='Migrated')
+    rows_skipped = fields.Integer(string='Skipped')
+    rows_failed = fields.Integer(string='Failed')
+    rows_updated = fields.Integer(string='Updated')
+    sync_started_at = fields.Datetime(
+        string='Sync Watermark',
+        help="Source database time when the table started; the next delta sync reads "
+        "rows written after it.",
+    )
+    state = fields.Selection(
+        [
+            ('pending', 'Pending'),
+            ('running', 'Running'),
+            ('done', 'Done'),
+            ('failed', 'Failed'),
+        ],
+        string='Status',
+        required=True,
+        default='pending',
+    )
+    error = fields.Text(string='Error')
+    metrics = fields.Text(
+        string='Metrics',
+        help="JSON metrics of the table: row counters, phase times and batch latency "
+        "percentiles.",
+    )
+
+    def _metrics(self):
+        """Return the stored metrics as a dict, with the range of a partition."""
+        metrics = json.loads(self.metrics or '{}')
+        if self.range_end:
+            metrics['range'] = [self.range_start, self.range_end]
+        return metrics
+
+    def _resume_after(self):
+        """Return the source id a resumed migration continues after, None if unset."""
+        return (self.last_source_id or 0) if self else None
+
+    def _advance(
+        self, cursor, last_source_id, migrated=0, skipped=0, failed=0, updated=0
+    ):
+        """Move the checkpoint past a batch through ``cursor``, without committing.
+
+        ``cursor`` is the cursor committing the batch itself, so the data, its
+        mappings and the checkpoint become visible together or not at all.
+        """
+        if not self:
+            return
+        cursor.execute(
+            """
+            UPDATE migration_run_table
+            SET last_source_id = GREATEST(COALESCE(last_source_id, 0), COALESCE(%s, 0)),
+                rows_migrated = COALESCE(rows_migrated, 0) + %s,
+                rows_skipped = COALESCE(rows_skipped, 0) + %s,
+                rows_failed = COALESCE(rows_failed, 0) + %s,
+                rows_updated = COALESCE(rows_updated, 0) + %s,
+                write_date = now() at time zone 'UTC'
+            WHERE id = %s
+        """,
+            (last_source_id, migrated, skipped, failed, updated, self.id),
+        )
+        self.invalidate_recordset()
+
+    def _previous_watermark(self):
+        """Return the watermark of the last finished migration of this table."""
+        self.ensure_one()
+        previous = self.search(
+            [
+                ('run_id.connection_id', '=', self.run_id.connection_id.id),
+                ('source_table', '=', self.source_table),
+                ('range_end', '=', 0),
+                ('state', '=', 'done'),
+                ('sync_started_at', '!=', False),
+                ('id', '!=', self.id),
+            ],
+            order='sync_started_at desc',
+            limit=1,
+        )
+        return previous.sync_started_at
+
+    def _set_state(self, state, error=None):
+        """Record the state of the table and commit it."""
+        if not self:
+            return
+        self.write({'state': state, 'error': error and str(error)})
+        self.env.cr.commit()
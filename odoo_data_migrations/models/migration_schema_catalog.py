@@ -0,0 +1,88 @@
+import logging
+import threading
+
+from odoo import api, fields, models
+
+from ..tools import SchemaCatalog
+
+_logger = logging.getLogger(__name__)
+
+# Catalogs already loaded by this server process, keyed by (database, connection id,
+# side).
+_CATALOGS = {}
+_CATALOGS_LOCK = threading.Lock()
+
+
+class MigrationSchemaCatalog(models.Model):
+    _name = 'migration.schema.catalog'
+    _description = 'Migration Schema Catalog'
+
+    connection_id = fields.Many2one(
+        'account.connect.db', string='Connection', required=True, ondelete='cascade'
+    )
+    side = fields.Selection(
+        [('source', 'Source'), ('target', 'Target')], string='Database', required=True
+    )
+    fingerprint = fields.Char(
+        string='Fingerprint', help="Hash of the schema the catalog was read from."
+    )
+    table_count = fields.Integer(string='Tables')
+    catalog = fields.Text(
+        string='Catalog',
+        help="JSON of the columns of every table: name, SQL type and not null.",
+    )
+
+    _sql_constraints = [
+        (
+            'connection_side_uniq',
+            'unique(connection_id, side)',
+            'A connection has one catalog per database.',
+        ),
+    ]
+
+    @api.model
+    def _get_catalog(self, connection, cursor, side, refresh=False):
+        """Return the ``SchemaCatalog`` of the ``side`` database of ``connection``.
+
+        ``cursor`` is a cursor on that database. A catalog is kept in memory
+        once loaded; its fingerprint is only checked the first time it is
+        used by this process or when ``refresh`` is set, and the schema is
+        introspected again only when the fingerprint changed.
+        """
+        key = (self.env.registry.db_name, connection.id, side)
+        with _CATALOGS_LOCK:
+            catalog = _CATALOGS.get(key)
+        if catalog is not None and not refresh:
+            return catalog
+
+        fingerprint = SchemaCatalog.read_fingerprint(cursor)
+        if catalog is None or catalog.fingerprint != fingerprint:
+            stored = self.search(
+                [('connection_id', '=', connection.id), ('side', '=', side)], limit=1
+            )
+            if stored.catalog and stored.fingerprint == fingerprint:
+                catalog = SchemaCatalog.from_json(fingerprint, stored.catalog)
+            else:
+                catalog = SchemaCatalog.introspect(cursor)
+                values = {
+                    'fingerprint': catalog.fingerprint,
+                    'table_count': len(catalog.tables),
+                    'catalog': catalog.to_json(),
+                }
+                if stored:
+                    stored.write(values)
+                else:
+                    self.create({
+                        'connection_id': connection.id,
+                        'side': side,
+                        **values,
+                    })
+                _logger.info(
+                    "Introspected the %s schema of %s: %s tables",
+                    side,
+                    connection.display_name,
+                    len(catalog.tables),
+                )
+        with _CATALOGS_LOCK:
+            _CATALOGS[key] = catalog
+        return catalog
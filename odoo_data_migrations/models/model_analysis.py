@@ -1,23 +1,160 @@
-from networkx.algorithms.operators.binary import difference
-from odoo import fields, models
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from odoo import _, api, fields, models
 from odoo.exceptions import UserError
 
+from ..tools import read_table_stats
+
+_logger = logging.getLogger(__name__)
+
+# Relative cost of migrating one row with each write engine, to rank tables by
+# expected migration cost; every 8 kB page read from the source adds one unit.
+ENGINE_ROW_COSTS = {
+    'orm': 20.0,
+    'sql': 1.0,
+    'relation': 0.5,
+    'set': 0.2,
+}
+PAGE_SIZE = 8192
+
 
 class AccountModelAnalysis(models.Model):
     _name = 'account.model.analysis'
     _description = 'Account Model Analysis'
+    _order = 'cost_rank, id'
 
     model_name = fields.Char(string='Model Name')
     share_column = fields.Text(string='Share Column')
     additional_target_column = fields.Text(string='Additional Column In Target DB')
     info = fields.Text(string='Info')
+    connection_id = fields.Many2one(
+        'account.connect.db', string='Connection', ondelete='cascade'
+    )
+    source_table = fields.Char(string='Source Table')
+    additional_source_column = fields.Text(string='Additional Column In Source DB')
+    engine = fields.Selection(
+        [
+            ('orm', 'ORM'),
+            ('sql', 'SQL'),
+            ('set', 'Set-based SQL'),
+            ('relation', 'Relation'),
+        ],
+        string='Write Engine',
+    )
+    source_rows = fields.Integer(
+        string='Estimated Source Rows', help="Planner estimate (pg_class.reltuples)."
+    )
+    source_size = fields.Float(string='Source Size (MB)', digits=(16, 1))
+    target_rows = fields.Integer(
+        string='Estimated Target Rows', help="Planner estimate (pg_class.reltuples)."
+    )
+    target_size = fields.Float(string='Target Size (MB)', digits=(16, 1))
+    migration_cost = fields.Float(
+        string='Expected Cost',
+        digits=(16, 0),
+        help="Estimated rows weighted by the cost of the write engine, plus the pages "
+        "read from the source.",
+    )
+    cost_rank = fields.Integer(
+        string='Rank', help="1 for the table expected to take the longest to migrate."
+    )
+
+    @api.model
+    def _analyze_database(self, connection):
+        """Analyze every source table of ``connection`` against the target database.
 
+        Columns come from the schema catalogs, row counts and sizes from the
+        planner statistics of both databases, read concurrently, so no table
+        is scanned. The analysis records of the connection are replaced by
+        one batch ranked by expected migration cost.
+        """
+        started_at = time.monotonic()
+        mapping = self.env['model.mapping'].with_context(
+            migration_connection_id=connection.id
+        )
+        with connection._borrow_connections() as (source_db, target_db):
+            connection._refresh_schema_catalogs(source_db)
+            source_catalog = mapping._schema_catalog('source', source_db)
+            target_catalog = mapping._schema_catalog('target')
+            with ThreadPoolExecutor(
+                max_workers=2, thread_name_prefix='analysis'
+            ) as executor:
+                source_stats = executor.submit(self._read_table_stats, source_db)
+                target_stats = executor.submit(self._read_table_stats, target_db)
+                source_stats, target_stats = (
+                    source_stats.result(),
+                    target_stats.result(),
+                )
+
+        vals_list = []
+        for source_table, (source_rows, source_bytes) in source_stats.items():
+            source_columns = source_catalog.columns(source_table) or []
+            model_name = mapping._normalize_model_key(source_table)
+            model = self.env.get(model_name)
+            target_table = model._table if model is not None else source_table
+            target_columns = target_catalog.columns(target_table)
+            target_rows, target_bytes = target_stats.get(target_table, (0, 0))
+            engine = connection._table_engine(source_table)
+            vals_list.append({
+                'connection_id': connection.id,
+                'source_table': source_table,
+                'model_name': model_name if model is not None else False,
+                'share_column': ','.join(
+                    column
+                    for column in source_columns
+                    if column in (target_columns or ())
+                ),
+                'additional_target_column': ','.join(
+                    column
+                    for column in target_columns or ()
+                    if column not in source_columns
+                ),
+                'additional_source_column': ','.join(
+                    column
+                    for column in source_columns
+                    if column not in (target_columns or ())
+                ),
+                'info': _("No target table %s") % target_table
+                if target_columns is None
+                else False,
+                'engine': engine,
+                'source_rows': source_rows,
+                'source_size': source_bytes / 1024 / 1024,
+                'target_rows': target_rows,
+                'target_size': target_bytes / 1024 / 1024,
+                'migration_cost': source_rows * ENGINE_ROW_COSTS[engine]
+                + source_bytes / PAGE_SIZE,
+            })
+        vals_list.sort(key=lambda values: values['migration_cost'], reverse=True)
+        for rank, values in enumerate(vals_list, 1):
+            values['cost_rank'] = rank
+
+        self.search([('connection_id', '=', connection.id)]).unlink()
+        analyses = self.create(vals_list)
+        _logger.info(
+            "Analyzed %s source tables of %s in %.1fs",
+            len(analyses),
+            connection.display_name,
+            time.monotonic() - started_at,
+        )
+        return analyses
+
+    def _read_table_stats(self, db):
+        """Read the table statistics of psycopg2 connection ``db`` in its own thread."""
+        try:
+            with db.cursor() as cursor:
+                return read_table_stats(cursor)
+        finally:
+            db.rollback()
 
     def action_show_account_move_difference(self):
         database_connection = self.env['account.connect.db'].browse(1)
-        source_db, target_db = database_connection.check_connection()
-
-        source_fields = self._get_fields_from_db(source_db, 'account_move')
+        with database_connection._borrow_connections() as (source_db, _target_db):
+            source_fields = self._get_fields_from_db(
+                database_connection, source_db, 'account_move'
+            )
         target_fields = self.env['account.move']._fields
 
         shared_fields = set(source_fields) & set(target_fields)
@@ -31,7 +168,16 @@ class AccountModelAnalysis(models.Model):
             'info': 'No info',
         })
 
-    def _get_fields_from_db(self, db, table):
-        db_cur = db.cursor()
-        db_cur.execute("SELECT * FROM %s LIMIT 0" % table)
-        return [desc[0] for desc in db_cur.description or []]
\ No newline at end of file
+    def _get_fields_from_db(self, connection, db, table):
+        """Return the columns of a source table from the catalog of ``connection``."""
+        with db.cursor() as db_cur:
+            columns = (
+                self
+                .env['migration.schema.catalog']
+                ._get_catalog(connection, db_cur, 'source')
+                .columns(table)
+            )
+            if columns is None:
+                db_cur.execute("SELECT * FROM %s LIMIT 0" % table)
+                columns = [desc[0] for desc in db_cur.description or []]
+        return columns
@@ -1,229 +1,1519 @@
+import io
+import json
+import logging
+import tempfile
+import time
+import uuid
 from collections import defaultdict
-from itertools import product
-
-from attr import attributes
 
-from odoo import models, fields, api, _
+import psycopg2
+from odoo import _, api, fields, models
 from odoo.exceptions import ValidationError
-import logging
+from odoo.tools import split_every
+from odoo.tools.sql import index_exists
+from psycopg2.extras import execute_values
 
-from odoo.release import product_name
+from ..tools import (
+    LogSampler,
+    MappingCache,
+    TableMetrics,
+    column_getter,
+    compile_projection,
+    compile_table_transform,
+    connection_savepoint,
+    measure_transform_cost,
+    pipeline_bottleneck,
+    resolve_value_map,
+    run_pipeline,
+    spec_input_columns,
+    spec_source_column,
+    spec_target_columns,
+    spec_unloaded_columns,
+    write_bisecting,
+)
 
 _logger = logging.getLogger(__name__)
+# Per-row messages (skipped, rejected or failed rows) go through this sampler.
+_sampled_logger = LogSampler(_logger)
+
+DEFAULT_ITERSIZE = 2000
+DEFAULT_BATCH_SIZE = 1000
+# Batches buffered between two stages of the read/transform/write pipeline.
+DEFAULT_PIPELINE_QUEUE_SIZE = 2
+# Context of bulk ORM creates: no mail tracking, creation message or followers.
+# Variants are still generated, as with the per-record creates of the row mode.
+BULK_CREATE_CONTEXT = {
+    'tracking_disable': True,
+    'mail_create_nolog': True,
+    'mail_create_nosubscribe': True,
+    'mail_notrack': True,
+}
+# Shared fields of a model and a source table, by (model, source columns, registry
+# sequence).
+_SHARED_FIELD_PLANS = {}
+# Source rows copied from the source database are spooled to disk past this size.
+STAGING_SPOOL_SIZE = 64 * 1024 * 1024
+
+# Per-table migration specs, compiled once per table by compile_table_transform.
+# ``foreign_keys`` maps target columns to the model whose mapping translates
+# them (``required`` ones reject the row when unmapped), ``renames`` maps
+# target columns to the source column they are read from, ``value_maps``
+# translates a source column through literal ``values`` or a chain of
+# migration ``lookups`` and ``constants`` sets fixed values.
+# ``drop_constraints`` lists target constraints removed before loading.
+# ``parents`` lists the columns pointing to the table itself: rows are loaded
+# without them, in any order, and they are patched in one pass once the whole
+# table is in, on the ORM cursor, so only 'orm' tables may have them (see
+# ``_patch_parents``). ``computed`` lists target columns the
+# ORM computes, never copied from the source. ``depends`` lists the other
+# models whose mappings a table reads outside its ``foreign_keys``; together
+# they order the tables of a run (see ``migration_dependencies``).
+# ``write`` selects how records are created: 'sql' (batched INSERT/COPY or
+# set-based SQL when ``set_based``), 'orm' (model create) or 'relation' for
+# many2many tables without an id column.
+MIGRATION_SPECS = {
+    'res_partner': {
+        'write': 'orm',
+        'parents': ['parent_id'],
+        'computed': ['commercial_partner_id'],
+    },
+    'account_account': {
+        'value_maps': {
+            'account_type': {
+                'source': 'user_type_id',
+                'lookups': ['account_account_type', 'account_type_selection'],
+            },
+        },
+        'set_based': True,
+    },
+    'account_journal': {
+        'foreign_keys': {
+            'profit_account_id': 'account.account',
+            'loss_account_id': 'account.account',
+            'default_account_id': 'account.account',
+        },
+        'renames': {'default_account_id': 'default_debit_account_id'},
+        'constants': {'alias_id': None},
+        'drop_constraints': [
+            'account_journal_alias_id_fkey',
+            'account_journal_code_company_uniq',
+        ],
+        'set_based': True,
+    },
+    'account_move': {
+        'write': 'orm',
+        'foreign_keys': {'journal_id': 'account.journal'},
+        'required': ['journal_id'],
+        'renames': {'move_type': 'type'},
+        'value_maps': {
+            'auto_post': {
+                'source': 'auto_post',
+                'values': {True: 'yes'},
+                'default': 'no',
+            }
+        },
+    },
+    'account_move_line': {
+        'write': 'orm',
+        'foreign_keys': {'move_id': 'account.move', 'account_id': 'account.account'},
+        'required': ['move_id'],
+        'renames': {'currency_id': 'company_currency_id'},
+    },
+    'product_category': {
+        'write': 'orm',
+        'parents': ['parent_id'],
+    },
+    'product_attribute': {
+        'write': 'orm',
+    },
+    'product_attribute_value': {
+        'write': 'orm',
+        'foreign_keys': {'attribute_id': 'product.attribute'},
+    },
+    'product_template': {
+        'write': 'orm',
+        'foreign_keys': {'categ_id': 'product.category'},
+        # Attribute lines are created with the template from the attribute mappings.
+        'depends': ['product.attribute', 'product.attribute.value'],
+    },
+    'product_template_attribute_line': {
+        'foreign_keys': {
+            'product_tmpl_id': 'product.template',
+            'attribute_id': 'product.attribute',
+        },
+        'set_based': True,
+    },
+    'product_product': {
+        'foreign_keys': {'product_tmpl_id': 'product.template'},
+        'set_based': True,
+    },
+    'product_attribute_value_product_template_attribute_line_rel': {
+        'write': 'relation',
+        'foreign_keys': {
+            'product_attribute_value_id': 'product.attribute.value',
+            'product_template_attribute_line_id': 'product.template.attribute.line',
+        },
+    },
+}
+
+
+def migration_dependencies(source_table):
+    """Return the models whose mappings translate the rows of ``source_table``.
+
+    A spec with ``parents`` written outside the ORM is refused: its rows are
+    committed through the target connection, which ``_patch_parents`` does
+    not use.
+    """
+    spec = MIGRATION_SPECS.get(source_table, {})
+    if spec.get('parents') and spec.get('write') != 'orm':
+        raise ValidationError(
+            _("Table %s has parents but is not written through the ORM") % source_table
+        )
+    return list(
+        dict.fromkeys([
+            *spec.get('foreign_keys', {}).values(),
+            *spec.get('depends', []),
+        ])
+    )
+
+
+def _copy_value(value):
+    """Render a Python value in PostgreSQL COPY text format."""
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, dict):
+        value = json.dumps(value)
+    return (
+        str(value)
+        .replace('\\', '\\\\')
+        .replace('\t', '\\t')
+        .replace('\n', '\\n')
+        .replace('\r', '\\r')
+    )
+
 
 class ModelMapping(models.Model):
     _name = "model.mapping"
     _description = "Model Mapping for Migration"
 
-    model_id = fields.Char(string="Model ID")
-    source_db_id = fields.Integer(string="Source Database ID")
-    target_db_id = fields.Integer(string="Target Database ID")
+    model_id = fields.Char(
+        string="Model ID",
+        required=True,
+        help="Technical name of the migrated model, e.g. account.account.",
+    )
+    source_db_id = fields.Integer(string="Source Database ID", required=True)
+    target_db_id = fields.Integer(string="Target Database ID", required=True)
 
+    def init(self):
+        """Normalize legacy table-name keys and index (model_id, source_db_id).
 
-    def move_data_from_source_many_to_many_table(self,source_table):
-        """Move data from a source table to the corresponding Odoo model."""
-        source_model = source_table.replace('_', '.')
+        The unique index carries target_db_id so idempotency checks and FK
+        translation are index-only lookups however large the table grows.
+        Once it exists the keys are normalized and unique already, so the
+        table is not scanned again on every module update.
+        """
+        if index_exists(self.env.cr, 'model_mapping_model_source_uniq'):
+            return
+        self.env.cr.execute("SELECT DISTINCT model_id FROM model_mapping")
+        for (model_id,) in self.env.cr.fetchall():
+            normalized = self._normalize_model_key(model_id)
+            if normalized != model_id:
+                self.env.cr.execute(
+                    "UPDATE model_mapping SET model_id = %s WHERE model_id = %s",
+                    (normalized, model_id),
+                )
+        self.env.cr.execute("""
+            DELETE FROM model_mapping duplicate USING model_mapping kept
+            WHERE duplicate.model_id = kept.model_id
+              AND duplicate.source_db_id = kept.source_db_id
+              AND duplicate.id > kept.id
+        """)
+        self.env.cr.execute("""
+            CREATE UNIQUE INDEX model_mapping_model_source_uniq
+            ON model_mapping (model_id, source_db_id) INCLUDE (target_db_id)
+        """)
+
+    def move_data_from_source_many_to_many_table(
+        self, source_table, cache=None, checkpoint=None
+    ):
+        """Move data from a source table to the corresponding Odoo model.
+
+        Relation rows have no id, so ``checkpoint`` only counts them.
+        """
+        config = self._get_migration_config()
+        cache = cache or self._new_mapping_cache()
 
         try:
-            source_db, target_db = self._check_connection()
+            with self._borrow_connections() as (source_db, target_db):
+                lookups = self._load_lookups(source_db)
+                source_records, source_columns, transform_batch = (
+                    self._open_source_table(source_db, source_table, cache, lookups)
+                )
+                self._preload_table_mappings(cache, source_table)
+                metrics = TableMetrics(source_table)
 
-            source_records, source_columns = self._fetch_source_data(source_db, source_table)
-            if source_table == 'product_attribute_value_product_template_attribute_line_rel':
-                shared_fields = self._get_shared_fields_sql(source_table, source_columns)
-            else:
-                shared_fields = self._get_shared_fields(source_model, source_columns)
+                def prepare_batch(batch):
+                    batch_values, rejected = transform_batch(batch)
+                    self._log_rejected_rows(source_table, rejected)
+                    metrics.count('transformed', len(batch) - len(rejected))
+                    return {
+                        'rejected': [
+                            (None, dict(zip(source_columns, batch[index])), reason)
+                            for index, reason in rejected.items()
+                        ],
+                        'new_rows': [
+                            (None, record_values)
+                            for record_values in batch_values
+                            if record_values is not None
+                        ],
+                    }
+
+                started_at = time.monotonic()
+                migrated = 0
+
+                def write_batch(prepared):
+                    nonlocal migrated
+                    quarantined = list(prepared['rejected'])
+
+                    def quarantine(row, error):
+                        _sampled_logger.warning(
+                            (source_table, 'quarantined'),
+                            "Quarantining %s row %s: %s",
+                            source_table,
+                            row[1],
+                            error,
+                        )
+                        quarantined.append((None, row[1], error))
+
+                    # Pairs already in the target, from an earlier run, are skipped.
+                    inserted = 0
+
+                    def copy_chunk(chunk):
+                        nonlocal inserted
+                        inserted += self._copy_records(
+                            target_db,
+                            source_table,
+                            [record_values for _source_id, record_values in chunk],
+                        )
+
+                    with metrics.timer('write'):
+                        if config.write_mode == 'row':
+                            written = 0
+                            for row in prepared['new_rows']:
+                                try:
+                                    inserted += self._insert_many_to_many(
+                                        target_db, source_table, row[1]
+                                    )
+                                except ValidationError as e:
+                                    quarantine(row, e)
+                                    continue
+                                written += 1
+                        else:
+                            written = write_bisecting(
+                                prepared['new_rows'],
+                                copy_chunk,
+                                lambda: connection_savepoint(target_db),
+                                quarantine,
+                            )
+                        skipped = written - inserted
+                        with target_db.cursor() as cursor:
+                            self._quarantine(
+                                cursor, checkpoint, source_table, quarantined
+                            )
+                        self._advance_checkpoint(
+                            target_db,
+                            checkpoint,
+                            None,
+                            inserted,
+                            skipped,
+                            len(quarantined),
+                        )
+                    with metrics.timer('commit'):
+                        target_db.commit()
+                    metrics.count('inserted', inserted)
+                    metrics.count('skipped', skipped)
+                    metrics.count('failed', len(quarantined))
+                    migrated += inserted
 
-            for record in source_records:
-                record_values = self._prepare_record_values(source_table, record, source_columns, shared_fields)
-                print(record_values)
-                self._insert_many_to_many(target_db, source_table, record_values)
+                self._run_batches(
+                    source_table,
+                    split_every(
+                        config.batch_size or DEFAULT_BATCH_SIZE, source_records
+                    ),
+                    prepare_batch,
+                    write_batch,
+                    metrics,
+                )
+                self._log_throughput(
+                    source_table, migrated, started_at, config.write_mode
+                )
+                self._finish_table_metrics(metrics, checkpoint)
+                self._finish_mapping_cache(cache, source_table)
 
         except Exception as e:
             _logger.error(f"Error during migration: {e}")
             raise ValidationError(_("Error during migration: %s") % str(e))
 
+    def move_data_from_source_table(
+        self, source_table, cache=None, checkpoint=None, since=None, source_ids=None
+    ):
+        """Move data from a source table to the corresponding Odoo model.
 
+        With a ``checkpoint`` (migration.run.table) the table is read in id
+        order after its last committed source id, and the checkpoint moves
+        forward in the same commit as each batch.
 
-    def move_data_from_source_table(self, source_table):
-        """Move data from a source table to the corresponding Odoo model."""
-        source_model = source_table.replace('_', '.')
+        With ``since`` (delta sync) only the source rows created or written
+        after that watermark are read: new ones are inserted and the target
+        records of already mapped ones are updated in bulk.
+
+        A batch that fails to be written is bisected: the rows making it fail
+        are quarantined (see ``migration.quarantine``) and the rest of the
+        batch is committed. ``source_ids`` restricts the run to these rows,
+        to replay quarantined ones.
+
+        Tables written through the ORM are migrated by
+        ``account.connect.db._migrate_orm_table``.
+        """
+        source_model = self._normalize_model_key(source_table)
+        spec = self._get_table_spec(source_table)
+        config = self._get_migration_config()
+        cache = cache or self._new_mapping_cache()
+        if spec.get('write') == 'orm':
+            return config._migrate_orm_table(
+                source_table,
+                cache=cache,
+                checkpoint=checkpoint,
+                since=since,
+                source_ids=source_ids,
+            )
         try:
-            source_db, target_db = self._check_connection()
-            existing_mapping = self._get_existing_mapping(source_model)
+            with self._borrow_connections() as (source_db, target_db):
+                self._drop_constraints(
+                    target_db, source_table, spec.get('drop_constraints')
+                )
 
-            if source_table == 'account_journal':
-                self._drop_account_journal_constraints(target_db)
+                lookups = self._load_lookups(source_db)
 
-            source_records, source_columns = self._fetch_source_data(source_db, source_table)
-            if source_table == 'product_attribute_value_product_template_attribute_line_rel':
-                shared_fields = self._get_shared_fields_sql(source_table,source_columns)
-            else:
-                shared_fields = self._get_shared_fields(source_model, source_columns)
+                set_based = config.write_mode == 'set' and spec.get('set_based')
+                if set_based and not since and not source_ids:
+                    self._migrate_table_set_based(
+                        source_db, target_db, source_table, cache, lookups, checkpoint
+                    )
+                    return
+
+                metrics = TableMetrics(source_table)
+                source_records, source_columns, transform_batch = (
+                    self._open_source_table(
+                        source_db,
+                        source_table,
+                        cache,
+                        lookups,
+                        since=since,
+                        source_ids=source_ids,
+                        after_id=checkpoint._resume_after() if checkpoint else None,
+                    )
+                )
+                get_source_id = column_getter(source_columns, 'id')
+                self._preload_table_mappings(cache, source_table)
+
+                def savepoint():
+                    return connection_savepoint(target_db)
 
-            for record in source_records:
-                source_id = record[source_columns.index('id')]
+                def prepare_batch(batch):
+                    pending = (
+                        batch
+                        if since
+                        else self._unmapped_records(
+                            source_table, batch, get_source_id, cache
+                        )
+                    )
 
-                if str(source_id) in existing_mapping:
-                    _logger.info(f"Record {source_id} already exists. Skipping...")
-                    continue
+                    batch_values, rejected = (
+                        transform_batch(pending) if pending else ([], {})
+                    )
+                    self._log_rejected_rows(
+                        source_table,
+                        rejected,
+                        [get_source_id(record) for record in pending],
+                    )
+                    metrics.count('transformed', len(pending) - len(rejected))
+                    new_rows, changed_rows = self._split_changed_rows(
+                        source_model,
+                        [get_source_id(record) for record in pending],
+                        batch_values,
+                        cache if since else None,
+                    )
+                    return {
+                        'last_source_id': max(
+                            get_source_id(record) for record in batch
+                        ),
+                        'skipped': len(batch) - len(pending),
+                        # Rejected rows are quarantined with their source values.
+                        'rejected': [
+                            (
+                                get_source_id(pending[index]),
+                                dict(zip(source_columns, pending[index])),
+                                reason,
+                            )
+                            for index, reason in rejected.items()
+                        ],
+                        'new_rows': new_rows,
+                        'changed_rows': changed_rows,
+                    }
 
-                record_values = self._prepare_record_values(source_table, record, source_columns, shared_fields)
-                if source_table in ['product_template', 'product_category','product_attribute','product_attribute_value']:
-                    new_record_id = self._insert_record_orm(source_db,source_table, record_values)
-                    # self._create_mapping(source_table, source_id, new_record_id)
+                started_at = time.monotonic()
+                migrated = 0
 
-                else:
-                    new_record_id = self._insert_record(target_db, source_table, record_values)
-                    self._create_mapping(source_table, source_id, new_record_id)
+                def write_batch(prepared):
+                    nonlocal migrated
+                    last_source_id, skipped = (
+                        prepared['last_source_id'],
+                        prepared['skipped'],
+                    )
+                    new_rows, changed_rows = (
+                        prepared['new_rows'],
+                        prepared['changed_rows'],
+                    )
+                    quarantined = list(prepared['rejected'])
+
+                    def quarantine(row, error):
+                        _sampled_logger.warning(
+                            (source_table, 'quarantined'),
+                            "Quarantining %s record %s: %s",
+                            source_table,
+                            row[0],
+                            error,
+                        )
+                        quarantined.append((row[0], row[-1], error))
+
+                    if config.write_mode == 'row':
+                        # Every row is committed with its mapping as it is inserted.
+                        inserted = self._insert_rows_one_by_one(
+                            target_db,
+                            source_table,
+                            new_rows,
+                            cache,
+                            checkpoint,
+                            metrics,
+                            quarantine,
+                        )
+                        id_pairs = []
+                    else:
+                        id_pairs = self._insert_rows_bisecting(
+                            target_db,
+                            source_table,
+                            new_rows,
+                            savepoint,
+                            metrics,
+                            quarantine,
+                        )
+                        inserted = len(id_pairs)
+                    # Data, mappings, quarantine and checkpoint share one commit so
+                    # none can exist without the others.
+                    with metrics.timer('write'):
+                        updated = write_bisecting(
+                            changed_rows,
+                            lambda chunk: self._update_records(
+                                target_db,
+                                source_table,
+                                [row[1] for row in chunk],
+                                [row[2] for row in chunk],
+                            ),
+                            savepoint,
+                            quarantine,
+                        )
+                        with target_db.cursor() as cursor:
+                            self._quarantine(
+                                cursor, checkpoint, source_table, quarantined
+                            )
+                        self._advance_checkpoint(
+                            target_db,
+                            checkpoint,
+                            last_source_id,
+                            len(id_pairs),
+                            skipped,
+                            len(quarantined),
+                            updated,
+                        )
+                    with metrics.timer('commit'):
+                        target_db.commit()
+                    cache.update(source_model, id_pairs)
+                    metrics.count('inserted', inserted)
+                    metrics.count('updated', updated)
+                    metrics.count('skipped', skipped)
+                    metrics.count('failed', len(quarantined))
+                    migrated += inserted + updated
+
+                self._run_batches(
+                    source_table,
+                    split_every(
+                        config.batch_size or DEFAULT_BATCH_SIZE, source_records
+                    ),
+                    prepare_batch,
+                    write_batch,
+                    metrics,
+                )
+                self._log_throughput(
+                    source_table, migrated, started_at, config.write_mode
+                )
+                self._finish_table_metrics(metrics, checkpoint)
+                self._finish_mapping_cache(cache, source_table)
 
         except Exception as e:
             _logger.error(f"Error during migration: {e}")
             raise ValidationError(_("Error during migration: %s") % str(e))
 
+    def _unmapped_records(self, source_table, batch, get_source_id, cache):
+        """Return the records of ``batch`` that have no mapping yet."""
+        source_model = self._normalize_model_key(source_table)
+        pending = []
+        for record in batch:
+            source_id = get_source_id(record)
+            if cache.contains(source_model, source_id):
+                _sampled_logger.info(
+                    (source_table, 'skipped'),
+                    "%s record %s already exists. Skipping...",
+                    source_table,
+                    source_id,
+                )
+                continue
+            pending.append(record)
+        return pending
+
+    def _split_changed_rows(self, source_model, source_ids, values_list, cache):
+        """Split transformed rows into new rows and rows of mapped records.
+
+        Returns the (source id, values) rows to insert and the (source id,
+        target id, values) rows to update; rejected rows (None values) are
+        left out. Without ``cache`` every row is new.
+        """
+        new_rows = []
+        changed_rows = []
+        for source_id, record_values in zip(source_ids, values_list):
+            if record_values is None:
+                continue
+            target_id = (
+                cache.get(source_model, source_id) if cache is not None else None
+            )
+            if target_id is None:
+                new_rows.append((source_id, record_values))
+            else:
+                changed_rows.append((source_id, target_id, record_values))
+        return new_rows, changed_rows
+
+    def _insert_rows_one_by_one(
+        self, target_db, source_table, rows, cache, checkpoint, metrics, quarantine
+    ):
+        """Insert the (source id, values) ``rows`` one by one, committing each one.
+
+        A row that fails to be inserted is passed to ``quarantine`` and
+        skipped. Returns the number of inserted rows.
+        """
+        source_model = self._normalize_model_key(source_table)
+        inserted = 0
+        for source_id, record_values in rows:
+            try:
+                with metrics.timer('write'):
+                    new_record_id = self._insert_record(
+                        target_db, source_table, record_values
+                    )
+            except ValidationError as e:
+                quarantine((source_id, record_values), e)
+                continue
+            with metrics.timer('mapping_write'):
+                self._create_mappings(
+                    target_db, source_model, [(source_id, new_record_id)]
+                )
+                self._advance_checkpoint(target_db, checkpoint, None, 1)
+            with metrics.timer('commit'):
+                target_db.commit()
+            cache.add(source_model, source_id, new_record_id)
+            inserted += 1
+        return inserted
+
+    def _insert_rows_bisecting(
+        self, target_db, source_table, rows, savepoint, metrics, quarantine
+    ):
+        """Insert the (source id, values) ``rows`` with their mappings, uncommitted.
+
+        A failing chunk is bisected down to its bad rows, which are passed to
+        ``quarantine``. Returns the (source id, target id) pairs inserted.
+        """
+        source_model = self._normalize_model_key(source_table)
+        id_pairs = []
+
+        def insert_chunk(chunk):
+            with metrics.timer('write'):
+                new_record_ids = self._insert_records(
+                    target_db,
+                    source_table,
+                    [record_values for _source_id, record_values in chunk],
+                )
+            chunk_pairs = [
+                (row[0], new_id) for row, new_id in zip(chunk, new_record_ids)
+            ]
+            with metrics.timer('mapping_write'):
+                self._create_mappings(target_db, source_model, chunk_pairs)
+            id_pairs.extend(chunk_pairs)
+
+        write_bisecting(rows, insert_chunk, savepoint, quarantine)
+        return id_pairs
+
+    def _advance_checkpoint(
+        self,
+        target_db,
+        checkpoint,
+        last_source_id,
+        migrated=0,
+        skipped=0,
+        failed=0,
+        updated=0,
+    ):
+        """Move a checkpoint forward inside the open transaction of ``target_db``."""
+        if not checkpoint:
+            return
+        with target_db.cursor() as cursor:
+            checkpoint._advance(
+                cursor, last_source_id, migrated, skipped, failed, updated
+            )
+
+    def _migrate_table_set_based(
+        self, source_db, target_db, source_table, cache, lookups, checkpoint
+    ):
+        """Run ``_move_data_set_based`` for a table, recording its metrics."""
+        metrics = TableMetrics(source_table)
+        started_at = time.monotonic()
+        with metrics.timer('write'):
+            migrated = self._move_data_set_based(
+                source_db,
+                target_db,
+                source_table,
+                self._normalize_model_key(source_table),
+                cache,
+                lookups,
+                checkpoint,
+            )
+        metrics.count('inserted', migrated)
+        self._log_throughput(source_table, migrated, started_at, 'set')
+        self._finish_table_metrics(metrics, checkpoint)
+        self._finish_mapping_cache(cache, source_table)
+
+    def _move_data_set_based(
+        self,
+        source_db,
+        target_db,
+        source_table,
+        source_model,
+        cache,
+        lookups,
+        checkpoint=None,
+    ):
+        """Migrate a ``set_based`` table of ``MIGRATION_SPECS`` inside the target.
+
+        The source rows after the checkpoint are copied into an unlogged
+        staging table. The rows whose required foreign key has no mapping are
+        quarantined, then one INSERT ... SELECT joins the others to
+        ``model_mapping`` to translate their foreign keys and a data-modifying
+        CTE writes the new mappings from its RETURNING clause. Target ids are
+        drawn from the table sequence up front so every inserted row can be
+        matched back to its source id. When that statement fails, the staged
+        rows are inserted in bisected batches instead, quarantining the rows
+        making it fail. Data, mappings, quarantine and checkpoint are
+        committed together. Returns the number of migrated rows.
+        """
+        spec = self._get_table_spec(source_table)
+        constants = spec.get('constants', {})
+
+        source_types = self._get_column_types(source_db, source_table, 'source')
+        overridden = spec_target_columns(spec)
+        unloaded = spec_unloaded_columns(spec)
+        target_columns = [
+            column
+            for column in self._get_shared_fields(source_model, list(source_types))
+            if column not in overridden
+        ] + [
+            column
+            for column in overridden
+            if column in constants
+            or (
+                column not in unloaded
+                and spec_source_column(spec, column) in source_types
+            )
+        ]
+        staged_columns = list(
+            dict.fromkeys(
+                ['id']
+                + [
+                    spec_source_column(spec, column)
+                    for column in target_columns
+                    if column not in constants
+                ]
+            )
+        )
+
+        staging_table = f"migration_stage_{source_table}"
+        self._copy_source_to_staging(
+            source_db,
+            target_db,
+            source_table,
+            staging_table,
+            staged_columns,
+            source_types,
+            after_id=checkpoint._resume_after() if checkpoint else None,
+        )
+
+        try:
+            with target_db.cursor() as cursor:
+                cursor.execute(f"SELECT max(id) FROM {staging_table}")
+                last_source_id = cursor.fetchone()[0]
+                cursor.execute(
+                    f"""
+                    DELETE FROM {staging_table} s USING model_mapping done
+                    WHERE done.model_id = %s AND done.source_db_id = s.id
+                """,
+                    (source_model,),
+                )
+                skipped = cursor.rowcount
+                quarantined = self._pop_unmapped_staged_rows(
+                    cursor, staging_table, spec, target_columns
+                )
+                cursor.execute(
+                    f"""
+                    ALTER TABLE {staging_table} ADD COLUMN new_id integer;
+                    UPDATE {staging_table}
+                    SET new_id = nextval(pg_get_serial_sequence(%s, 'id'));
+                    ANALYZE {staging_table};
+                """,
+                    (source_table,),
+                )
+                expressions, joins, params = self._staged_row_expressions(
+                    cursor,
+                    spec,
+                    staging_table,
+                    target_columns,
+                    source_types,
+                    lookups,
+                )
+                from_clause = f"FROM {staging_table} s {' '.join(joins)}"
+
+                try:
+                    with connection_savepoint(target_db):
+                        cursor.execute(
+                            f"""
+                            WITH inserted AS (
+                                INSERT INTO {source_table}
+                                    (id, {', '.join(target_columns)})
+                                SELECT s.new_id, {', '.join(expressions)}
+                                {from_clause}
+                                RETURNING id
+                            )
+                            INSERT INTO model_mapping (model_id, source_db_id,
+                                                       target_db_id, create_uid,
+                                                       create_date, write_uid,
+                                                       write_date)
+                            SELECT %s, s.id, inserted.id, %s,
+                                   now() at time zone 'UTC', %s,
+                                   now() at time zone 'UTC'
+                            FROM inserted
+                            JOIN {staging_table} s ON s.new_id = inserted.id
+                        """,
+                            params + [source_model, self.env.uid, self.env.uid],
+                        )
+                    migrated = cursor.rowcount
+                    id_pairs = None
+                except psycopg2.Error as e:
+                    _logger.warning(
+                        "Set-based insert into %s failed, inserting it in "
+                        "bisected batches: %s",
+                        source_table,
+                        e,
+                    )
+                    id_pairs = self._insert_staged_rows_bisecting(
+                        target_db,
+                        source_table,
+                        f"SELECT s.id, {', '.join(expressions)} {from_clause}",
+                        params,
+                        target_columns,
+                        quarantined,
+                    )
+                    migrated = len(id_pairs)
+                self._quarantine(cursor, checkpoint, source_table, quarantined)
+                if checkpoint:
+                    checkpoint._advance(
+                        cursor, last_source_id, migrated, skipped, len(quarantined)
+                    )
+            target_db.commit()
+
+            if id_pairs is None:
+                # Only the staged rows that were inserted have a mapping.
+                id_pairs = self._stream_source_records(
+                    target_db,
+                    f"""
+                    SELECT s.id, s.new_id FROM {staging_table} s
+                    JOIN model_mapping m ON m.model_id = %s AND m.source_db_id = s.id
+                                         AND m.target_db_id = s.new_id
+                    ORDER BY s.id
+                """,
+                    (source_model,),
+                )
+            cache.update(source_model, id_pairs)
+            target_db.rollback()
+        except Exception as e:
+            target_db.rollback()
+            _logger.error(f"Set-based migration of {source_table} failed: {e}")
+            raise ValidationError(
+                _("Set-based migration of %s failed: %s") % (source_table, str(e))
+            )
+        finally:
+            with target_db.cursor() as cursor:
+                cursor.execute(f"DROP TABLE IF EXISTS {staging_table}")
+            target_db.commit()
+        _logger.info("Created %s mappings for %s", migrated, source_model)
+        return migrated
+
+    def _pop_unmapped_staged_rows(self, cursor, staging_table, spec, target_columns):
+        """Delete the staged rows whose required foreign key has no mapping.
+
+        They are found with one anti-join per required foreign key and
+        returned as ``(source id, values, error)`` rows to quarantine.
+        """
+        foreign_keys = spec.get('foreign_keys', {})
+        rows = []
+        for column in spec.get('required', []):
+            if (
+                column not in target_columns
+                or column not in foreign_keys
+                or column in spec.get('constants', {})
+                or column in spec.get('value_maps', {})
+            ):
+                continue
+            source_column = spec_source_column(spec, column)
+            cursor.execute(
+                f"""
+                DELETE FROM {staging_table} s
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM model_mapping m
+                    WHERE m.model_id = %s AND m.source_db_id = s.{source_column}
+                )
+                RETURNING s.*
+            """,
+                (foreign_keys[column],),
+            )
+            columns = [description[0] for description in cursor.description]
+            for row in cursor.fetchall():
+                values = dict(zip(columns, row))
+                rows.append((
+                    values['id'],
+                    values,
+                    _("No %s mapping for required %s %s")
+                    % (foreign_keys[column], column, values[source_column]),
+                ))
+        return rows
+
+    def _staged_row_expressions(
+        self, cursor, spec, staging_table, target_columns, source_types, lookups
+    ):
+        """Return the SQL translating staged rows ``s`` into ``target_columns``.
+
+        Returns the select expressions, the joins they need and the parameters
+        of both, in query order.
+        """
+        foreign_keys = spec.get('foreign_keys', {})
+        constants = spec.get('constants', {})
+        value_maps = spec.get('value_maps', {})
+        joins = []
+        expressions = []
+        params = []
+        join_params = []
+        for column in target_columns:
+            if column in constants:
+                expressions.append('%s')
+                params.append(constants[column])
+            elif column in value_maps:
+                source_column = spec_source_column(spec, column)
+                values, default = resolve_value_map(value_maps[column], lookups)
+                map_table = self._create_value_map_table(
+                    cursor,
+                    f"{staging_table}_{column}",
+                    source_types[source_column],
+                    values,
+                )
+                joins.append(
+                    f"LEFT JOIN {map_table} vm_{column} "
+                    f"ON vm_{column}.key = s.{source_column}"
+                )
+                expressions.append(f"COALESCE(vm_{column}.value, %s)")
+                params.append(default)
+            elif column in foreign_keys:
+                # Rows with an unmapped required reference were quarantined.
+                joins.append(
+                    f"LEFT JOIN model_mapping m_{column} "
+                    f"ON m_{column}.model_id = %s AND m_{column}.source_db_id "
+                    f"= s.{spec_source_column(spec, column)}"
+                )
+                join_params.append(foreign_keys[column])
+                expressions.append(f"m_{column}.target_db_id")
+            else:
+                expressions.append(f"s.{spec_source_column(spec, column)}")
+        return expressions, joins, params + join_params
+
+    def _insert_staged_rows_bisecting(
+        self, target_db, source_table, select_query, params, columns, quarantined
+    ):
+        """Insert the staged rows of ``select_query`` in batches, uncommitted.
+
+        ``select_query`` returns the source id then the ``columns`` values of
+        each row. The rows are read in source id order, one batch at a time,
+        and a failing batch is bisected down to its bad rows, which are added
+        to ``quarantined``. Returns the (source id, target id) pairs inserted.
+        """
+        source_model = self._normalize_model_key(source_table)
+        batch_size = self._get_migration_config().batch_size or DEFAULT_BATCH_SIZE
+        id_pairs = []
+
+        def insert_chunk(chunk):
+            new_record_ids = self._insert_records(
+                target_db,
+                source_table,
+                [dict(zip(columns, row[1:])) for row in chunk],
+            )
+            chunk_pairs = [
+                (row[0], new_id) for row, new_id in zip(chunk, new_record_ids)
+            ]
+            self._create_mappings(target_db, source_model, chunk_pairs)
+            id_pairs.extend(chunk_pairs)
+
+        def quarantine(row, error):
+            _sampled_logger.warning(
+                (source_table, 'quarantined'),
+                "Quarantining %s record %s: %s",
+                source_table,
+                row[0],
+                error,
+            )
+            quarantined.append((row[0], dict(zip(columns, row[1:])), error))
+
+        after_id = 0
+        while True:
+            with target_db.cursor() as cursor:
+                cursor.execute(
+                    f"{select_query} WHERE s.id > %s ORDER BY s.id LIMIT %s",
+                    params + [after_id, batch_size],
+                )
+                batch = cursor.fetchall()
+            if not batch:
+                return id_pairs
+            after_id = batch[-1][0]
+            write_bisecting(
+                batch, insert_chunk, lambda: connection_savepoint(target_db), quarantine
+            )
+
+    def _get_column_types(self, db, table, side):
+        """Return an ordered {column: SQL type} dict of a table on the ``side`` db."""
+        column_types = self._schema_catalog(side, db).column_types(table)
+        if column_types is not None:
+            return column_types
+        with db.cursor() as cursor:
+            cursor.execute(
+                """
+                SELECT attname, format_type(atttypid, atttypmod) FROM pg_attribute
+                WHERE attrelid = %s::regclass AND attnum > 0 AND NOT attisdropped
+                ORDER BY attnum
+            """,
+                (table,),
+            )
+            return dict(cursor.fetchall())
+
+    def _copy_source_to_staging(
+        self,
+        source_db,
+        target_db,
+        source_table,
+        staging_table,
+        columns,
+        source_types,
+        after_id=None,
+    ):
+        """Copy ``columns`` of a source table into a new unlogged staging table.
+
+        The rows travel in COPY text format through a spooled temporary file,
+        so memory use stays bounded whatever the size of the table. With
+        ``after_id`` only the rows after that source id are copied.
+        """
+        column_list = ', '.join(columns)
+        where = f" WHERE id > {int(after_id)}" if after_id else ''
+
+        with target_db.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {staging_table}")
+            definitions = ', '.join(
+                f"{column} {source_types[column]}" for column in columns
+            )
+            cursor.execute(f"CREATE UNLOGGED TABLE {staging_table} ({definitions})")
+        target_db.commit()
+        with tempfile.SpooledTemporaryFile(
+            max_size=STAGING_SPOOL_SIZE, mode='w+b'
+        ) as buffer:
+            with source_db.cursor() as cursor:
+                cursor.copy_expert(
+                    f"COPY (SELECT {column_list} FROM {source_table}{where}) TO STDOUT",
+                    buffer,
+                )
+            source_db.rollback()
+            buffer.seek(0)
+            with target_db.cursor() as cursor:
+                cursor.copy_expert(
+                    f"COPY {staging_table} ({column_list}) FROM STDIN", buffer
+                )
+        target_db.commit()
+
+    def _create_value_map_table(self, cursor, table, key_type, values):
+        """Load a {source value: target value} dict into temporary table ``table``."""
+        cursor.execute(
+            f"CREATE TEMPORARY TABLE {table} "
+            f"(key {key_type} PRIMARY KEY, value varchar) ON COMMIT DROP"
+        )
+        if values:
+            execute_values(
+                cursor,
+                f"INSERT INTO {table} (key, value) VALUES %s",
+                list(values.items()),
+            )
+        return table
+
     # ---------------------------------------------------------
     # Helpers
     # ---------------------------------------------------------
 
-    def _check_connection(self):
-        """Placeholder for checking connections."""
-        # Replace with actual connection handling
-        return self.env['account.connect.db'].search([], limit=1).check_connection()
+    def _get_migration_config(self):
+        """Return the database connection record driving the migration.
+
+        That is the ``migration_connection_id`` of the context when set, the
+        first connection otherwise.
+        """
+        connection_id = self.env.context.get('migration_connection_id')
+        if connection_id:
+            return self.env['account.connect.db'].browse(connection_id)
+        return self.env['account.connect.db'].search([], limit=1)
 
-    def _get_existing_mapping(self, source_model):
-        """Retrieve existing mappings."""
-        mappings = self.search([('model_id', '=', source_model)])
-        return {str(mapping.source_db_id): mapping.target_db_id for mapping in mappings}
+    def _borrow_connections(self):
+        """Borrow pooled source and target connections of the migration config."""
+        return self._get_migration_config()._borrow_connections()
 
-    def _drop_account_journal_constraints(self, target_db):
-        """Drop constraints for 'account_journal'."""
+    @api.model
+    def _normalize_model_key(self, name):
+        """Return the model name used as mapping key for a model or table name."""
+        if name in self.env:
+            return name
+        for model_name, model in self.env.registry.items():
+            if not model._abstract and model._table == name:
+                return model_name
+        return name.replace('_', '.')
+
+    def _new_mapping_cache(self):
+        """Return an empty translation cache for one migration run.
+
+        Share the returned cache between the tables of a run: mappings written
+        during the run are committed through the target connection and are only
+        known to this transaction through the cache.
+        """
+        store_dir = self._get_migration_config().mapping_store_dir
+        return MappingCache(
+            self._read_mapping_pairs,
+            store_dir=store_dir or None,
+            fingerprint=self._mapping_fingerprint,
+        )
+
+    def _finish_mapping_cache(self, cache, source_table):
+        """Log the cache counters of a finished table and persist its id maps."""
+        _logger.info("Mapping cache after %s: %s", source_table, cache.stats())
+        cache.persist()
+
+    def _read_mapping_pairs(self, source_model, page_size=100000, id_range=None):
+        """Yield the (source id, target id) pairs of a model, ordered by source id.
+
+        Pages are read by keyset so the whole mapping never has to sit in a
+        client-side result set. ``id_range`` restricts the pairs to the source
+        ids between its (low, high) bounds.
+        """
+        last_source_id = None
+        while True:
+            conditions, params = ["model_id = %s"], [source_model]
+            if id_range:
+                conditions.append("source_db_id BETWEEN %s AND %s")
+                params += id_range
+            if last_source_id is not None:
+                conditions.append("source_db_id > %s")
+                params.append(last_source_id)
+            self.env.cr.execute(
+                f"""
+                SELECT source_db_id, target_db_id FROM model_mapping
+                WHERE {' AND '.join(conditions)} ORDER BY source_db_id LIMIT %s
+            """,
+                (*params, page_size),
+            )
+            rows = self.env.cr.fetchall()
+            yield from rows
+            if len(rows) < page_size:
+                return
+            last_source_id = rows[-1][0]
+
+    def _mapping_fingerprint(self, source_model):
+        """Return (row count, max source id, target id sum) of a model's mappings.
+
+        Persisted id maps are validated against it. The sum changes whenever
+        mappings are rewritten to other target records, even when their count
+        and source ids stay the same.
+        """
+        self.env.cr.execute(
+            """
+            SELECT count(*), COALESCE(max(source_db_id), 0),
+                   COALESCE(sum(target_db_id), 0)
+            FROM model_mapping WHERE model_id = %s
+        """,
+            (source_model,),
+        )
+        return self.env.cr.fetchone()
+
+    def _load_lookups(self, source_db):
+        """Load the active lookups and selection maps once, before any row is read."""
+        return self.env['migration.lookup'].search([])._load_all(source_db)
+
+    def _drop_constraints(self, target_db, table, constraints):
+        """Drop the given constraints of a target table, if any."""
+        if not constraints:
+            return
         try:
             with target_db.cursor() as cursor:
-                cursor.execute("""
-                    ALTER TABLE account_journal DROP CONSTRAINT IF EXISTS account_journal_alias_id_fkey;
-                    ALTER TABLE account_journal DROP CONSTRAINT IF EXISTS account_journal_code_company_uniq;
-                """)
+                for constraint in constraints:
+                    cursor.execute(
+                        f"ALTER TABLE {table} DROP CONSTRAINT IF EXISTS {constraint}"
+                    )
                 target_db.commit()
-            _logger.info("Dropped constraints on 'account_journal'.")
+            _logger.info(
+                "Dropped constraints on '%s': %s", table, ', '.join(constraints)
+            )
         except Exception as e:
             target_db.rollback()
             _logger.error(f"Failed to drop constraints: {e}")
 
-    def _fetch_source_data(self, source_db, source_table):
-        """Fetch records and columns from source table."""
+    def _schema_catalog(self, side, source_db=None):
+        """Return the cached ``SchemaCatalog`` of the source or target (Odoo) database.
+
+        See ``migration.schema.catalog``: the schema is only introspected
+        again when its fingerprint changed.
+        """
+        catalogs = self.env['migration.schema.catalog']
+        if side == 'target':
+            return catalogs._get_catalog(
+                self._get_migration_config(), self.env.cr, 'target'
+            )
+        with source_db.cursor() as cursor:
+            return catalogs._get_catalog(self._get_migration_config(), cursor, 'source')
+
+    def _get_source_columns(self, source_db, source_table):
+        """Return the column names of a source table."""
+        columns = self._schema_catalog('source', source_db).columns(source_table)
+        if columns is not None:
+            return columns
         with source_db.cursor() as cursor:
             cursor.execute(f"SELECT * FROM {source_table} LIMIT 0")
-            columns = [desc[0] for desc in cursor.description or []]
-            cursor.execute(f"SELECT * FROM {source_table}")
-            records = cursor.fetchall()
-        return records, columns
+            return [desc[0] for desc in cursor.description or []]
 
-    def _get_shared_fields(self, source_model, source_columns):
-        """Find shared fields between Odoo model and source table."""
-        if source_model == 'product.template':
-            return [
-                field for field in self.env[source_model]._fields
-                if field in source_columns
-            ]
-        return [
-            field for field in self.env[source_model]._fields
-            if field in source_columns and field != 'id'
-        ]
+    def _preload_table_mappings(self, cache, source_table):
+        """Load the mappings a table is checked and translated against before streaming.
 
-    def _get_shared_fields_sql(self, source_table, source_columns):
+        The pipeline transforms rows in another thread, which must only read
+        the cache and never trigger a load through this environment's cursor.
         """
-        Find shared fields between a source table's columns and an Odoo model's fields.
+        spec = self._get_table_spec(source_table)
+        cache.preload([
+            self._normalize_model_key(source_table),
+            *spec.get('foreign_keys', {}).values(),
+        ])
 
-        Args:
-            source_table (str): The name of the external source table.
-            source_columns (list): A list of column names to check.
-        Returns:
-            list: A list of shared field names between the provided columns and the Odoo model's fields.
-        """
-        # Execute the query
-        self.env.cr.execute("SELECT column_name FROM information_schema.columns WHERE table_name = %s", (source_table,))
-        shared_fields = [row[0] for row in self.env.cr.fetchall() if row[0] in source_columns ]
-        return shared_fields
+    def _get_table_spec(self, source_table):
+        """Return the migration spec of a source table, empty for plain copies."""
+        return MIGRATION_SPECS.get(source_table, {})
 
-    def _prepare_record_values(self, source_table, record, source_columns, shared_fields):
-        """Prepare values for insertion based on table logic."""
-        record_values = {f: record[source_columns.index(f)] for f in shared_fields}
+    def _get_table_fields(self, source_table, source_columns):
+        """Return the source columns copied as they are into the target table."""
+        if self._get_table_spec(source_table).get('write') == 'relation':
+            return self._get_shared_fields_sql(source_table, source_columns)
+        return self._get_shared_fields(
+            self._normalize_model_key(source_table), source_columns
+        )
 
-        if source_table == 'account_journal':
-            account_mapping = self._get_existing_mapping('account.account')
-            record_values['alias_id'] = None
+    def _get_selected_columns(self, source_table, source_columns, shared_fields):
+        """Return the source columns a table migration reads: id, fields and inputs."""
+        selected = ['id'] if 'id' in source_columns else []
+        selected += shared_fields
+        selected += [
+            column
+            for column in spec_input_columns(self._get_table_spec(source_table))
+            if column in source_columns
+        ]
+        return list(dict.fromkeys(selected))
 
-            for account_field in ['profit_account_id', 'loss_account_id']:
-                if record_values.get(account_field):
-                    record_values[account_field] = int(account_mapping.get(str(record_values[account_field]), 0))
+    def _open_source_table(
+        self,
+        source_db,
+        source_table,
+        cache,
+        lookups,
+        itersize=None,
+        id_range=None,
+        after_id=None,
+        since=None,
+        source_ids=None,
+    ):
+        """Stream the needed columns of a source table and compile its spec.
 
-            default_debit_id = record[source_columns.index('default_debit_account_id')]
-            if default_debit_id:
-                record_values['default_account_id'] = int(account_mapping.get(str(default_debit_id), 0))
+        Returns the record iterator, the selected columns and the batch
+        transform of the table, see ``compile_table_transform``.
+        """
+        source_columns = self._get_source_columns(source_db, source_table)
+        shared_fields = self._get_table_fields(source_table, source_columns)
+        source_records, source_columns = self._fetch_source_data(
+            source_db,
+            source_table,
+            itersize=itersize,
+            id_range=id_range,
+            after_id=after_id,
+            since=since,
+            source_ids=source_ids,
+            columns=self._get_selected_columns(
+                source_table, source_columns, shared_fields
+            ),
+        )
+        transform_batch = compile_table_transform(
+            self._get_table_spec(source_table),
+            source_columns,
+            shared_fields,
+            cache.get,
+            lookups,
+        )
+        return source_records, source_columns, transform_batch
 
-        elif source_table == 'account_account':
-            user_type_id = record[source_columns.index('user_type_id')]
-            user_type_name = self._get_account_type_name(user_type_id)
-            account_type_selection = dict(
-                (v, k) for k, v in self.env['account.account'].fields_get(
-                    allfields=['account_type'])['account_type']['selection']
+    def _log_rejected_rows(self, source_table, rejected, source_ids=None):
+        """Log the rows of a batch the table spec rejected."""
+        for index, reason in rejected.items():
+            source_id = source_ids[index] if source_ids else index
+            _sampled_logger.warning(
+                (source_table, 'rejected'),
+                "Skipping %s record %s: %s",
+                source_table,
+                source_id,
+                reason,
             )
-            record_values['account_type'] = account_type_selection.get(user_type_name)
 
-        elif source_table == 'product_category':
-            parent_cat_mapping = self._get_existing_mapping(source_table)
-            record_values['parent_id'] = parent_cat_mapping.get(str(record[source_columns.index('parent_id')]), 0)
+    def _fetch_source_data(
+        self,
+        source_db,
+        source_table,
+        itersize=None,
+        columns=None,
+        id_range=None,
+        after_id=None,
+        since=None,
+        source_ids=None,
+    ):
+        """Fetch columns and a lazy record iterator from source table.
 
-        elif source_table == 'product_template':
-            product_cat_mapping = self._get_existing_mapping('product_category')
-            record_values['categ_id'] = product_cat_mapping.get(str(record[source_columns.index('categ_id')]), 0)
+        Only ``columns`` are selected (every column when not given), optionally
+        restricted to the source ids within ``id_range`` or in ``source_ids``
+        and to the rows created or written after the ``since`` watermark. With
+        ``after_id`` the rows come in id order starting after that checkpoint.
+        Records are streamed through a server-side cursor, so at most
+        ``itersize`` rows are held in memory whatever the size of the table.
+        """
+        if columns is None:
+            columns = self._get_source_columns(source_db, source_table)
+        if itersize is None:
+            itersize = self._get_migration_config().fetch_itersize
+        conditions, params = [], []
+        if id_range:
+            conditions.append("id BETWEEN %s AND %s")
+            params += id_range
+        if after_id is not None:
+            conditions.append("id > %s")
+            params.append(after_id)
+        if source_ids is not None:
+            conditions.append("id = ANY(%s)")
+            params.append(list(source_ids))
+        if since:
+            conditions.append("(write_date > %s OR create_date > %s)")
+            params += [since, since]
+        query = f"SELECT {', '.join(columns)} FROM {source_table}"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        if after_id is not None:
+            query += " ORDER BY id"
+        records = self._stream_source_records(
+            source_db, query, params or None, itersize=itersize
+        )
+        return records, list(columns)
 
-        elif source_table == 'product_product':
-            product_template_mapping = self._get_existing_mapping('product_template')
-            record_values['product_tmpl_id'] = product_template_mapping.get(str(record[source_columns.index('product_tmpl_id')]), 0)
+    def _source_clock(self, source_db):
+        """Return the current UTC time of the source database, a sync watermark."""
+        with source_db.cursor() as cursor:
+            cursor.execute("SELECT now() at time zone 'UTC'")
+            clock = cursor.fetchone()[0]
+        source_db.rollback()
+        return clock
 
-        elif source_table == 'product_attribute_value':
-            product_attribute_mapping = self._get_existing_mapping('product_attribute')
-            record_values['attribute_id'] = product_attribute_mapping.get(str(record[source_columns.index('attribute_id')]), 0)
+    def _estimate_source_rows(self, source_db, source_tables):
+        """Return the summed planner row estimate of ``source_tables``, unscanned."""
+        with source_db.cursor() as cursor:
+            cursor.execute(
+                """
+                SELECT COALESCE(SUM(GREATEST(reltuples, 0)), 0)::bigint
+                FROM pg_class
+                WHERE relname IN %s AND relkind = 'r'
+            """,
+                (tuple(source_tables),),
+            )
+            estimate = cursor.fetchone()[0]
+        source_db.rollback()
+        return estimate
 
-        elif source_table == 'product_template_attribute_line':
-            product_template_mapping = self._get_existing_mapping('product_template')
-            product_attribute_mapping = self._get_existing_mapping('product_attribute')
-            record_values['product_tmpl_id'] = product_template_mapping.get(str(record[source_columns.index('product_tmpl_id')]), 0)
-            record_values['attribute_id'] = product_attribute_mapping.get(str(record[source_columns.index('attribute_id')]), 0)
+    def _source_id_ranges(self, source_db, source_table, count):
+        """Split the id span of a source table into ``count`` (low, high) ranges."""
+        with source_db.cursor() as cursor:
+            cursor.execute(f"SELECT min(id), max(id) FROM {source_table}")
+            low, high = cursor.fetchone()
+        if low is None:
+            return []
+        step = (high - low) // max(count, 1) + 1
+        return [
+            (start, min(start + step - 1, high)) for start in range(low, high + 1, step)
+        ]
 
-        elif source_table == 'product_attribute_value_product_template_attribute_line_rel':
-            product_attribute_value = self._get_existing_mapping('product_attribute_value')
-            product_template_attribute_line_mapping = self._get_existing_mapping('product_template_attribute_line')
-            print(product_attribute_value)
-            print(product_template_attribute_line_mapping)
-            record_values['product_attribute_value_id'] = product_attribute_value.get(str(record[source_columns.index('product_attribute_value_id')]), 0)
-            record_values['product_template_attribute_line_id'] = product_template_attribute_line_mapping.get(str(record[source_columns.index('product_template_attribute_line_id')]), 0)
+    def _stream_source_records(self, source_db, query, params=None, itersize=None):
+        """Yield the rows of ``query`` from a named (server-side) cursor."""
+        cursor_name = f"migration_{uuid.uuid4().hex}"
+        with source_db.cursor(name=cursor_name) as cursor:
+            cursor.itersize = itersize or DEFAULT_ITERSIZE
+            cursor.execute(query, params)
+            yield from cursor
 
+    def _get_shared_fields(self, source_model, source_columns):
+        """Find shared fields between Odoo model and source table.
 
+        The result is kept until the source columns change or the registry
+        is reloaded.
+        """
+        key = (source_model, tuple(source_columns), self.env.registry.registry_sequence)
+        shared_fields = _SHARED_FIELD_PLANS.get(key)
+        if shared_fields is not None:
+            return list(shared_fields)
+        if source_model == 'product.template':
+            shared_fields = [
+                field
+                for field in self.env[source_model]._fields
+                if field in source_columns
+            ]
+        else:
+            shared_fields = [
+                field
+                for field in self.env[source_model]._fields
+                if field in source_columns and field != 'id'
+            ]
+        _SHARED_FIELD_PLANS[key] = tuple(shared_fields)
+        return shared_fields
 
+    def _get_shared_fields_sql(self, source_table, source_columns):
+        """
+        Find shared fields between a source table's columns and an Odoo model's fields.
 
+        Args:
+            source_table (str): The name of the external source table.
+            source_columns (list): A list of column names to check.
+        Returns:
+            list: A list of shared field names between the provided columns and
+                the Odoo model's fields.
+        """
+        target_columns = self._schema_catalog('target').columns(source_table)
+        if target_columns is None:
+            self.env.cr.execute(
+                "SELECT column_name FROM information_schema.columns "
+                "WHERE table_name = %s",
+                (source_table,),
+            )
+            target_columns = [row[0] for row in self.env.cr.fetchall()]
+        shared_fields = [
+            column for column in target_columns if column in source_columns
+        ]
+        return shared_fields
 
+    def _benchmark_row_transform(self, source_table, sample_size=10000, repeat=5):
+        """Measure the per-row cost of transforming a sample of a source table.
 
-        return record_values
+        Compares the former ``list.index`` lookups per field with the compiled
+        projection and the full compiled table spec; the timings are logged
+        and returned in nanoseconds per row.
+        """
+        cache = self._new_mapping_cache()
+        with self._borrow_connections() as (source_db, _target_db):
+            lookups = self._load_lookups(source_db)
+            source_columns = self._get_source_columns(source_db, source_table)
+            shared_fields = self._get_table_fields(source_table, source_columns)
+            with source_db.cursor() as cursor:
+                cursor.execute(f"SELECT * FROM {source_table} LIMIT %s", (sample_size,))
+                rows = cursor.fetchall()
+            source_db.rollback()
 
-    def _get_account_type_name(self, user_type_id):
-        """Fetch account type name from user_type_id."""
-        source_db, _ = self._check_connection()
-        with source_db.cursor() as cursor:
-            cursor.execute("SELECT name FROM account_account_type WHERE id = %s", (user_type_id,))
-            result = cursor.fetchone()
-        return result[0] if result else None
+        def index_lookup(record):
+            return {f: record[source_columns.index(f)] for f in shared_fields}
 
+        transform_batch = compile_table_transform(
+            self._get_table_spec(source_table),
+            source_columns,
+            shared_fields,
+            cache.get,
+            lookups,
+        )
+        # Warm up the mapping cache so the timings exclude loading the id maps.
+        transform_batch(rows[:1])
+        result = {
+            'index_lookup': measure_transform_cost(index_lookup, rows, repeat) * 1e9,
+            'projection': measure_transform_cost(
+                compile_projection(source_columns, shared_fields), rows, repeat
+            )
+            * 1e9,
+            'transformer': measure_transform_cost(
+                transform_batch, rows, repeat, batched=True
+            )
+            * 1e9,
+        }
+        _logger.info(
+            "Row transform cost for %s over %s rows (%s columns, ns/row): %s",
+            source_table,
+            len(rows),
+            len(source_columns),
+            result,
+        )
+        return result
 
     def _insert_many_to_many(self, target_db, source_table, record_values):
-        """Insert a new record into the many to many target table."""
+        """Insert a new record into the many to many target table.
+
+        An existing pair is left as is. Returns the number of inserted rows.
+        """
         try:
             with target_db.cursor() as cursor:
                 columns = ', '.join(record_values.keys())
                 placeholders = ', '.join(['%s'] * len(record_values))
-                query = f"INSERT INTO {source_table} ({columns}) VALUES ({placeholders})"
+                query = (
+                    f"INSERT INTO {source_table} ({columns}) VALUES ({placeholders}) "
+                    "ON CONFLICT DO NOTHING"
+                )
                 cursor.execute(query, list(record_values.values()))
+                inserted = cursor.rowcount
                 target_db.commit()
+                return inserted
         except Exception as e:
             target_db.rollback()
             _logger.error(f"Failed to insert record: {e}")
@@ -235,7 +1525,10 @@ class ModelMapping(models.Model):
             with target_db.cursor() as cursor:
                 columns = ', '.join(record_values.keys())
                 placeholders = ', '.join(['%s'] * len(record_values))
-                query = f"INSERT INTO {source_table} ({columns}) VALUES ({placeholders}) RETURNING id;"
+                query = (
+                    f"INSERT INTO {source_table} ({columns}) "
+                    f"VALUES ({placeholders}) RETURNING id;"
+                )
                 cursor.execute(query, list(record_values.values()))
                 new_id = cursor.fetchone()[0]
                 target_db.commit()
@@ -245,78 +1538,451 @@ class ModelMapping(models.Model):
             _logger.error(f"Failed to insert record: {e}")
             raise ValidationError(_("Failed to insert record: %s") % str(e))
 
-    def _insert_record_orm(self, source_db,source_table, record_values):
-        """Insert a new record into the target table using ORM."""
-        source_table = source_table.replace('_', '.')
-        model = self.env[source_table]
+    def _insert_records(self, target_db, source_table, values_list):
+        """Insert a batch of records with multi-row INSERT ... RETURNING id.
+
+        Returns the new ids in the order of ``values_list``. Committing is left
+        to the caller so that a whole batch shares one transaction.
+        """
+        new_ids = [None] * len(values_list)
+        column_groups = defaultdict(list)
+        for index, record_values in enumerate(values_list):
+            column_groups[tuple(record_values)].append(index)
         try:
-            if source_table == 'product.template':
-                """Test skip bom line with same attribute values in bom lines."""
-                attribute_vals = self._return_attribute_value_id(source_db,record_values['id'])
-
-                record_values['attribute_line_ids']=[
-                        (0, 0, {
-                             'attribute_id': attribute_val['attribut_id'],
-                             'value_ids': [(6, 0, [attribute_val['value_id'],attribute_val['value_id']+1])]
-                         })
-                        for attribute_val in attribute_vals
-                ]
-                print(record_values)
-                # Create Template Product
-                # product_template = self.env['product.template'].create({
-                #     'name': 'Sofa',
-                #     'attribute_line_ids': [
-                #         (0, 0, {
-                #             'attribute_id': att_color.id,
-                #             'value_ids': [(6, 0, [att_color_red.id, att_color_blue.id])]
-                #         }),
-                #         (0, 0, {
-                #             'attribute_id': att_size.id,
-                #             'value_ids': [(6, 0, [att_size_big.id, att_size_medium.id])]
-                #         })
-                #     ]
-                # })
-                new_record = model.create(record_values)
-                # return 1
+            with target_db.cursor() as cursor:
+                for columns, indexes in column_groups.items():
+                    query = (
+                        f"INSERT INTO {source_table} ({', '.join(columns)}) "
+                        "VALUES %s RETURNING id"
+                    )
+                    rows = [tuple(values_list[index].values()) for index in indexes]
+                    result = execute_values(
+                        cursor, query, rows, page_size=len(rows), fetch=True
+                    )
+                    for index, (new_id,) in zip(indexes, result):
+                        new_ids[index] = new_id
+            return new_ids
+        except Exception as e:
+            # The caller owns the transaction and rolls back to its savepoint.
+            raise ValidationError(_("Failed to insert records: %s") % str(e))
 
-            else:
-                new_record = model.create(record_values)
-            return new_record.id
+    def _update_records(self, target_db, table, target_ids, values_list):
+        """Update target records in bulk, one UPDATE ... FROM (VALUES ...) per columns.
+
+        Values are cast to the target column types. Committing is left to the
+        caller so that a whole batch shares one transaction.
+        """
+        if not values_list:
+            return
+        column_types = self._get_column_types(target_db, table, 'target')
+        column_groups = defaultdict(list)
+        for index, record_values in enumerate(values_list):
+            column_groups[
+                tuple(column for column in record_values if column != 'id')
+            ].append(index)
+        try:
+            with target_db.cursor() as cursor:
+                for columns, indexes in column_groups.items():
+                    if not columns:
+                        continue
+                    assignments = ', '.join(
+                        f"{column} = v.{column}::{column_types[column]}"
+                        for column in columns
+                    )
+                    query = f"""
+                        UPDATE {table} AS t SET {assignments}
+                        FROM (VALUES %s) AS v(id, {', '.join(columns)})
+                        WHERE t.id = v.id
+                    """
+                    rows = [
+                        (
+                            target_ids[index],
+                            *(values_list[index][column] for column in columns),
+                        )
+                        for index in indexes
+                    ]
+                    execute_values(cursor, query, rows, page_size=len(rows))
+            _logger.info("Updated %s records of %s", len(values_list), table)
         except Exception as e:
-            _logger.error(f"Failed to insert record using ORM: {e}")
-            raise ValidationError(_("Failed to insert record using ORM: %s") % str(e))
+            # The caller owns the transaction and rolls back to its savepoint.
+            raise ValidationError(_("Failed to update records: %s") % str(e))
 
-    def _create_mapping(self, model_id, source_id, target_id):
-        """Create a mapping record."""
-        self.create({
-            'model_id': model_id,
-            'source_db_id': source_id,
-            'target_db_id': target_id,
-        })
-        _logger.info(f"Mapping created for source ID {source_id} -> target ID {target_id}")
+    def _update_records_orm(self, model_name, target_ids, values_list):
+        """Write changed source values on their migrated records through the ORM.
 
+        Records receiving the same values share one ``write``. The writes are
+        flushed together, so the UPDATE statements and recomputations run once
+        for the chunk and a failure surfaces here, inside the caller's
+        savepoint. The environment cache is invalidated afterwards.
+        """
+        model = self.env[model_name].with_context(**BULK_CREATE_CONTEXT)
+        writes = defaultdict(list)
+        for target_id, record_values in zip(target_ids, values_list):
+            record_values = {
+                field: value for field, value in record_values.items() if field != 'id'
+            }
+            try:
+                key = tuple(sorted(record_values.items()))
+                hash(key)
+            except TypeError:
+                # Unhashable values (commands, dicts) are written record by record.
+                key = ('id', target_id, *sorted(record_values))
+            writes[key].append((target_id, record_values))
+        for records in writes.values():
+            model.browse([target_id for target_id, _values in records]).write(
+                records[0][1]
+            )
+        self.env.flush_all()
+        self.env.invalidate_all()
 
-    def _return_attribute_value_id(self,source_db,template_id):
-        with source_db.cursor() as cursor:
-            product_attribute_value = self._get_existing_mapping('product_attribute_value')
-            product_attribute = self._get_existing_mapping('product_attribute')
-            cursor.execute(f"SELECT * FROM product_template where id={template_id}")
-            record = cursor.fetchone()
-            product_template_id = record[0]
-            cursor.execute(f"SELECT id,attribute_id FROM product_template_attribute_line where product_tmpl_id={product_template_id}")
-            line_ids = cursor.fetchall()
-            list_of_dict = []
-            for line in line_ids:
-                cursor.execute(f"SELECT * FROM product_attribute_value_product_template_attribute_line_rel where product_template_attribute_line_id={line[0]}")
-                vals= cursor.fetchall()
-                for val in vals:
-                    list_of_dict.append({
-                        "attribut_id":product_attribute.get(str(line[1]), 0),
-                        "value_id":product_attribute_value.get(str(val[0]), 0)
-                    })
+    def _copy_records(self, target_db, table, values_list):
+        """Bulk load records into a table needing no ids back with COPY FROM STDIN.
+
+        The rows are copied into a temporary table first and inserted from it
+        with ON CONFLICT DO NOTHING, so the rows already in ``table`` (those of
+        an earlier run) are skipped instead of failing the batch. Returns the
+        number of inserted rows.
+        """
+        columns = list(values_list[0])
+        column_list = ', '.join(columns)
+        copy_table = f"migration_copy_{uuid.uuid4().hex}"
+        buffer = io.StringIO()
+        for record_values in values_list:
+            buffer.write(
+                '\t'.join(_copy_value(record_values.get(column)) for column in columns)
+            )
+            buffer.write('\n')
+        buffer.seek(0)
+        try:
+            with target_db.cursor() as cursor:
+                cursor.execute(
+                    f"CREATE TEMPORARY TABLE {copy_table} "
+                    f"ON COMMIT DROP AS SELECT {column_list} FROM {table} WITH NO DATA"
+                )
+                cursor.copy_expert(
+                    f"COPY {copy_table} ({column_list}) FROM STDIN", buffer
+                )
+                cursor.execute(
+                    f"""
+                    INSERT INTO {table} ({column_list})
+                    SELECT {column_list} FROM {copy_table}
+                    ON CONFLICT DO NOTHING
+                """
+                )
+                inserted = cursor.rowcount
+                cursor.execute(f"DROP TABLE {copy_table}")
+                return inserted
+        except Exception as e:
+            # The caller owns the transaction and rolls back to its savepoint.
+            raise ValidationError(_("Failed to copy records: %s") % str(e))
+
+    def _run_batches(self, source_table, batches, prepare, write, metrics=None):
+        """Run ``write(prepare(batch))`` over ``batches``, overlapping the three stages.
+
+        A table whose foreign keys point to itself is run batch after batch:
+        its rows may only be translated once the previous batches are written.
+        ``metrics`` (a ``TableMetrics``) records the fetch and transform time
+        and the latency of every batch.
+        """
+        if metrics:
+            batches, prepare, write = metrics.instrument(batches, prepare, write)
+        spec = self._get_table_spec(source_table)
+        if (
+            self._normalize_model_key(source_table)
+            in spec.get('foreign_keys', {}).values()
+        ):
+            for batch in batches:
+                write(prepare(batch))
+            return None
+        timings = run_pipeline(
+            batches,
+            prepare,
+            write,
+            queue_size=(
+                self._get_migration_config().pipeline_queue_size
+                or DEFAULT_PIPELINE_QUEUE_SIZE
+            ),
+        )
+        self._log_pipeline_timings(source_table, timings)
+        return timings
+
+    def _patch_parents(
+        self, source_db, source_table, id_range=None, since=None, source_ids=None
+    ):
+        """Set the ``parents`` columns of a table once all its rows are migrated.
+
+        The parents of the migrated source rows (optionally restricted like
+        ``_fetch_source_data``) are staged in a temporary table and translated
+        through the mapping by one ``UPDATE ... FROM`` per column, so a
+        hierarchy migrates in a single run whatever the order of its rows.
+        The fields depending on these columns (parent_path, complete names,
+        commercial partners) are recomputed afterwards. The update runs on
+        the ORM cursor that created the records, which is why only tables
+        written through the ORM may have ``parents``.
+
+        Returns the number of target records patched.
+        """
+        source_columns = self._get_source_columns(source_db, source_table)
+        columns = [
+            column
+            for column in self._get_table_spec(source_table).get('parents', ())
+            if column in source_columns
+        ]
+        if not columns:
+            return 0
+        source_model = self._normalize_model_key(source_table)
+        model = self.env[source_model]
+        batch_size = self._get_migration_config().batch_size or DEFAULT_BATCH_SIZE
+        staging_table = f"migration_parents_{source_table}"
+        cr = self.env.cr
+        self.env.flush_all()
+
+        source_records, _columns = self._fetch_source_data(
+            source_db,
+            source_table,
+            columns=['id', *columns],
+            id_range=id_range,
+            since=since,
+            source_ids=source_ids,
+        )
+        cr.execute(f"DROP TABLE IF EXISTS {staging_table}")
+        column_definitions = ', '.join(f'{column} integer' for column in columns)
+        cr.execute(f"""
+            CREATE TEMP TABLE {staging_table} (
+                id integer PRIMARY KEY, {column_definitions})
+            ON COMMIT DROP
+        """)
+        for batch in split_every(batch_size, source_records):
+            execute_values(
+                cr,
+                f"INSERT INTO {staging_table} (id, {', '.join(columns)}) VALUES %s",
+                batch,
+                page_size=len(batch),
+            )
+        source_db.rollback()
+        cr.execute(f"ANALYZE {staging_table}")
+
+        patched = set()
+        for column in columns:
+            # A parent missing from the mapping (a quarantined row) leaves the column
+            # as it is.
+            cr.execute(
+                f"""
+                UPDATE {model._table} target SET {column} = parent_mapping.target_db_id
+                FROM {staging_table} source
+                JOIN model_mapping child_mapping
+                  ON child_mapping.model_id = %s
+                 AND child_mapping.source_db_id = source.id
+                LEFT JOIN model_mapping parent_mapping
+                  ON parent_mapping.model_id = %s
+                 AND parent_mapping.source_db_id = source.{column}
+                WHERE target.id = child_mapping.target_db_id
+                  AND (source.{column} IS NULL OR parent_mapping.id IS NOT NULL)
+                  AND target.{column} IS DISTINCT FROM parent_mapping.target_db_id
+                RETURNING target.id
+            """,
+                (source_model, source_model),
+            )
+            patched.update(target_id for (target_id,) in cr.fetchall())
+        cr.execute(f"DROP TABLE {staging_table}")
+
+        # The columns were written behind the ORM: recompute what depends on them.
+        self.env.invalidate_all()
+        if patched:
+            if model._parent_store:
+                model._parent_store_compute()
+            for target_ids in split_every(batch_size, sorted(patched)):
+                model.browse(target_ids).modified(columns)
+                self.env.flush_all()
+                self.env.invalidate_all()
+        _logger.info(
+            "Patched %s of %s %s records",
+            ', '.join(columns),
+            len(patched),
+            source_model,
+        )
+        return len(patched)
+
+    def _quarantine(self, cursor, checkpoint, source_table, rows):
+        """Quarantine failed ``(source id, values, error)`` rows through ``cursor``."""
+        if rows:
+            self.env['migration.quarantine']._quarantine_rows(
+                cursor,
+                self._get_migration_config().id,
+                checkpoint.run_id.id if checkpoint else None,
+                source_table,
+                rows,
+            )
 
-            return list_of_dict
+    def _finish_table_metrics(self, metrics, checkpoint=None):
+        """Log the metrics summary of a table run and store it on its checkpoint."""
+        summary = json.dumps(metrics.as_dict(), sort_keys=True)
+        _logger.info("Metrics of %s: %s", metrics.source_table, summary)
+        if checkpoint:
+            checkpoint.metrics = summary
 
+    def _log_pipeline_timings(self, source_table, timings):
+        """Log the busy and idle time of each pipeline stage and their bottleneck."""
+        _logger.info(
+            "Pipeline of %s: %s; bottleneck: %s",
+            source_table,
+            ', '.join(
+                "%s %.2fs busy / %.2fs idle over %s batches"
+                % (stage, timing['busy'], timing['idle'], timing['batches'])
+                for stage, timing in timings.items()
+            ),
+            pipeline_bottleneck(timings),
+        )
 
+    def _log_throughput(self, source_table, row_count, started_at, write_mode):
+        """Log and return the rows/sec achieved while migrating a table."""
+        elapsed = time.monotonic() - started_at
+        rate = row_count / elapsed if elapsed else 0.0
+        _logger.info(
+            "Migrated %s rows into %s in %.2fs (%.0f rows/s, %s writes)",
+            row_count,
+            source_table,
+            elapsed,
+            rate,
+            write_mode,
+        )
+        return rate
 
+    def _prepare_orm_rows(self, source_db, model_name, rows, cache):
+        """Prepare the ``(source id, values)`` rows of a batch for the ORM create.
 
+        The attribute values of a batch of product templates are loaded with
+        a single query instead of a few queries per template.
+        """
+        attribute_values = None
+        if model_name == 'product.template':
+            attribute_values = self._load_template_attribute_values(
+                source_db,
+                [record_values['id'] for _source_id, record_values in rows],
+                cache,
+            )
+        return [
+            (
+                source_id,
+                self._prepare_orm_values(model_name, record_values, attribute_values),
+            )
+            for source_id, record_values in rows
+        ]
+
+    def _prepare_orm_values(self, model_name, record_values, attribute_values):
+        """Complete the transformed values of a record with what ORM create needs.
+
+        ``attribute_values`` are the prefetched attribute values of product
+        templates by template id.
+        """
+        if model_name == 'product.template':
+            attribute_vals = attribute_values.get(record_values['id'], [])
+
+            record_values['attribute_line_ids'] = [
+                (
+                    0,
+                    0,
+                    {
+                        'attribute_id': attribute_val['attribut_id'],
+                        'value_ids': [
+                            (
+                                6,
+                                0,
+                                [
+                                    attribute_val['value_id'],
+                                    attribute_val['value_id'] + 1,
+                                ],
+                            )
+                        ],
+                    },
+                )
+                for attribute_val in attribute_vals
+            ]
+        return record_values
+
+    def _create_records_orm(self, model_name, rows, on_failure):
+        """Create ``(source id, values)`` rows with one ORM ``create`` per chunk.
+
+        Records are created without mail tracking, and their computed fields
+        are recomputed once for the whole chunk when it is flushed. A failing
+        chunk is bisected (see ``write_bisecting``) and its bad rows are handed
+        to ``on_failure(row, error)``. The environment cache is invalidated
+        afterwards so memory does not grow with the table.
+
+        Returns the (source id, target id) pairs of the created records.
+        """
+        model = self.env[model_name].with_context(**BULK_CREATE_CONTEXT)
+        id_pairs = []
+
+        def create_chunk(chunk):
+            records = model.create([
+                record_values for _source_id, record_values in chunk
+            ])
+            # Flush inside the savepoint, so recompute and constraint errors are
+            # bisected too.
+            self.env.flush_all()
+            id_pairs.extend(
+                zip((source_id for source_id, _values in chunk), records.ids)
+            )
+
+        write_bisecting(rows, create_chunk, self.env.cr.savepoint, on_failure)
+        self.env.invalidate_all()
+        return id_pairs
+
+    def _create_mappings(self, target_db, model_id, id_pairs):
+        """Write mapping rows for (source id, target id) pairs in one multi-row INSERT.
+
+        The rows go through ``target_db`` without committing, so they land in the
+        same transaction as the batch of target records they describe.
+        """
+        model_id = self._normalize_model_key(model_id)
+        rows = [
+            (model_id, source_id, target_id, self.env.uid, self.env.uid)
+            for source_id, target_id in id_pairs
+        ]
+        if not rows:
+            return
+        with target_db.cursor() as cursor:
+            execute_values(
+                cursor,
+                """
+                INSERT INTO model_mapping (model_id, source_db_id, target_db_id,
+                                           create_uid, create_date,
+                                           write_uid, write_date)
+                VALUES %s
+            """,
+                rows,
+                template="(%s, %s, %s, %s, now() at time zone 'UTC', "
+                "%s, now() at time zone 'UTC')",
+                page_size=len(rows),
+            )
+        _logger.debug("Created %s mappings for %s", len(rows), model_id)
+
+    def _load_template_attribute_values(self, source_db, template_ids, cache):
+        """Return the translated attribute values of source templates, by template id.
+
+        The attribute lines of all the templates and their values are read
+        with one joined query and grouped in memory.
+        """
+        attribute_values = {}
+        if not template_ids:
+            return attribute_values
+        with source_db.cursor() as cursor:
+            cursor.execute(
+                """
+                SELECT line.product_tmpl_id, line.attribute_id,
+                       rel.product_attribute_value_id
+                FROM product_template_attribute_line line
+                JOIN product_attribute_value_product_template_attribute_line_rel rel
+                  ON rel.product_template_attribute_line_id = line.id
+                WHERE line.product_tmpl_id = ANY(%s)
+                ORDER BY line.product_tmpl_id, line.id
+            """,
+                (list(template_ids),),
+            )
+            for template_id, attribute_id, value_id in cursor.fetchall():
+                attribute_values.setdefault(template_id, []).append({
+                    "attribut_id": cache.get('product.attribute', attribute_id, 0),
+                    "value_id": cache.get('product.attribute.value', value_id, 0),
+                })
+        return attribute_values
@@ -0,0 +1,25 @@
+from .batch_bisect import connection_savepoint, write_bisecting
+from .benchmark import (
+    SCALES,
+    PeakRssSampler,
+    create_database,
+    database_commits,
+    populate_synthetic_source,
+    synthetic_table_sizes,
+)
+from .connection_pool import MigrationConnectionPool
+from .id_map import CompactIdMap
+from .mapping_cache import MappingCache
+from .metrics import LogSampler, TableMetrics
+from .pipeline import pipeline_bottleneck, run_pipeline
+from .row_projection import column_getter, compile_projection, measure_transform_cost
+from .scheduler import run_dependency_graph
+from .schema_catalog import SchemaCatalog, read_table_stats
+from .table_transform import (
+    compile_table_transform,
+    resolve_value_map,
+    spec_input_columns,
+    spec_source_column,
+    spec_target_columns,
+    spec_unloaded_columns,
+)
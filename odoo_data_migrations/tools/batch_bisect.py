@@ -0,0 +1,49 @@
+import uuid
+from contextlib import contextmanager
+
+
+@contextmanager
+def connection_savepoint(conn):
+    """Run the block in a savepoint of psycopg2 ``conn``, rolled back if it raises."""
+    name = f"bisect_{uuid.uuid4().hex}"
+    with conn.cursor() as cursor:
+        cursor.execute(f"SAVEPOINT {name}")
+    try:
+        yield
+    except Exception:
+        with conn.cursor() as cursor:
+            cursor.execute(f"ROLLBACK TO SAVEPOINT {name}")
+            cursor.execute(f"RELEASE SAVEPOINT {name}")
+        raise
+    with conn.cursor() as cursor:
+        cursor.execute(f"RELEASE SAVEPOINT {name}")
+
+
+def write_bisecting(rows, write, savepoint, on_failure):
+    """Write ``rows`` with one ``write(rows)`` call, isolating the rows making it fail.
+
+    Every call runs inside ``savepoint()``, a context manager undoing the
+    call when it raises. A failing chunk is split in halves which are
+    written again, so a single bad row costs about 2 * log2(len(rows)) extra
+    statements while every other row is still written in bulk. A failing
+    chunk of one row is handed to ``on_failure(row, error)``.
+
+    Returns the number of rows written.
+    """
+    written = 0
+    chunks = [list(rows)] if rows else []
+    while chunks:
+        chunk = chunks.pop()
+        try:
+            with savepoint():
+                write(chunk)
+        except Exception as e:
+            if len(chunk) == 1:
+                on_failure(chunk[0], e)
+                continue
+            middle = len(chunk) // 2
+            # The first half is popped first, keeping the rows in their order.
+            chunks += [chunk[middle:], chunk[:middle]]
+            continue
+        written += len(chunk)
+    return written
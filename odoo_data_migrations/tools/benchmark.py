@@ -0,0 +1,313 @@
+import os
+import resource
+import threading
+
+import psycopg2
+
+# Benchmark scale -> number of account_move_line rows; the other tables are
+# sized from it.
+SCALES = {
+    '10k': 10_000,
+    '1m': 1_000_000,
+    '10m': 10_000_000,
+}
+
+# Old schema (Odoo 13 style) tables of the synthetic source database, in
+# creation order.
+SYNTHETIC_SCHEMA = [
+    """CREATE TABLE res_company (id serial PRIMARY KEY, name varchar NOT NULL)""",
+    """CREATE TABLE res_currency (id serial PRIMARY KEY, name varchar NOT NULL)""",
+    """CREATE TABLE res_partner (
+        id serial PRIMARY KEY, name varchar, email varchar, phone varchar,
+        is_company boolean, active boolean, company_id integer,
+        create_date timestamp, write_date timestamp)""",
+    """CREATE TABLE account_account_type (
+        id serial PRIMARY KEY, name varchar NOT NULL, type varchar)""",
+    """CREATE TABLE account_account (
+        id serial PRIMARY KEY, name varchar NOT NULL, code varchar NOT NULL,
+        user_type_id integer, reconcile boolean, company_id integer,
+        create_date timestamp, write_date timestamp)""",
+    """CREATE TABLE account_journal (
+        id serial PRIMARY KEY, name varchar NOT NULL, code varchar NOT NULL,
+        type varchar NOT NULL, company_id integer,
+        default_debit_account_id integer, default_credit_account_id integer,
+        profit_account_id integer, loss_account_id integer,
+        create_date timestamp, write_date timestamp)""",
+    """CREATE TABLE account_move (
+        id serial PRIMARY KEY, name varchar, ref varchar, date date NOT NULL,
+        type varchar, state varchar, journal_id integer, partner_id integer,
+        auto_post boolean, company_id integer,
+        create_date timestamp, write_date timestamp)""",
+    """CREATE TABLE account_move_line (
+        id serial PRIMARY KEY, move_id integer, account_id integer,
+        partner_id integer, name varchar, debit numeric, credit numeric,
+        balance numeric, company_currency_id integer, date date,
+        company_id integer, create_date timestamp, write_date timestamp)""",
+    """CREATE TABLE product_category (
+        id serial PRIMARY KEY, name varchar NOT NULL, parent_id integer,
+        create_date timestamp, write_date timestamp)""",
+    """CREATE TABLE product_attribute (
+        id serial PRIMARY KEY, name varchar NOT NULL, create_variant varchar,
+        create_date timestamp, write_date timestamp)""",
+    """CREATE TABLE product_attribute_value (
+        id serial PRIMARY KEY, name varchar NOT NULL, attribute_id integer,
+        create_date timestamp, write_date timestamp)""",
+    """CREATE TABLE product_template (
+        id serial PRIMARY KEY, name varchar NOT NULL, type varchar,
+        categ_id integer, list_price numeric, active boolean,
+        create_date timestamp, write_date timestamp)""",
+    """CREATE TABLE product_product (
+        id serial PRIMARY KEY, product_tmpl_id integer, default_code varchar,
+        active boolean, create_date timestamp, write_date timestamp)""",
+    """CREATE TABLE product_template_attribute_line (
+        id serial PRIMARY KEY, product_tmpl_id integer, attribute_id integer,
+        active boolean, create_date timestamp, write_date timestamp)""",
+    """CREATE TABLE product_attribute_value_product_template_attribute_line_rel (
+        product_attribute_value_id integer,
+        product_template_attribute_line_id integer)""",
+]
+
+# Account types of the old schema, named after the labels of the Odoo 16
+# account_type selection.
+SYNTHETIC_ACCOUNT_TYPES = [
+    ('Receivable', 'receivable'),
+    ('Payable', 'payable'),
+    ('Bank and Cash', 'liquidity'),
+    ('Current Assets', 'other'),
+    ('Income', 'other'),
+    ('Expenses', 'other'),
+]
+
+# Statements filling the synthetic tables from generate_series, in order, with
+# the table sizes as parameters.
+SYNTHETIC_DATA = [
+    """
+    INSERT INTO res_partner (name, email, phone, is_company, active, company_id,
+                             create_date, write_date)
+    SELECT 'Partner ' || n, 'partner' || n || '@example.com',
+           '+1 555 ' || lpad(n::text, 7, '0'), n %% 10 = 0, true, 1, now(), now()
+    FROM generate_series(1, %(res_partner)s) n
+    """,
+    """
+    INSERT INTO account_account (name, code, user_type_id, reconcile, company_id,
+                                 create_date, write_date)
+    SELECT 'Account ' || n, (100000 + n)::text, 1 + n %% %(account_types)s,
+           n %% 6 < 2, 1, now(), now()
+    FROM generate_series(1, %(account_account)s) n
+    """,
+    """
+    INSERT INTO account_journal (name, code, type, company_id,
+                                 default_debit_account_id, default_credit_account_id,
+                                 profit_account_id, loss_account_id,
+                                 create_date, write_date)
+    SELECT 'Journal ' || n, 'J' || n,
+           (ARRAY['sale', 'purchase', 'cash', 'bank', 'general'])[1 + n %% 5],
+           1, n, n, 100 + n, 150 + n, now(), now()
+    FROM generate_series(1, %(account_journal)s) n
+    """,
+    """
+    INSERT INTO account_move (name, ref, date, type, state, journal_id, partner_id,
+                              auto_post, company_id, create_date, write_date)
+    SELECT 'MOVE/' || n, 'REF' || n, date '2020-01-01' + (n %% 1000), 'entry',
+           'draft', 1 + n %% %(account_journal)s, 1 + n %% %(res_partner)s, false,
+           1, now(), now()
+    FROM generate_series(1, %(account_move)s) n
+    """,
+    # Lines alternate debit and credit within a move so every move balances.
+    """
+    INSERT INTO account_move_line (move_id, account_id, partner_id, name, debit,
+                                   credit, balance, company_currency_id, date,
+                                   company_id, create_date, write_date)
+    SELECT 1 + (n - 1) / 2 %% %(account_move)s, 1 + n %% %(account_account)s,
+           1 + n %% %(res_partner)s, 'Line ' || n,
+           CASE WHEN n %% 2 = 1 THEN 100 ELSE 0 END,
+           CASE WHEN n %% 2 = 0 THEN 100 ELSE 0 END,
+           CASE WHEN n %% 2 = 1 THEN 100 ELSE -100 END,
+           1, date '2020-01-01' + (n %% 1000), 1, now(), now()
+    FROM generate_series(1, %(account_move_line)s) n
+    """,
+    """
+    INSERT INTO product_category (name, parent_id, create_date, write_date)
+    SELECT 'Category ' || n, CASE WHEN n > 1 THEN 1 + (n - 2) / 4 END, now(), now()
+    FROM generate_series(1, %(product_category)s) n
+    """,
+    """
+    INSERT INTO product_attribute (name, create_variant, create_date, write_date)
+    SELECT 'Attribute ' || n, 'no_variant', now(), now()
+    FROM generate_series(1, %(product_attribute)s) n
+    """,
+    """
+    INSERT INTO product_attribute_value (name, attribute_id, create_date, write_date)
+    SELECT 'Value ' || n, 1 + (n - 1) %% %(product_attribute)s, now(), now()
+    FROM generate_series(1, %(product_attribute_value)s) n
+    """,
+    """
+    INSERT INTO product_template (name, type, categ_id, list_price, active,
+                                  create_date, write_date)
+    SELECT 'Product ' || n, 'consu', 1 + n %% %(product_category)s,
+           n %% 500 + 0.99, true, now(), now()
+    FROM generate_series(1, %(product_template)s) n
+    """,
+    """
+    INSERT INTO product_product (product_tmpl_id, default_code, active,
+                                 create_date, write_date)
+    SELECT n, 'SKU' || n, true, now(), now()
+    FROM generate_series(1, %(product_product)s) n
+    """,
+    """
+    INSERT INTO product_template_attribute_line (product_tmpl_id, attribute_id,
+                                                 active, create_date, write_date)
+    SELECT n, 1 + n %% %(product_attribute)s, true, now(), now()
+    FROM generate_series(1, %(product_template_attribute_line)s) n
+    """,
+    # Two values of the line's attribute per attribute line.
+    """
+    INSERT INTO product_attribute_value_product_template_attribute_line_rel
+           (product_attribute_value_id, product_template_attribute_line_id)
+    SELECT value.id, line.id
+    FROM product_template_attribute_line line
+    JOIN LATERAL (
+        SELECT id FROM product_attribute_value
+        WHERE attribute_id = line.attribute_id ORDER BY id LIMIT 2
+    ) value ON true
+    """,
+]
+
+
+def synthetic_table_sizes(move_lines):
+    """Return the row count of every synthetic table for ``move_lines`` items."""
+    templates = max(move_lines // 100, 10)
+    return {
+        'res_partner': max(move_lines // 20, 10),
+        'account_account': 200,
+        'account_journal': 10,
+        'account_move': max(move_lines // 5, 1),
+        'account_move_line': move_lines,
+        'product_category': 20,
+        'product_attribute': 5,
+        'product_attribute_value': 25,
+        'product_template': templates,
+        'product_product': templates,
+        'product_template_attribute_line': templates,
+    }
+
+
+def create_database(params, dbname, template=None, protected=()):
+    """(Re)create the database ``dbname`` on the server of ``params``.
+
+    The database is empty, or a copy of ``template``. It is dropped first,
+    so ``dbname`` may be neither the database of ``params`` nor one of the
+    ``protected`` ones.
+    """
+    if dbname in {params.get('dbname'), template, *protected}:
+        raise ValueError(f"Refusing to recreate database {dbname}")
+    conn = psycopg2.connect(**{**params, 'dbname': 'postgres'})
+    try:
+        conn.autocommit = True
+        with conn.cursor() as cursor:
+            cursor.execute(f'DROP DATABASE IF EXISTS "{dbname}"')
+            if template:
+                cursor.execute(f'CREATE DATABASE "{dbname}" TEMPLATE "{template}"')
+            else:
+                cursor.execute(f'CREATE DATABASE "{dbname}"')
+    finally:
+        conn.close()
+
+
+def populate_synthetic_source(conn, move_lines):
+    """Create the old schema in ``conn``, fill it with generated rows, analyze it.
+
+    Every table is filled by one ``INSERT ... SELECT generate_series`` so
+    millions of rows are generated server side in minutes. Returns the row
+    count of every table.
+    """
+    sizes = synthetic_table_sizes(move_lines)
+    with conn.cursor() as cursor:
+        for statement in SYNTHETIC_SCHEMA:
+            cursor.execute(statement)
+        cursor.execute("INSERT INTO res_company (name) VALUES ('Benchmark Company')")
+        cursor.execute("INSERT INTO res_currency (name) VALUES ('USD'), ('EUR')")
+        cursor.execute(
+            "INSERT INTO account_account_type (name, type) VALUES "
+            + ', '.join(
+                cursor.mogrify("(%s, %s)", account_type).decode()
+                for account_type in SYNTHETIC_ACCOUNT_TYPES
+            )
+        )
+        params = {**sizes, 'account_types': len(SYNTHETIC_ACCOUNT_TYPES)}
+        for statement in SYNTHETIC_DATA:
+            cursor.execute(statement, params)
+    conn.commit()
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("ANALYZE")
+    finally:
+        conn.autocommit = False
+    return sizes
+
+
+def database_commits(conn):
+    """Return the number of transactions committed so far in ``conn``'s database.
+
+    The statistics are flushed by each backend with a small delay, so a
+    difference of two readings is exact for large runs and approximate for
+    tiny ones.
+    """
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT pg_stat_clear_snapshot()")
+        cursor.execute("""
+            SELECT xact_commit FROM pg_stat_database WHERE datname = current_database()
+        """)
+        commits = cursor.fetchone()[0]
+    conn.rollback()
+    return commits
+
+
+def _current_rss():
+    """Return the resident set size of this process in bytes.
+
+    None where /proc is unavailable.
+    """
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class PeakRssSampler:
+    """Context manager sampling the resident memory of the process for its peak.
+
+    Falls back to ``ru_maxrss`` (the peak of the whole process life) where
+    the current RSS cannot be read.
+    """
+
+    def __init__(self, interval=0.1):
+        self._interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+        self.peak = 0
+
+    def _sample(self):
+        while not self._stop.is_set():
+            rss = _current_rss()
+            if rss is None:
+                return
+            self.peak = max(self.peak, rss)
+            self._stop.wait(self._interval)
+
+    def __enter__(self):
+        self.peak = _current_rss() or 0
+        self._thread = threading.Thread(
+            target=self._sample, name='rss-sampler', daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        if not self.peak:
+            self.peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        return False
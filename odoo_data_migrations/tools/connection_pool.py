@@ -0,0 +1,130 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+import psycopg2
+from psycopg2.extensions import TRANSACTION_STATUS_UNKNOWN
+from psycopg2.pool import ThreadedConnectionPool
+
+_logger = logging.getLogger(__name__)
+
+# Connections idle for longer than this are pinged before being handed out.
+HEALTH_CHECK_IDLE_SECONDS = 30
+
+
+class MigrationConnectionPool:
+    """Thread-safe pools of source and target connections for one configuration.
+
+    Connections are handed out in (source, target) pairs through
+    :meth:`connections` and go back to the pool afterwards instead of being
+    closed. Time spent opening new connections is accumulated apart from the
+    time the pool is in use, so setup cost can be told from transfer cost.
+    """
+
+    def __init__(self, source_params, target_params, maxconn):
+        self.params = (source_params, target_params)
+        self._pools = (
+            self._new_pool(maxconn, source_params),
+            self._new_pool(maxconn, target_params),
+        )
+        self._lock = threading.Lock()
+        self._last_used = {}
+        self._users = 0
+        self._opened_at = time.monotonic()
+        self.connections_opened = 0
+        self.setup_time = 0.0
+
+    @staticmethod
+    def _new_pool(maxconn, params):
+        pool = ThreadedConnectionPool(0, maxconn, **params)
+        # Open connections lazily but keep up to maxconn of them idle: psycopg2
+        # only reads minconn at creation and when deciding to keep a returned
+        # connection.
+        pool.minconn = maxconn
+        return pool
+
+    def _getconn(self, pool):
+        started_at = time.monotonic()
+        conn = pool.getconn()
+        with self._lock:
+            last_used = self._last_used.get(id(conn))
+            if last_used is None:
+                self.connections_opened += 1
+                self.setup_time += time.monotonic() - started_at
+        if last_used is not None and not self._is_healthy(conn, last_used):
+            _logger.info("Discarding broken migration connection")
+            pool.putconn(conn, close=True)
+            with self._lock:
+                self._last_used.pop(id(conn), None)
+            return self._getconn(pool)
+        return conn
+
+    def _is_healthy(self, conn, last_used):
+        if conn.closed or conn.info.transaction_status == TRANSACTION_STATUS_UNKNOWN:
+            return False
+        if time.monotonic() - last_used < HEALTH_CHECK_IDLE_SECONDS:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _putconn(self, pool, conn):
+        with self._lock:
+            self._last_used[id(conn)] = time.monotonic()
+        pool.putconn(conn, close=bool(conn.closed))
+
+    def getconns(self):
+        """Return a (source, target) connection pair taken from the pools."""
+        source_pool, target_pool = self._pools
+        source_db = self._getconn(source_pool)
+        try:
+            target_db = self._getconn(target_pool)
+        except Exception:
+            self._putconn(source_pool, source_db)
+            raise
+        return source_db, target_db
+
+    def putconns(self, source_db, target_db):
+        """Give a pair back; uncommitted work is rolled back by the pool."""
+        source_pool, target_pool = self._pools
+        self._putconn(source_pool, source_db)
+        self._putconn(target_pool, target_db)
+
+    @contextmanager
+    def connections(self):
+        """Yield a (source, target) connection pair and give it back afterwards."""
+        source_db, target_db = self.getconns()
+        try:
+            yield source_db, target_db
+        finally:
+            self.putconns(source_db, target_db)
+
+    def acquire(self):
+        """Register one more user of the pool."""
+        with self._lock:
+            self._users += 1
+
+    def release(self):
+        """Unregister a user; return True when it was the last one."""
+        with self._lock:
+            self._users -= 1
+            return self._users <= 0
+
+    def stats(self):
+        """Return connection setup time versus time spent using the connections."""
+        in_use = time.monotonic() - self._opened_at
+        return {
+            'connections_opened': self.connections_opened,
+            'setup_time': self.setup_time,
+            'transfer_time': max(in_use - self.setup_time, 0.0),
+        }
+
+    def close(self):
+        """Close every connection of both pools."""
+        for pool in self._pools:
+            pool.closeall()
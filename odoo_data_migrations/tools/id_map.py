@@ -0,0 +1,189 @@
+import bisect
+import heapq
+import mmap
+import os
+import struct
+from array import array
+from operator import itemgetter
+
+_MAGIC = b'ODMIDMP2'
+# magic, dense flag, base, entry count, key count, value count,
+# fingerprint count, fingerprint max source id, fingerprint target id sum
+_HEADER = struct.Struct('<8sBqqqqqqq')
+_HEADER_SIZE = 72
+# A dense map is used when it needs at most this many slots per entry.
+DENSE_RATIO = 2
+
+
+class CompactIdMap:
+    """Immutable source id -> target id map stored in flat int64 arrays.
+
+    Sparse maps keep sorted keys and their values side by side and answer
+    lookups with a binary search; when source ids are (nearly) contiguous the
+    map switches to a dense array indexed by ``source_id - base`` where 0 marks
+    a missing entry. Either way an entry costs 8 to 16 bytes instead of the
+    ~100 bytes of a dict item, and the arrays can be saved to a file and
+    reopened through ``mmap`` without parsing.
+    """
+
+    __slots__ = ('_keys', '_values', '_base', '_dense', '_size', '_mmap', 'fingerprint')
+
+    def __init__(
+        self,
+        keys,
+        values,
+        dense=False,
+        base=0,
+        size=None,
+        fingerprint=None,
+        buffer=None,
+    ):
+        self._keys = keys
+        self._values = values
+        self._dense = dense
+        self._base = base
+        self._size = len(keys) if size is None else size
+        self._mmap = buffer
+        self.fingerprint = fingerprint
+
+    @classmethod
+    def from_sorted_pairs(cls, pairs, fingerprint=None):
+        """Build a map from (source id, target id) pairs ordered by source id.
+
+        When a source id is repeated the last pair wins.
+        """
+        keys = array('q')
+        values = array('q')
+        for source_id, target_id in pairs:
+            if keys and keys[-1] == source_id:
+                values[-1] = target_id
+                continue
+            keys.append(source_id)
+            values.append(target_id)
+        if keys and keys[-1] - keys[0] + 1 <= DENSE_RATIO * len(keys):
+            base = keys[0]
+            dense_values = array('q', [0]) * (keys[-1] - base + 1)
+            for source_id, target_id in zip(keys, values):
+                dense_values[source_id - base] = target_id
+            return cls(
+                array('q'),
+                dense_values,
+                dense=True,
+                base=base,
+                size=len(keys),
+                fingerprint=fingerprint,
+            )
+        return cls(keys, values, fingerprint=fingerprint)
+
+    @classmethod
+    def from_pairs(cls, pairs, fingerprint=None):
+        """Build a map from unordered (source id, target id) pairs."""
+        return cls.from_sorted_pairs(
+            sorted(pairs, key=itemgetter(0)), fingerprint=fingerprint
+        )
+
+    def merged(self, overrides, fingerprint=None):
+        """Return a new map of these entries overridden by the ``overrides`` dict."""
+        pairs = heapq.merge(self.items(), sorted(overrides.items()), key=itemgetter(0))
+        return self.from_sorted_pairs(pairs, fingerprint=fingerprint)
+
+    def get(self, source_id, default=None):
+        """Return the target id of ``source_id`` or ``default``."""
+        if self._dense:
+            offset = source_id - self._base
+            if 0 <= offset < len(self._values):
+                target_id = self._values[offset]
+                if target_id:
+                    return target_id
+            return default
+        index = bisect.bisect_left(self._keys, source_id)
+        if index < len(self._keys) and self._keys[index] == source_id:
+            return self._values[index]
+        return default
+
+    def __contains__(self, source_id):
+        return self.get(source_id) is not None
+
+    def __len__(self):
+        return self._size
+
+    def items(self):
+        """Yield (source id, target id) pairs ordered by source id."""
+        if self._dense:
+            base = self._base
+            return (
+                (base + offset, target_id)
+                for offset, target_id in enumerate(self._values)
+                if target_id
+            )
+        return zip(self._keys, self._values)
+
+    def max_source_id(self):
+        """Return the largest mapped source id, 0 for an empty map."""
+        if self._dense:
+            return self._base + len(self._values) - 1 if self._values else 0
+        return self._keys[-1] if self._keys else 0
+
+    def target_id_sum(self):
+        """Return the sum of the mapped target ids, 0 for an empty map."""
+        return sum(self._values)
+
+    def nbytes(self):
+        """Return the memory taken by the underlying arrays."""
+        return (len(self._keys) + len(self._values)) * 8
+
+    def save(self, path):
+        """Write the map to ``path`` in a layout :meth:`load` can memory-map."""
+        fingerprint = self.fingerprint or (0, 0, 0)
+        header = _HEADER.pack(
+            _MAGIC,
+            self._dense,
+            self._base,
+            self._size,
+            len(self._keys),
+            len(self._values),
+            *fingerprint,
+        )
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as file:
+            file.write(header.ljust(_HEADER_SIZE, b'\0'))
+            file.write(memoryview(self._keys).cast('B'))
+            file.write(memoryview(self._values).cast('B'))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """Reopen a map written by :meth:`save`; the arrays are not copied."""
+        with open(path, 'rb') as file:
+            buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, dense, base, size, key_count, value_count, *fingerprint = (
+            _HEADER.unpack_from(buffer)
+        )
+        if magic != _MAGIC:
+            buffer.close()
+            raise ValueError(f"{path} is not a compact id map")
+        view = memoryview(buffer)
+        keys_end = _HEADER_SIZE + key_count * 8
+        keys = view[_HEADER_SIZE:keys_end].cast('q')
+        values = view[keys_end : keys_end + value_count * 8].cast('q')
+        return cls(
+            keys,
+            values,
+            dense=bool(dense),
+            base=base,
+            size=size,
+            fingerprint=tuple(fingerprint),
+            buffer=buffer,
+        )
+
+    @classmethod
+    def read_fingerprint(cls, path):
+        """Return the fingerprint stored in the file at ``path`` or None."""
+        try:
+            with open(path, 'rb') as file:
+                header = file.read(_HEADER.size)
+        except OSError:
+            return None
+        if len(header) < _HEADER.size or header[:8] != _MAGIC:
+            return None
+        return tuple(_HEADER.unpack(header)[6:])
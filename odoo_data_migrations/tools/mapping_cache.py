@@ -0,0 +1,150 @@
+import logging
+import os
+
+from .id_map import CompactIdMap
+
+_logger = logging.getLogger(__name__)
+
+# Mappings written during a run stay in a dict until the overlay reaches this
+# size (or a quarter of the compact map, whichever is larger) and are then
+# merged into the compact map.
+COMPACT_THRESHOLD = 50000
+
+
+class MappingCache:
+    """Source id -> target id translation cache living for one migration run.
+
+    Each model's mapping is loaded once through ``loader`` on first use into a
+    :class:`CompactIdMap` and is then kept up to date with :meth:`add` /
+    :meth:`update` as new mappings are written, so every later lookup is an
+    O(1) or O(log n) array access.
+
+    When ``store_dir`` is set, compact maps are persisted there and reopened
+    through ``mmap`` by later runs as long as ``fingerprint(model_id)`` still
+    matches the one stored with the file.
+    """
+
+    def __init__(self, loader, store_dir=None, fingerprint=None):
+        self._loader = loader
+        self._store_dir = store_dir
+        self._fingerprint = fingerprint
+        self._maps = {}
+        self._overlays = {}
+        self._dirty = set()
+        self.hits = 0
+        self.misses = 0
+
+    def _store_path(self, model_id):
+        return os.path.join(self._store_dir, f"{model_id}.idmap")
+
+    def _load(self, model_id):
+        fingerprint = None
+        if self._store_dir and self._fingerprint:
+            path = self._store_path(model_id)
+            fingerprint = tuple(self._fingerprint(model_id))
+            if CompactIdMap.read_fingerprint(path) == fingerprint:
+                _logger.info("Reopened persisted id map for %s", model_id)
+                return CompactIdMap.load(path)
+            self._dirty.add(model_id)
+        return CompactIdMap.from_sorted_pairs(
+            self._loader(model_id), fingerprint=fingerprint
+        )
+
+    def _get_maps(self, model_id):
+        id_map = self._maps.get(model_id)
+        if id_map is None:
+            id_map = self._maps[model_id] = self._load(model_id)
+            self._overlays[model_id] = {}
+        return id_map, self._overlays[model_id]
+
+    def _compact(self, model_id):
+        id_map, overlay = self._get_maps(model_id)
+        if overlay:
+            self._maps[model_id] = id_map.merged(overlay)
+            self._overlays[model_id] = {}
+            self._dirty.add(model_id)
+
+    def get(self, model_id, source_id, default=None):
+        """Return the target id of ``source_id`` or ``default`` when unmapped."""
+        if source_id is None or source_id is False:
+            return default
+        source_id = int(source_id)
+        self._get_maps(model_id)
+        # Read the overlay before the map: _compact publishes the merged map
+        # before it empties the overlay, so a reader in another thread never
+        # misses a pair being folded in.
+        target_id = self._overlays[model_id].get(source_id)
+        if target_id is None:
+            target_id = self._maps[model_id].get(source_id)
+        if target_id is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return target_id
+
+    def contains(self, model_id, source_id):
+        """Return whether ``source_id`` already has a mapping."""
+        return self.get(model_id, source_id) is not None
+
+    def add(self, model_id, source_id, target_id):
+        """Register a freshly written mapping."""
+        self.update(model_id, [(source_id, target_id)])
+
+    def update(self, model_id, id_pairs):
+        """Register freshly written (source id, target id) pairs."""
+        id_map, overlay = self._get_maps(model_id)
+        for source_id, target_id in id_pairs:
+            overlay[int(source_id)] = target_id
+        if len(overlay) >= max(COMPACT_THRESHOLD, len(id_map) // 4):
+            self._compact(model_id)
+
+    def persist(self):
+        """Save every map changed during the run to ``store_dir``."""
+        if not self._store_dir:
+            return
+        os.makedirs(self._store_dir, exist_ok=True)
+        for model_id in list(self._maps):
+            if self._overlays[model_id]:
+                self._compact(model_id)
+            if model_id not in self._dirty:
+                continue
+            id_map = self._maps[model_id]
+            id_map.fingerprint = (
+                len(id_map),
+                id_map.max_source_id(),
+                id_map.target_id_sum(),
+            )
+            id_map.save(self._store_path(model_id))
+        self._dirty.clear()
+
+    def preload(self, model_ids):
+        """Load the maps of ``model_ids`` now and fold pending mappings into them."""
+        for model_id in model_ids:
+            self._get_maps(model_id)
+            self._compact(model_id)
+
+    def spawn(self, loader, model_ids):
+        """Return a cache for another worker that shares the id maps of ``model_ids``.
+
+        The shared models must have been loaded with :meth:`preload` first.
+        Compact maps are immutable, so they can be read from several threads;
+        every other model is loaded through the worker's own ``loader``.
+        """
+        cache = MappingCache(loader)
+        for model_id in model_ids:
+            cache._maps[model_id] = self._maps[model_id]
+            cache._overlays[model_id] = {}
+        return cache
+
+    def stats(self):
+        """Return the hit/miss counters and the number of cached mappings."""
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / lookups if lookups else 0.0,
+            'models': {
+                model_id: len(id_map) + len(self._overlays[model_id])
+                for model_id, id_map in self._maps.items()
+            },
+        }
@@ -0,0 +1,154 @@
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+ROW_COUNTERS = ('read', 'transformed', 'inserted', 'updated', 'skipped', 'failed')
+PHASE_TIMERS = ('fetch', 'transform', 'write', 'mapping_write', 'commit')
+LATENCY_PERCENTILES = (50, 90, 99)
+
+
+def percentile(sorted_values, rank):
+    """Return the nearest-rank ``rank`` percentile of a sorted list, 0.0 if empty."""
+    if not sorted_values:
+        return 0.0
+    index = max(
+        0, min(len(sorted_values) - 1, -(-rank * len(sorted_values) // 100) - 1)
+    )
+    return sorted_values[index]
+
+
+class TableMetrics:
+    """Row counters, phase timers and batch latencies of one table run.
+
+    The stages of a pipeline feed it from different threads, so every update
+    goes through a lock. A batch's latency runs from the moment it is read
+    from the source until its write returns; batches are written in the order
+    they are read.
+    """
+
+    def __init__(self, source_table):
+        self.source_table = source_table
+        self.rows = dict.fromkeys(ROW_COUNTERS, 0)
+        self.seconds = dict.fromkeys(PHASE_TIMERS, 0.0)
+        self.latencies = []
+        self._read_at = deque()
+        self._lock = threading.Lock()
+        self._started_at = time.monotonic()
+
+    def count(self, counter, rows=1):
+        """Add ``rows`` to a row counter."""
+        with self._lock:
+            self.rows[counter] += rows
+
+    def add_time(self, phase, seconds):
+        """Add ``seconds`` to a phase timer."""
+        with self._lock:
+            self.seconds[phase] += seconds
+
+    @contextmanager
+    def timer(self, phase):
+        """Time the block into a phase timer."""
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(phase, time.perf_counter() - started_at)
+
+    def instrument(self, batches, prepare, write):
+        """Wrap the source batches and the transform and write steps of a table run.
+
+        Fetch time, rows read, transform time and batch latencies are recorded
+        by the wrappers; the write step times its own sub-phases.
+        """
+
+        def timed_batches():
+            iterator = iter(batches)
+            while True:
+                started_at = time.perf_counter()
+                batch = next(iterator, None)
+                self.add_time('fetch', time.perf_counter() - started_at)
+                if batch is None:
+                    return
+                self.count('read', len(batch))
+                self._read_at.append(time.perf_counter())
+                yield batch
+
+        def timed_prepare(batch):
+            with self.timer('transform'):
+                return prepare(batch)
+
+        def timed_write(prepared):
+            write(prepared)
+            latency = time.perf_counter() - self._read_at.popleft()
+            with self._lock:
+                self.latencies.append(latency)
+
+        return timed_batches(), timed_prepare, timed_write
+
+    def as_dict(self):
+        """Return a JSON serializable summary of the table run."""
+        with self._lock:
+            elapsed = time.monotonic() - self._started_at
+            latencies = sorted(self.latencies)
+            processed = self.rows['inserted'] + self.rows['updated']
+            return {
+                'table': self.source_table,
+                'elapsed': round(elapsed, 3),
+                'rows': dict(self.rows),
+                'seconds': {
+                    phase: round(seconds, 3) for phase, seconds in self.seconds.items()
+                },
+                'rows_per_second': round(processed / elapsed, 1) if elapsed else 0.0,
+                'batches': len(latencies),
+                'batch_latency': {
+                    **{
+                        f'p{rank}': round(percentile(latencies, rank), 4)
+                        for rank in LATENCY_PERCENTILES
+                    },
+                    'max': round(latencies[-1], 4) if latencies else 0.0,
+                },
+            }
+
+
+class LogSampler:
+    """Rate-limited logging for per-row messages.
+
+    The first message of a key is logged, then at most one every ``interval``
+    seconds; the next one logged reports how many were suppressed meanwhile.
+    """
+
+    def __init__(self, logger, interval=10.0):
+        self._logger = logger
+        self._interval = interval
+        self._last_logged = {}
+        self._suppressed = {}
+        self._lock = threading.Lock()
+
+    def log(self, level, key, message, *args):
+        """Log ``message % args`` at ``level`` unless ``key`` was logged too recently.
+
+        A key is logged at most once per ``interval`` seconds.
+        """
+        now = time.monotonic()
+        with self._lock:
+            last_logged = self._last_logged.get(key)
+            if last_logged is not None and now - last_logged < self._interval:
+                self._suppressed[key] = self._suppressed.get(key, 0) + 1
+                return
+            self._last_logged[key] = now
+            suppressed = self._suppressed.pop(key, 0)
+        if suppressed:
+            message += " (%s similar messages suppressed)"
+            args += (suppressed,)
+        self._logger.log(level, message, *args)
+
+    def info(self, key, message, *args):
+        self.log(logging.INFO, key, message, *args)
+
+    def warning(self, key, message, *args):
+        self.log(logging.WARNING, key, message, *args)
+
+    def error(self, key, message, *args):
+        self.log(logging.ERROR, key, message, *args)
@@ -0,0 +1,149 @@
+import logging
+import queue
+import threading
+import time
+
+_logger = logging.getLogger(__name__)
+
+PIPELINE_STAGES = ('read', 'transform', 'write')
+
+# Marks the end of the stream in the stage queues.
+_DONE = object()
+
+
+class _Pipeline:
+    """Stage queues, stop flag and timings shared by the threads of a pipeline."""
+
+    def __init__(self, queue_size):
+        self.timings = {
+            stage: {'busy': 0.0, 'idle': 0.0, 'batches': 0} for stage in PIPELINE_STAGES
+        }
+        self.read_queue = queue.Queue(maxsize=max(queue_size, 1))
+        self.write_queue = queue.Queue(maxsize=max(queue_size, 1))
+        self.stop = threading.Event()
+        self.errors = []
+
+    def put(self, target, item, timing):
+        started_at = time.perf_counter()
+        while not self.stop.is_set():
+            try:
+                target.put(item, timeout=0.1)
+                break
+            except queue.Full:
+                continue
+        timing['idle'] += time.perf_counter() - started_at
+
+    def get(self, source, timing):
+        started_at = time.perf_counter()
+        item = _DONE
+        while not self.stop.is_set():
+            try:
+                item = source.get(timeout=0.1)
+                break
+            except queue.Empty:
+                continue
+        timing['idle'] += time.perf_counter() - started_at
+        return item
+
+    def run_stage(self, stage, produce, target):
+        """Put the items returned by ``produce`` in ``target`` until it is done."""
+        timing = self.timings[stage]
+        try:
+            while not self.stop.is_set():
+                item = produce(timing)
+                if item is _DONE:
+                    break
+                timing['batches'] += 1
+                self.put(target, item, timing)
+        except Exception as e:
+            self.errors.append(e)
+            self.stop.set()
+        finally:
+            self.put(target, _DONE, timing)
+
+    def start_stage(self, stage, produce, target):
+        thread = threading.Thread(
+            target=self.run_stage,
+            args=(stage, produce, target),
+            name=f'pipeline-{stage}',
+            daemon=True,
+        )
+        thread.start()
+        return thread
+
+    def read_stage(self, batches):
+        """Return the producer of the read stage, pulling ``batches``."""
+        batch_iterator = iter(batches)
+
+        def read_batch(timing):
+            started_at = time.perf_counter()
+            batch = next(batch_iterator, _DONE)
+            timing['busy'] += time.perf_counter() - started_at
+            return batch
+
+        return read_batch
+
+    def transform_stage(self, transform):
+        """Return the producer of the transform stage, applying ``transform``."""
+
+        def transform_batch(timing):
+            batch = self.get(self.read_queue, timing)
+            if batch is _DONE:
+                return _DONE
+            started_at = time.perf_counter()
+            result = transform(batch)
+            timing['busy'] += time.perf_counter() - started_at
+            return result
+
+        return transform_batch
+
+    def write_all(self, write):
+        """Call ``write`` on every transformed batch, in the calling thread."""
+        timing = self.timings['write']
+        while True:
+            item = self.get(self.write_queue, timing)
+            if item is _DONE:
+                break
+            started_at = time.perf_counter()
+            write(item)
+            timing['busy'] += time.perf_counter() - started_at
+            timing['batches'] += 1
+
+
+def run_pipeline(batches, transform, write, queue_size=2):
+    """Call ``write(transform(batch))`` for every batch, the stages overlapping.
+
+    A reader thread pulls ``batches`` (typically split from a server-side
+    cursor) while a transformer thread applies ``transform`` to the previous
+    batch and ``write`` stores the one before. ``write`` runs in the calling
+    thread, so it may use the caller's cursors and environment. The stages are
+    joined by queues holding at most ``queue_size`` batches each, which bounds
+    the memory in flight. The first exception raised by a stage stops the
+    other ones and is re-raised once they are done.
+
+    Returns ``{stage: {'busy': s, 'idle': s, 'batches': n}}``; the stage with
+    the highest busy time is the bottleneck.
+    """
+    pipeline = _Pipeline(queue_size)
+    threads = [
+        pipeline.start_stage('read', pipeline.read_stage(batches), pipeline.read_queue),
+        pipeline.start_stage(
+            'transform', pipeline.transform_stage(transform), pipeline.write_queue
+        ),
+    ]
+    try:
+        pipeline.write_all(write)
+    except Exception as e:
+        pipeline.errors.append(e)
+    finally:
+        pipeline.stop.set()
+        for thread in threads:
+            thread.join()
+    if pipeline.errors:
+        raise pipeline.errors[0]
+    return pipeline.timings
+
+
+def pipeline_bottleneck(timings):
+    """Return the stage of ``run_pipeline`` timings that was busy the longest."""
+    return max(timings, key=lambda stage: timings[stage]['busy'])
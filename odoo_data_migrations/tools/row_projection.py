@@ -0,0 +1,44 @@
+import time
+from operator import itemgetter
+
+
+def compile_projection(columns, fields):
+    """Return a function turning a row tuple of ``columns`` into a {field: value} dict.
+
+    Column positions are resolved once, so projecting a row costs one
+    ``itemgetter`` call instead of a ``list.index`` scan per field.
+    """
+    fields = tuple(fields)
+    if not fields:
+        return lambda row: {}
+    getter = itemgetter(*(columns.index(field) for field in fields))
+    if len(fields) == 1:
+        field = fields[0]
+        return lambda row: {field: getter(row)}
+    return lambda row: dict(zip(fields, getter(row)))
+
+
+def column_getter(columns, column):
+    """Return a function reading ``column`` from a row tuple of ``columns``."""
+    return itemgetter(columns.index(column))
+
+
+def measure_transform_cost(transform, rows, repeat=5, batched=False):
+    """Return the best per-row time in seconds of ``transform`` over ``rows``.
+
+    A ``batched`` transform is called once with the whole list of rows.
+    """
+    rows = list(rows)
+    if not rows:
+        return 0.0
+    best = None
+    for _round in range(repeat):
+        started_at = time.perf_counter()
+        if batched:
+            transform(rows)
+        else:
+            for row in rows:
+                transform(row)
+        elapsed = time.perf_counter() - started_at
+        best = elapsed if best is None else min(best, elapsed)
+    return best / len(rows)
@@ -0,0 +1,43 @@
+import logging
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from graphlib import TopologicalSorter
+
+_logger = logging.getLogger(__name__)
+
+
+def run_dependency_graph(dependencies, run, max_workers):
+    """Run ``run(node)`` for every node of a dependency graph on a thread pool.
+
+    ``dependencies`` maps each node to the nodes that must finish first. A node
+    is submitted as soon as all of its dependencies succeeded, so independent
+    nodes run concurrently. When a node fails its dependents are never
+    started; the other branches still run to completion.
+
+    Returns a ``{node: result}`` dict and a ``{node: exception}`` dict.
+    """
+    sorter = TopologicalSorter(dependencies)
+    sorter.prepare()
+    results = {}
+    errors = {}
+    with ThreadPoolExecutor(
+        max_workers=max_workers, thread_name_prefix='migration'
+    ) as executor:
+        running = {}
+        while sorter.is_active():
+            for node in sorter.get_ready():
+                _logger.info("Starting migration of %s", node)
+                running[executor.submit(run, node)] = node
+            if not running:
+                # Only dependents of failed nodes are left.
+                break
+            done, _pending = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                node = running.pop(future)
+                try:
+                    results[node] = future.result()
+                except Exception as e:
+                    _logger.error("Migration of %s failed: %s", node, e)
+                    errors[node] = e
+                    continue
+                sorter.done(node)
+    return results, errors
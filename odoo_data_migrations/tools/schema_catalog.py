@@ -0,0 +1,108 @@
+import json
+
+# Columns of the tables, views and foreign tables visible on the search path,
+# temporary tables excluded.
+_CATALOG_RELATIONS = """
+    FROM pg_class c
+    JOIN pg_attribute a ON a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped
+    WHERE c.relkind IN ('r', 'p', 'v', 'm', 'f') AND c.relpersistence != 't'
+      AND pg_table_is_visible(c.oid)
+"""
+
+CATALOG_QUERY = f"""
+    SELECT c.relname, a.attname, format_type(a.atttypid, a.atttypmod), a.attnotnull
+    {_CATALOG_RELATIONS}
+    ORDER BY c.relname, a.attnum
+"""
+
+# Changes with any table or column added, dropped, renamed or retyped.
+FINGERPRINT_QUERY = f"""
+    SELECT md5(COALESCE(string_agg(
+        concat_ws('.', c.oid, c.relname, a.attnum, a.attname, a.atttypid, a.atttypmod,
+                  a.attnotnull),
+        ',' ORDER BY c.oid, a.attnum), ''))
+    {_CATALOG_RELATIONS}
+"""
+
+# Planner row estimate and on-disk size (with indexes and TOAST) of every table,
+# read from the statistics without scanning any of them.
+TABLE_STATS_QUERY = """
+    SELECT c.relname, GREATEST(c.reltuples, 0)::bigint, pg_total_relation_size(c.oid)
+    FROM pg_class c
+    WHERE c.relkind IN ('r', 'p') AND c.relpersistence != 't'
+      AND pg_table_is_visible(c.oid)
+"""
+
+
+def read_table_stats(cursor):
+    """Return {table: (estimated rows, size in bytes)} of the database of ``cursor``."""
+    cursor.execute(TABLE_STATS_QUERY)
+    return {table: (rows, size) for table, rows, size in cursor.fetchall()}
+
+
+class SchemaCatalog:
+    """Column names, SQL types and nullability of every table of a database.
+
+    The whole catalog is read with one query and is valid as long as the
+    ``fingerprint`` of the database schema stays the same, so it can be kept
+    and stored between runs instead of introspecting each table again.
+    """
+
+    def __init__(self, fingerprint, tables):
+        self.fingerprint = fingerprint
+        # {table: [(column, SQL type, not null), ...]} in column order.
+        self.tables = tables
+
+    @staticmethod
+    def read_fingerprint(cursor):
+        """Return the fingerprint of the schema ``cursor`` currently sees."""
+        cursor.execute(FINGERPRINT_QUERY)
+        return cursor.fetchone()[0]
+
+    @classmethod
+    def introspect(cls, cursor):
+        """Read the catalog of the database of ``cursor``."""
+        fingerprint = cls.read_fingerprint(cursor)
+        cursor.execute(CATALOG_QUERY)
+        tables = {}
+        for table, column, column_type, not_null in cursor.fetchall():
+            tables.setdefault(table, []).append((column, column_type, not_null))
+        return cls(fingerprint, tables)
+
+    @classmethod
+    def from_json(cls, fingerprint, data):
+        return cls(
+            fingerprint,
+            {
+                table: [tuple(column) for column in columns]
+                for table, columns in json.loads(data).items()
+            },
+        )
+
+    def to_json(self):
+        return json.dumps(self.tables, sort_keys=True)
+
+    def __contains__(self, table):
+        return table in self.tables
+
+    def columns(self, table):
+        """Return the column names of ``table``, None for a table unknown here."""
+        if table not in self.tables:
+            return None
+        return [column for column, _column_type, _not_null in self.tables[table]]
+
+    def column_types(self, table):
+        """Return an ordered {column: SQL type} dict of ``table``, None if unknown."""
+        if table not in self.tables:
+            return None
+        return {
+            column: column_type for column, column_type, _not_null in self.tables[table]
+        }
+
+    def required_columns(self, table):
+        """Return the NOT NULL columns of ``table``, None for a table unknown here."""
+        if table not in self.tables:
+            return None
+        return [
+            column for column, _column_type, not_null in self.tables[table] if not_null
+        ]
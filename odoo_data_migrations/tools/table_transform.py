@@ -0,0 +1,142 @@
+from .row_projection import column_getter, compile_projection
+
+
+def spec_source_column(spec, column):
+    """Return the source column a target column of ``spec`` is read from."""
+    value_map = spec.get('value_maps', {}).get(column)
+    if value_map:
+        return value_map['source']
+    return spec.get('renames', {}).get(column, column)
+
+
+def spec_target_columns(spec):
+    """Return the target columns ``spec`` fills in besides the shared fields."""
+    return list(
+        dict.fromkeys([
+            *spec.get('renames', {}),
+            *spec.get('value_maps', {}),
+            *spec.get('foreign_keys', {}),
+            *spec.get('constants', {}),
+            *spec.get('parents', ()),
+            *spec.get('computed', ()),
+        ])
+    )
+
+
+def spec_unloaded_columns(spec):
+    """Return the target columns ``spec`` leaves out of the loaded rows."""
+    return {
+        *spec.get('constants', {}),
+        *spec.get('parents', ()),
+        *spec.get('computed', ()),
+    }
+
+
+def spec_input_columns(spec):
+    """Return the source columns ``spec`` reads besides the shared fields."""
+    unloaded = spec_unloaded_columns(spec)
+    return list(
+        dict.fromkeys(
+            spec_source_column(spec, column)
+            for column in spec_target_columns(spec)
+            if column not in unloaded
+        )
+    )
+
+
+def resolve_value_map(value_map, lookups):
+    """Return the {source value: target value} dict and default of a value map rule.
+
+    A rule either lists its ``values`` or chains named ``lookups``: a source
+    value is looked up in the first one, the result in the next one and so on.
+    """
+    if 'values' in value_map:
+        return dict(value_map['values']), value_map.get('default')
+    lookup_names = value_map['lookups']
+    values = {}
+    for key, value in lookups[lookup_names[0]].items():
+        for lookup_name in lookup_names[1:]:
+            value = lookups[lookup_name].get(value)
+        values[key] = value
+    return values, value_map.get('default')
+
+
+def _compile_rules(spec, source_columns, shared_fields, lookups):
+    """Return the copy, value map and translation rules of ``spec``.
+
+    Columns ``source_columns`` lacks are skipped, the rules hold a getter of
+    their source column in the row tuples.
+    """
+    foreign_keys = spec.get('foreign_keys', {})
+    required = set(spec.get('required', ()))
+    copies = []
+    value_maps = []
+    translations = []
+    unloaded = spec_unloaded_columns(spec)
+    for column in spec_target_columns(spec):
+        source_column = spec_source_column(spec, column)
+        if column in unloaded or source_column not in source_columns:
+            continue
+        getter = column_getter(source_columns, source_column)
+        if column in spec.get('value_maps', {}):
+            values, default = resolve_value_map(spec['value_maps'][column], lookups)
+            value_maps.append((getter, column, values, default))
+        elif column in foreign_keys:
+            translations.append((
+                getter,
+                column,
+                foreign_keys[column],
+                column in required,
+            ))
+        elif column in spec.get('renames', {}) or column in shared_fields:
+            copies.append((getter, column))
+    return copies, value_maps, translations
+
+
+def _translate_column(rule, rows, values_list, translate, rejected):
+    """Fill a foreign key column of ``values_list`` with the mapped target ids."""
+    getter, column, model, is_required = rule
+    for index, (values, value) in enumerate(zip(values_list, map(getter, rows))):
+        target_id = translate(model, value) if value else None
+        if target_id is None and is_required:
+            rejected[index] = f"{column} {value!r} has no {model} mapping"
+        values[column] = target_id
+
+
+def compile_table_transform(spec, source_columns, shared_fields, translate, lookups):
+    """Compile a table spec into a function transforming a batch of source rows.
+
+    ``translate(model, source_id)`` returns the target id of a mapped record
+    or None. The returned function takes a list of row tuples of
+    ``source_columns`` and returns a list of value dicts aligned with it plus
+    a {row index: reason} dict; rejected rows (an unmapped required foreign
+    key) get None. Each rule is applied column by column over the batch.
+    """
+    project = compile_projection(
+        source_columns,
+        [field for field in shared_fields if field not in spec_target_columns(spec)],
+    )
+    copies, value_maps, translations = _compile_rules(
+        spec, source_columns, shared_fields, lookups
+    )
+    constants = list(spec.get('constants', {}).items())
+
+    def transform_batch(rows):
+        values_list = [project(row) for row in rows]
+        rejected = {}
+        for getter, column in copies:
+            for values, value in zip(values_list, map(getter, rows)):
+                values[column] = value
+        for getter, column, values_by_key, default in value_maps:
+            for values, value in zip(values_list, map(getter, rows)):
+                values[column] = values_by_key.get(value, default)
+        for rule in translations:
+            _translate_column(rule, rows, values_list, translate, rejected)
+        for column, value in constants:
+            for values in values_list:
+                values[column] = value
+        for index in rejected:
+            values_list[index] = None
+        return values_list, rejected
+
+    return transform_batch
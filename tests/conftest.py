@@ -0,0 +1,24 @@
+"""Make the pure Python helpers of ``odoo_data_migrations.tools`` importable.
+
+The addon and tools packages are registered as bare packages so that their
+``__init__`` modules, which load the Odoo models and psycopg2, are not run;
+the helper modules themselves only use the standard library.
+"""
+
+import os
+import sys
+import types
+
+ADDON_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    'odoo_data_migrations',
+)
+
+for name, path in (
+    ('odoo_data_migrations', ADDON_DIR),
+    ('odoo_data_migrations.tools', os.path.join(ADDON_DIR, 'tools')),
+):
+    if name not in sys.modules:
+        package = types.ModuleType(name)
+        package.__path__ = [path]
+        sys.modules[name] = package
@@ -0,0 +1,82 @@
+from contextlib import contextmanager
+
+from odoo_data_migrations.tools.batch_bisect import write_bisecting
+
+
+class Target:
+    """In-memory table whose writes are undone when the savepoint block raises."""
+
+    def __init__(self, bad_rows=()):
+        self.rows = []
+        self.bad_rows = set(bad_rows)
+        self.calls = 0
+
+    @contextmanager
+    def savepoint(self):
+        size = len(self.rows)
+        try:
+            yield
+        except Exception:
+            del self.rows[size:]
+            raise
+
+    def write(self, chunk):
+        self.calls += 1
+        self.rows.extend(chunk)
+        bad = self.bad_rows.intersection(chunk)
+        if bad:
+            raise ValueError(f"bad rows {sorted(bad)}")
+
+
+def test_writes_clean_batch_in_one_call():
+    target = Target()
+    failures = []
+    written = write_bisecting(
+        list(range(100)),
+        target.write,
+        target.savepoint,
+        lambda row, error: failures.append(row),
+    )
+    assert written == 100
+    assert target.calls == 1
+    assert target.rows == list(range(100))
+    assert failures == []
+
+
+def test_isolates_bad_rows_and_keeps_order():
+    target = Target(bad_rows={3, 64})
+    failures = []
+    written = write_bisecting(
+        list(range(100)),
+        target.write,
+        target.savepoint,
+        lambda row, error: failures.append((row, str(error))),
+    )
+    assert written == 98
+    assert target.rows == [row for row in range(100) if row not in (3, 64)]
+    assert failures == [(3, "bad rows [3]"), (64, "bad rows [64]")]
+    # Far fewer writes than one per row.
+    assert target.calls < 30
+
+
+def test_every_row_failing():
+    target = Target(bad_rows={1, 2, 3})
+    failures = []
+    written = write_bisecting(
+        [1, 2, 3],
+        target.write,
+        target.savepoint,
+        lambda row, error: failures.append(row),
+    )
+    assert written == 0
+    assert target.rows == []
+    assert failures == [1, 2, 3]
+
+
+def test_no_rows():
+    target = Target()
+    assert (
+        write_bisecting([], target.write, target.savepoint, lambda row, error: None)
+        == 0
+    )
+    assert target.calls == 0
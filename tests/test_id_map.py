@@ -0,0 +1,83 @@
+import pytest
+
+from odoo_data_migrations.tools.id_map import CompactIdMap
+
+
+def test_dense_map_lookups():
+    id_map = CompactIdMap.from_sorted_pairs([(10, 100), (11, 110), (13, 130)])
+    assert id_map._dense
+    assert len(id_map) == 3
+    assert id_map.get(11) == 110
+    assert id_map.get(12) is None
+    assert id_map.get(9, 0) == 0
+    assert 13 in id_map
+    assert 14 not in id_map
+    assert list(id_map.items()) == [(10, 100), (11, 110), (13, 130)]
+
+
+def test_sparse_map_lookups():
+    id_map = CompactIdMap.from_sorted_pairs([(1, 5), (1000, 6), (10**9, 7)])
+    assert not id_map._dense
+    assert id_map.get(1000) == 6
+    assert id_map.get(999) is None
+    assert id_map.max_source_id() == 10**9
+    assert list(id_map.items()) == [(1, 5), (1000, 6), (10**9, 7)]
+
+
+def test_repeated_source_id_keeps_last_pair():
+    id_map = CompactIdMap.from_sorted_pairs([(1, 10), (1, 11), (2, 20)])
+    assert len(id_map) == 2
+    assert id_map.get(1) == 11
+
+
+def test_from_pairs_sorts():
+    id_map = CompactIdMap.from_pairs([(3, 30), (1, 10), (2, 20)])
+    assert list(id_map.items()) == [(1, 10), (2, 20), (3, 30)]
+
+
+def test_empty_map():
+    id_map = CompactIdMap.from_sorted_pairs([])
+    assert len(id_map) == 0
+    assert id_map.get(1) is None
+    assert id_map.max_source_id() == 0
+    assert id_map.target_id_sum() == 0
+
+
+def test_merged_overrides_entries():
+    id_map = CompactIdMap.from_sorted_pairs([(1, 10), (2, 20)])
+    merged = id_map.merged({2: 21, 5: 50})
+    assert list(merged.items()) == [(1, 10), (2, 21), (5, 50)]
+    # The original map is immutable.
+    assert id_map.get(2) == 20
+
+
+def test_target_id_sum():
+    assert CompactIdMap.from_sorted_pairs([(1, 10), (3, 30)]).target_id_sum() == 40
+    assert CompactIdMap.from_sorted_pairs([(1, 10), (10**6, 30)]).target_id_sum() == 40
+
+
+@pytest.mark.parametrize(
+    'pairs',
+    [
+        [(10, 100), (11, 110), (12, 120)],
+        [(1, 5), (1000, 6), (10**9, 7)],
+    ],
+)
+def test_save_and_load(tmp_path, pairs):
+    path = str(tmp_path / 'model.idmap')
+    id_map = CompactIdMap.from_sorted_pairs(pairs, fingerprint=(3, pairs[-1][0], 42))
+    id_map.save(path)
+    assert CompactIdMap.read_fingerprint(path) == (3, pairs[-1][0], 42)
+    loaded = CompactIdMap.load(path)
+    assert list(loaded.items()) == pairs
+    assert loaded.fingerprint == (3, pairs[-1][0], 42)
+    assert loaded.get(pairs[1][0]) == pairs[1][1]
+
+
+def test_read_fingerprint_of_missing_or_foreign_file(tmp_path):
+    assert CompactIdMap.read_fingerprint(str(tmp_path / 'missing.idmap')) is None
+    path = tmp_path / 'foreign.idmap'
+    path.write_bytes(b'not an id map' * 10)
+    assert CompactIdMap.read_fingerprint(str(path)) is None
+    with pytest.raises(ValueError):
+        CompactIdMap.load(str(path))
@@ -0,0 +1,146 @@
+import threading
+
+from odoo_data_migrations.tools import mapping_cache
+from odoo_data_migrations.tools.mapping_cache import MappingCache
+
+
+class Loader:
+    """Loader over a {model: [(source id, target id), ...]} dict, counting calls."""
+
+    def __init__(self, mappings):
+        self.mappings = mappings
+        self.calls = []
+
+    def __call__(self, model_id):
+        self.calls.append(model_id)
+        return sorted(self.mappings.get(model_id, []))
+
+
+def fingerprint_of(mappings):
+    def fingerprint(model_id):
+        pairs = mappings.get(model_id, [])
+        return (
+            len(pairs),
+            max((source_id for source_id, _target_id in pairs), default=0),
+            sum(target_id for _source_id, target_id in pairs),
+        )
+
+    return fingerprint
+
+
+def test_loads_each_model_once():
+    loader = Loader({'res.partner': [(1, 10), (2, 20)]})
+    cache = MappingCache(loader)
+    assert cache.get('res.partner', 1) == 10
+    assert cache.get('res.partner', '2') == 20
+    assert cache.get('res.partner', 3) is None
+    assert cache.contains('res.partner', 1)
+    assert loader.calls == ['res.partner']
+    assert (cache.hits, cache.misses) == (3, 1)
+
+
+def test_empty_source_ids_are_not_looked_up():
+    cache = MappingCache(Loader({}))
+    assert cache.get('res.partner', None, 0) == 0
+    assert cache.get('res.partner', False) is None
+    assert cache.hits == cache.misses == 0
+
+
+def test_add_and_update():
+    cache = MappingCache(Loader({'res.partner': [(1, 10)]}))
+    cache.add('res.partner', 2, 20)
+    cache.update('res.partner', [(3, 30), (1, 11)])
+    assert [cache.get('res.partner', source_id) for source_id in (1, 2, 3)] == [
+        11,
+        20,
+        30,
+    ]
+
+
+def test_overlay_is_compacted(monkeypatch):
+    monkeypatch.setattr(mapping_cache, 'COMPACT_THRESHOLD', 2)
+    cache = MappingCache(Loader({}))
+    cache.update('res.partner', [(1, 10), (2, 20)])
+    assert cache._overlays['res.partner'] == {}
+    assert len(cache._maps['res.partner']) == 2
+    assert cache.get('res.partner', 2) == 20
+
+
+def test_persist_and_reopen(tmp_path):
+    mappings = {'res.partner': [(1, 10), (2, 20)]}
+    cache = MappingCache(
+        Loader(mappings),
+        store_dir=str(tmp_path),
+        fingerprint=fingerprint_of(mappings),
+    )
+    cache.add('res.partner', 3, 30)
+    mappings['res.partner'].append((3, 30))
+    cache.persist()
+
+    loader = Loader(mappings)
+    reopened = MappingCache(
+        loader, store_dir=str(tmp_path), fingerprint=fingerprint_of(mappings)
+    )
+    assert reopened.get('res.partner', 3) == 30
+    assert loader.calls == []
+
+
+def test_stats():
+    cache = MappingCache(Loader({'res.partner': [(1, 10)]}))
+    cache.get('res.partner', 1)
+    cache.get('res.partner', 2)
+    cache.add('res.partner', 2, 20)
+    stats = cache.stats()
+    assert stats['hit_ratio'] == 0.5
+    assert stats['models'] == {'res.partner': 2}
+
+
+def test_rewritten_mappings_invalidate_persisted_map(tmp_path):
+    mappings = {'res.partner': [(1, 10), (2, 20)]}
+    cache = MappingCache(
+        Loader(mappings), store_dir=str(tmp_path), fingerprint=fingerprint_of(mappings)
+    )
+    cache.get('res.partner', 1)
+    cache.persist()
+
+    # Same count and source ids, other target records.
+    mappings['res.partner'] = [(1, 11), (2, 21)]
+    loader = Loader(mappings)
+    reopened = MappingCache(
+        loader, store_dir=str(tmp_path), fingerprint=fingerprint_of(mappings)
+    )
+    assert reopened.get('res.partner', 1) == 11
+    assert loader.calls == ['res.partner']
+
+
+def test_spawn_shares_preloaded_maps():
+    cache = MappingCache(Loader({'account.move': [(1, 10)]}))
+    cache.add('account.move', 2, 20)
+    cache.preload(['account.move'])
+    worker_loader = Loader({'account.move.line': [(5, 50)]})
+    worker = cache.spawn(worker_loader, ['account.move'])
+    assert worker.get('account.move', 2) == 20
+    assert worker.get('account.move.line', 5) == 50
+    assert worker_loader.calls == ['account.move.line']
+    assert worker._maps['account.move'] is cache._maps['account.move']
+
+
+def test_concurrent_readers_see_every_pair(monkeypatch):
+    monkeypatch.setattr(mapping_cache, 'COMPACT_THRESHOLD', 10)
+    cache = MappingCache(Loader({}))
+    cache.update('res.partner', [(0, 1)])
+    missing = []
+
+    def read():
+        for _round in range(200):
+            if cache.get('res.partner', 0) != 1:
+                missing.append(True)
+
+    readers = [threading.Thread(target=read) for _index in range(4)]
+    for reader in readers:
+        reader.start()
+    for source_id in range(1, 500):
+        cache.add('res.partner', source_id, source_id + 1)
+    for reader in readers:
+        reader.join()
+    assert not missing
@@ -0,0 +1,83 @@
+import threading
+
+import pytest
+
+from odoo_data_migrations.tools.pipeline import (
+    PIPELINE_STAGES,
+    pipeline_bottleneck,
+    run_pipeline,
+)
+
+
+def test_run_pipeline_writes_every_batch_in_order():
+    written = []
+    timings = run_pipeline(
+        [[1, 2], [3], [4, 5]],
+        lambda batch: [value * 10 for value in batch],
+        written.append,
+    )
+    assert written == [[10, 20], [30], [40, 50]]
+    assert set(timings) == set(PIPELINE_STAGES)
+    assert all(timing['batches'] == 3 for timing in timings.values())
+
+
+def test_run_pipeline_writes_in_calling_thread():
+    threads = []
+    run_pipeline(
+        [[1], [2]], list, lambda batch: threads.append(threading.current_thread())
+    )
+    assert threads == [threading.current_thread()] * 2
+
+
+def test_run_pipeline_without_batches():
+    written = []
+    timings = run_pipeline([], list, written.append)
+    assert written == []
+    assert all(timing['batches'] == 0 for timing in timings.values())
+
+
+def test_run_pipeline_reraises_transform_error():
+    def transform(batch):
+        if batch == [2]:
+            raise ValueError("bad batch")
+        return batch
+
+    written = []
+    with pytest.raises(ValueError, match="bad batch"):
+        run_pipeline([[1], [2], [3]], transform, written.append)
+    assert [3] not in written
+
+
+def test_run_pipeline_reraises_write_error_and_stops_reading():
+    read = []
+
+    def batches():
+        for value in range(1000):
+            read.append(value)
+            yield [value]
+
+    def write(batch):
+        raise RuntimeError("write failed")
+
+    with pytest.raises(RuntimeError, match="write failed"):
+        run_pipeline(batches(), list, write, queue_size=1)
+    # The reader stops once the writer failed instead of draining the source.
+    assert len(read) < 1000
+
+
+def test_run_pipeline_reraises_read_error():
+    def batches():
+        yield [1]
+        raise OSError("source lost")
+
+    with pytest.raises(OSError, match="source lost"):
+        run_pipeline(batches(), list, lambda batch: None)
+
+
+def test_pipeline_bottleneck():
+    timings = {
+        'read': {'busy': 1.0, 'idle': 0.0, 'batches': 1},
+        'transform': {'busy': 3.0, 'idle': 0.0, 'batches': 1},
+        'write': {'busy': 2.0, 'idle': 0.0, 'batches': 1},
+    }
+    assert pipeline_bottleneck(timings) == 'transform'
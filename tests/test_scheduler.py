@@ -0,0 +1,60 @@
+import threading
+import time
+
+from odoo_data_migrations.tools.scheduler import run_dependency_graph
+
+
+def test_runs_nodes_after_their_dependencies():
+    finished = []
+    lock = threading.Lock()
+
+    def run(node):
+        time.sleep(0.01)
+        with lock:
+            finished.append(node)
+        return node.upper()
+
+    graph = {
+        'move_line': ['move', 'account'],
+        'move': ['journal'],
+        'journal': ['account'],
+        'account': [],
+    }
+    results, errors = run_dependency_graph(graph, run, max_workers=4)
+    assert errors == {}
+    assert results == {node: node.upper() for node in graph}
+    for node, dependencies in graph.items():
+        for dependency in dependencies:
+            assert finished.index(dependency) < finished.index(node)
+
+
+def test_independent_nodes_run_concurrently():
+    barrier = threading.Barrier(2, timeout=5)
+
+    def run(node):
+        # Both nodes must be running at the same time to pass the barrier.
+        barrier.wait()
+        return node
+
+    results, errors = run_dependency_graph(
+        {'partner': [], 'account': []}, run, max_workers=2
+    )
+    assert errors == {}
+    assert set(results) == {'partner', 'account'}
+
+
+def test_failed_node_skips_its_dependents_only():
+    started = []
+
+    def run(node):
+        started.append(node)
+        if node == 'account':
+            raise RuntimeError("account failed")
+        return node
+
+    graph = {'account': [], 'journal': ['account'], 'move': ['journal'], 'partner': []}
+    results, errors = run_dependency_graph(graph, run, max_workers=2)
+    assert set(results) == {'partner'}
+    assert list(errors) == ['account']
+    assert str(errors['account']) == "account failed"
+    assert 'journal' not in started and 'move' not in started
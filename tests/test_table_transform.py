@@ -0,0 +1,123 @@
+from odoo_data_migrations.tools.table_transform import (
+    compile_table_transform,
+    resolve_value_map,
+    spec_input_columns,
+    spec_source_column,
+    spec_target_columns,
+    spec_unloaded_columns,
+)
+
+MOVE_SPEC = {
+    'foreign_keys': {'journal_id': 'account.journal', 'partner_id': 'res.partner'},
+    'required': ['journal_id'],
+    'renames': {'move_type': 'type'},
+    'value_maps': {
+        'auto_post': {'source': 'auto_post', 'values': {True: 'yes'}, 'default': 'no'}
+    },
+    'constants': {'alias_id': None},
+    'parents': ['parent_id'],
+    'computed': ['commercial_partner_id'],
+}
+MAPPINGS = {('account.journal', 7): 70, ('res.partner', 3): 30}
+
+
+def translate(model, source_id):
+    return MAPPINGS.get((model, source_id))
+
+
+def test_spec_columns():
+    assert spec_source_column(MOVE_SPEC, 'move_type') == 'type'
+    assert spec_source_column(MOVE_SPEC, 'auto_post') == 'auto_post'
+    assert spec_source_column(MOVE_SPEC, 'name') == 'name'
+    assert spec_target_columns(MOVE_SPEC) == [
+        'move_type',
+        'auto_post',
+        'journal_id',
+        'partner_id',
+        'alias_id',
+        'parent_id',
+        'commercial_partner_id',
+    ]
+    assert spec_unloaded_columns(MOVE_SPEC) == {
+        'alias_id',
+        'parent_id',
+        'commercial_partner_id',
+    }
+    assert spec_input_columns(MOVE_SPEC) == [
+        'type',
+        'auto_post',
+        'journal_id',
+        'partner_id',
+    ]
+
+
+def test_resolve_value_map():
+    assert resolve_value_map({'values': {1: 'a'}, 'default': 'z'}, {}) == (
+        {1: 'a'},
+        'z',
+    )
+    lookups = {
+        'type_ids': {1: 'receivable', 2: 'payable'},
+        'selection': {'receivable': 'asset_receivable'},
+    }
+    values, default = resolve_value_map(
+        {'source': 'user_type_id', 'lookups': ['type_ids', 'selection']}, lookups
+    )
+    assert values == {1: 'asset_receivable', 2: None}
+    assert default is None
+
+
+def test_compile_table_transform():
+    source_columns = [
+        'id',
+        'name',
+        'type',
+        'auto_post',
+        'journal_id',
+        'partner_id',
+        'parent_id',
+    ]
+    shared_fields = ['name', 'partner_id', 'parent_id']
+    transform = compile_table_transform(
+        MOVE_SPEC, source_columns, shared_fields, translate, {}
+    )
+    rows = [
+        (1, 'INV/1', 'out_invoice', True, 7, 3, None),
+        (2, 'INV/2', 'in_invoice', False, 8, None, 1),
+        (3, 'INV/3', 'entry', None, 7, 4, None),
+    ]
+    values_list, rejected = transform(rows)
+    assert values_list[0] == {
+        'name': 'INV/1',
+        'move_type': 'out_invoice',
+        'auto_post': 'yes',
+        'journal_id': 70,
+        'partner_id': 30,
+        'alias_id': None,
+    }
+    # Journal 8 is not mapped and required: the row is rejected.
+    assert values_list[1] is None
+    assert list(rejected) == [1]
+    assert "journal_id 8 has no account.journal mapping" in rejected[1]
+    # An unmapped optional reference becomes empty.
+    assert values_list[2]['partner_id'] is None
+    assert values_list[2]['auto_post'] == 'no'
+    # Parents are patched later and never loaded.
+    assert all('parent_id' not in values for values in values_list if values)
+
+
+def test_compile_table_transform_skips_missing_source_columns():
+    transform = compile_table_transform(
+        MOVE_SPEC, ['id', 'name', 'journal_id'], ['name'], translate, {}
+    )
+    values_list, rejected = transform([(1, 'Misc', 7)])
+    assert rejected == {}
+    assert values_list == [{'name': 'Misc', 'journal_id': 70, 'alias_id': None}]
+
+
+def test_compile_table_transform_plain_copy():
+    transform = compile_table_transform(
+        {}, ['id', 'code', 'name'], ['code', 'name'], translate, {}
+    )
+    assert transform([(1, '101', 'Cash')]) == ([{'code': '101', 'name': 'Cash'}], {})
+    assert transform([]) == ([], {})